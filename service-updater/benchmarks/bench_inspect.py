@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""Benchmark decoding inspect output: full JSON documents versus projected `--format` rows.
+
+Synthesizes `docker inspect` / `docker image inspect` output for N containers whose env
+blocks, mounts and image history are padded to a given size, then reduces it to the
+snapshot records twice: the full-document path (json.loads of the whole array, one dict
+per record) and the projected path servicectl uses (one line of tab-separated JSON values
+per object, decoded line by line into __slots__ records). Reports parse time, peak
+traced memory and the memory retained by the records.
+
+    python3 benchmarks/bench_inspect.py --containers 200 --payload 65536
+"""
+import argparse
+import gc
+import json
+import re
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
+
+from servicectl_lib import compose as servicectl  # noqa: E402
+
+
+def make_objects(n: int, payload: int) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    env_count = max(1, payload // 64)
+    containers, images = [], []
+    for i in range(n):
+        image_id = "sha256:" + ("%x" % (i % 16)).rjust(64, "0")
+        containers.append({
+            "Id": ("%x" % i).rjust(64, "c"),
+            "Name": f"/proj-svc{i}-1",
+            "Image": image_id,
+            "State": {"Status": "running", "Health": {"Status": "healthy", "Log": [{"Output": "ok " * 50}] * 5}},
+            "Mounts": [{"Source": f"/srv/data/{i}/{m}", "Destination": f"/data/{m}", "Mode": "rw"} for m in range(20)],
+            "Config": {
+                "Image": f"repo/svc{i % 16}:latest",
+                "Env": [f"VAR_{k}={'x' * 48}" for k in range(env_count)],
+                "Labels": {"com.docker.compose.service": f"svc{i}", "com.docker.compose.project": "proj"},
+            },
+        })
+    for i in range(16):
+        images.append({
+            "Id": "sha256:" + ("%x" % i).rjust(64, "0"),
+            "RepoDigests": [f"repo/svc{i}@sha256:" + "d" * 64],
+            "History": [{"created_by": "RUN " + "y" * 200} for _ in range(max(1, payload // 256))],
+            "Config": {"Labels": {"org.opencontainers.image.version": f"1.{i}.0", "org.opencontainers.image.revision": "abc"}},
+        })
+    return containers, images
+
+
+def project(obj: Dict[str, Any], template: str) -> str:
+    """What `--format template` prints for obj; supports `{{json .A.B}}` and `{{json (index .A.B "key")}}`."""
+    def field(match: "re.Match[str]") -> str:
+        expr = match.group(1)
+        indexed = re.match(r'\(index (\S+) "([^"]+)"\)', expr)
+        value: Any = obj
+        for part in (indexed.group(1) if indexed else expr).strip(".").split("."):
+            value = (value or {}).get(part)
+        return json.dumps((value or {}).get(indexed.group(2), "") if indexed else value)
+
+    return re.sub(r"\{\{json (.+?)\}\}", field, template)
+
+
+def full_path(container_text: str, image_text: str) -> Tuple[List[Any], List[Any]]:
+    containers = [servicectl._container_record(c) for c in json.loads(container_text)]
+    images = [servicectl._image_record(img) for img in json.loads(image_text)]
+    return containers, images
+
+
+def projected_path(container_text: str, image_text: str) -> Tuple[List[Any], List[Any]]:
+    def rows(text: str) -> List[List[Any]]:
+        return [[json.loads(v) for v in line.split("\t")] for line in text.splitlines()]
+
+    containers = [servicectl._ContainerRecord.from_fields(*row) for row in rows(container_text)]
+    images = [servicectl._ImageRecord.from_fields(*row) for row in rows(image_text)]
+    return containers, images
+
+
+def measure(fn: Callable[[str, str], Any], container_text: str, image_text: str, runs: int) -> Dict[str, float]:
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn(container_text, image_text)
+        times.append(time.perf_counter() - t0)
+    gc.collect()
+    tracemalloc.start()
+    result = fn(container_text, image_text)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return {"ms": min(times) * 1000, "peak_kib": peak / 1024, "retained_kib": retained / 1024}
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--containers", type=int, default=200)
+    p.add_argument("--payload", type=int, default=65536, help="approximate bytes of env/history per object")
+    p.add_argument("--runs", type=int, default=5)
+    args = p.parse_args()
+
+    containers, images = make_objects(args.containers, args.payload)
+    full = (json.dumps(containers, indent=4), json.dumps(images, indent=4))
+    projected = (
+        "\n".join(project(c, servicectl.CONTAINER_INSPECT_FORMAT) for c in containers),
+        "\n".join(project(img, servicectl.IMAGE_INSPECT_FORMAT) for img in images),
+    )
+    del containers, images
+
+    a, b = full_path(*full), projected_path(*projected)
+    mismatches = sum(x.row() != y.row() for x, y in zip(a[0] + a[1], b[0] + b[1]))
+
+    print(f"{args.containers} containers, 16 images, ~{args.payload} bytes of payload per object")
+    for name, texts, fn in [("full json", full, full_path), ("projected", projected, projected_path)]:
+        m = measure(fn, texts[0], texts[1], args.runs)
+        size = sum(len(t) for t in texts) / 1024
+        print(f"{name:<10} input {size:10.1f} KiB  parse {m['ms']:8.2f} ms  peak {m['peak_kib']:10.1f} KiB  records {m['retained_kib']:8.1f} KiB")
+    print(f"record mismatches: {mismatches}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
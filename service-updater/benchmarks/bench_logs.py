@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""Benchmark `servicectl logs`: merged log throughput and memory across many compose services.
+
+Builds a scratch tree with N compose services of C containers each and a fake `docker`
+whose `logs --timestamps` prints L lines per container (timestamps interleaved across
+containers, every fifth line on stderr). Runs `logs --all` (optionally with --grep) once per
+volume, then reports wall time, merged lines per second and the peak RSS of the servicectl
+process, and checks that the output is in timestamp order. Peak RSS should stay flat as the
+volume grows.
+
+    python3 benchmarks/bench_logs.py --services 20 --containers 2 --lines 10000,100000
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+SCRIPT = Path(__file__).resolve().parents[1] / "scripts" / "servicectl.py"
+PACKAGE = SCRIPT.parent / "servicectl_lib"
+
+FAKE_DOCKER = r'''#!/usr/bin/env python3
+import json, os, sys
+args = sys.argv[1:]
+project = os.path.basename(os.getcwd())
+count = int(os.environ["BENCH_CONTAINERS"])
+if args[:2] == ["compose", "ps"]:
+    for i in range(count):
+        print(f"{project}-{i}".ljust(64, "0"))
+elif args[:1] == ["inspect"]:
+    template = args[args.index("--format") + 1]
+    for c in args[args.index("--format") + 2:]:
+        values = {".Id": c, ".Name": "/" + c.rstrip("0"), ".Image": "sha256:" + "1" * 64, ".Config.Image": "repo/app:1"}
+        row = template
+        for k, v in values.items():
+            row = row.replace("{{json %s}}" % k, json.dumps(v))
+        print(row.replace('{{json (index .Config.Labels "com.docker.compose.service")}}', json.dumps(c.rstrip("0"))))
+elif args[:2] == ["image", "inspect"]:
+    pass
+elif args[:1] == ["logs"]:
+    cid = args[-1]
+    offset = sum(map(ord, cid)) % 997
+    lines = int(os.environ["BENCH_LOG_LINES"])
+    out, err = sys.stdout, sys.stderr
+    for i in range(lines):
+        us = i * 1000 + offset
+        ts = "2026-01-01T00:%02d:%02d.%06d000Z" % (us // 60000000 % 60, us // 1000000 % 60, us % 1000000)
+        (err if i % 5 == 4 else out).write(f"{ts} {'ERROR' if i % 100 == 0 else 'info'} request {i} served in {i % 37} ms\n")
+'''
+
+
+def make_tree(root: Path, services: int) -> Path:
+    (root / "scripts").mkdir(parents=True)
+    (root / "data").mkdir()
+    (root / "bin").mkdir()
+    script = root / "scripts" / "servicectl.py"
+    shutil.copy(SCRIPT, script)
+    shutil.copytree(PACKAGE, script.parent / PACKAGE.name, ignore=shutil.ignore_patterns("__pycache__"))
+    docker = root / "bin" / "docker"
+    docker.write_text(FAKE_DOCKER, encoding="utf-8")
+    docker.chmod(0o755)
+    registry: Dict[str, Dict] = {"services": {}}
+    for i in range(services):
+        key = f"svc{i:02d}"
+        (root / "svcs" / key).mkdir(parents=True)
+        registry["services"][key] = {
+            "path": str(root / "svcs" / key),
+            "runtime": "docker_compose",
+            "shell_init": ":",
+            "actions": {"update": "docker compose pull && docker compose up -d --remove-orphans"},
+        }
+    (root / "data" / "services.json").write_text(json.dumps(registry, indent=2), encoding="utf-8")
+    return script
+
+
+def run(argv: List[str], env: Dict[str, str], out_path: Path) -> Dict[str, float]:
+    with open(out_path, "wb") as out:
+        t0 = time.perf_counter()
+        proc = subprocess.Popen(argv, stdout=out, stderr=subprocess.DEVNULL, env=env)
+        _, status, usage = os.wait4(proc.pid, 0)
+        wall = time.perf_counter() - t0
+    rss_kib = usage.ru_maxrss / 1024 if sys.platform == "darwin" else usage.ru_maxrss
+    return {"wall_s": wall, "peak_rss_kib": rss_kib, "rc": status >> 8}
+
+
+def check_order(out_path: Path) -> int:
+    """Lines whose timestamp is older than the line before them."""
+    last, inversions, lines = "", 0, 0
+    with open(out_path, "r", encoding="utf-8") as f:
+        for line in f:
+            lines += 1
+            ts = line.split(" | ", 1)[1].split(" ", 1)[0]
+            inversions += ts < last
+            last = ts
+    return inversions
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--services", type=int, default=20)
+    p.add_argument("--containers", type=int, default=2)
+    p.add_argument("--lines", default="10000,100000", help="comma-separated lines per container")
+    p.add_argument("--grep", help="also pass --grep PATTERN")
+    args = p.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        script = make_tree(root, args.services)
+        out_path = root / "out.log"
+        print(f"{args.services} services x {args.containers} containers")
+        for lines in [int(x) for x in args.lines.split(",") if x]:
+            env = dict(
+                os.environ,
+                PATH=f"{root / 'bin'}{os.pathsep}{os.environ.get('PATH', '')}",
+                SERVICECTL_NO_DAEMON="1",
+                PYTHONDONTWRITEBYTECODE="1",
+                BENCH_CONTAINERS=str(args.containers),
+                BENCH_LOG_LINES=str(lines),
+            )
+            argv = [sys.executable, str(script), "logs", "--all"] + (["--grep", args.grep] if args.grep else [])
+            r = run(argv, env, out_path)
+            merged = sum(1 for _ in open(out_path, "rb"))
+            inversions = check_order(out_path)
+            failed = failed or r["rc"] != 0 or inversions > 0
+            print(
+                f"{lines:>8} lines/container  merged {merged:>9}  wall {r['wall_s']:7.2f} s  "
+                f"{merged / r['wall_s']:>10.0f} lines/s  peak rss {r['peak_rss_kib'] / 1024:6.1f} MiB  "
+                f"out of order {inversions}  rc {r['rc']}"
+            )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
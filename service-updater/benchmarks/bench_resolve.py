@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""Benchmark service name resolution against a large synthetic registry.
+
+Builds a registry with N services (Latin and CJK aliases), resolves M synthetic
+names through servicectl's index, and cross-checks every answer against the
+original linear-scan resolver.
+
+    python3 benchmarks/bench_resolve.py --services 5000 --names 10000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
+
+from servicectl_lib import common  # noqa: E402
+from servicectl_lib import registry as servicectl  # noqa: E402
+
+CJK_WORDS = ["代理", "网关", "接口", "聊天", "存储", "监控", "日志", "数据", "消息", "缓存", "搜索", "文档"]
+LATIN_WORDS = ["api", "proxy", "hub", "chat", "store", "mon", "log", "data", "queue", "cache", "search", "docs"]
+
+
+def reference_resolve(services: Dict, name_or_alias: str) -> Tuple[str, Dict]:
+    """The pre-index linear scan, kept verbatim as a correctness oracle."""
+    needle_raw = (name_or_alias or "").strip().lower()
+    needle_norm = servicectl._normalize_service_token(needle_raw)
+    if not needle_raw:
+        raise KeyError("service name is empty")
+
+    if needle_raw in services:
+        return needle_raw, services[needle_raw]
+
+    for key, entry in services.items():
+        aliases = entry.get("aliases", [])
+        if any(str(a).strip().lower() == needle_raw for a in aliases):
+            return key, entry
+
+    candidates = []
+    for key, entry in services.items():
+        tokens = {key.lower()}
+        display = str(entry.get("display_name", "")).strip().lower()
+        if display:
+            tokens.add(display)
+        for a in entry.get("aliases", []):
+            t = str(a).strip().lower()
+            if t:
+                tokens.add(t)
+
+        norm_tokens = {servicectl._normalize_service_token(t) for t in tokens if t}
+
+        if needle_norm and needle_norm in norm_tokens:
+            return key, entry
+
+        if needle_norm and any((nt.startswith(needle_norm) or needle_norm in nt) for nt in norm_tokens if nt):
+            candidates.append((key, entry))
+
+    if len(candidates) == 1:
+        return candidates[0]
+
+    if len(candidates) > 1:
+        names = ", ".join(k for k, _ in candidates)
+        raise KeyError(f"service is ambiguous: {name_or_alias} -> {names}")
+
+    raise KeyError(f"service not found: {name_or_alias}")
+
+
+def make_registry(n: int, rng: random.Random) -> Dict:
+    services = {}
+    for i in range(n):
+        word = rng.choice(LATIN_WORDS)
+        key = f"{word}-{i:05d}"
+        cjk = rng.choice(CJK_WORDS) + rng.choice(CJK_WORDS) + str(i)
+        services[key] = {
+            "display_name": f"{word.title()}Svc{i}",
+            "aliases": [f"{word}{i}", cjk, f"s{i:05d}x"],
+            "path": f"~/www/{key}",
+            "runtime": "docker_compose",
+            "actions": dict(common.DOCKER_COMPOSE_DEFAULTS),
+        }
+    return {"services": services}
+
+
+def make_names(services: Dict, m: int, rng: random.Random) -> List[str]:
+    keys = list(services.keys())
+    names = []
+    for _ in range(m):
+        key = rng.choice(keys)
+        entry = services[key]
+        kind = rng.randrange(7)
+        if kind == 0:
+            names.append(key)
+        elif kind == 1:
+            names.append(rng.choice(entry["aliases"]).upper())
+        elif kind == 2:
+            names.append(f"更新 {entry['aliases'][1]}服务")
+        elif kind == 3:
+            names.append(entry["display_name"])
+        elif kind == 4:
+            names.append(entry["aliases"][2][:5])
+        elif kind == 5:
+            names.append(rng.choice(LATIN_WORDS))
+        else:
+            names.append(f"missing-{rng.randrange(10 ** 6)}")
+    return names
+
+
+def outcome(fn, services: Dict, name: str) -> str:
+    try:
+        return fn(services, name)[0]
+    except KeyError as e:
+        return f"error: {e}"
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--services", type=int, default=5000)
+    p.add_argument("--names", type=int, default=10000)
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--check", type=int, default=500, help="names cross-checked against the linear scan (0 = all)")
+    args = p.parse_args()
+
+    rng = random.Random(args.seed)
+    registry = make_registry(args.services, rng)
+    names = make_names(registry["services"], args.names, rng)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        servicectl.CONFIG_PATH = os.path.join(tmp, "services.json")
+        servicectl.REGISTRY_DIR = os.path.join(tmp, "services.d")
+        servicectl.CACHE_DIR = os.path.join(tmp, ".cache")
+        servicectl.INDEX_CACHE_PATH = os.path.join(servicectl.CACHE_DIR, "resolve-index.marshal")
+        servicectl.REGISTRY_SNAPSHOT_PATH = os.path.join(servicectl.CACHE_DIR, "registry.marshal")
+        with open(servicectl.CONFIG_PATH, "w", encoding="utf-8") as f:
+            f.write(json.dumps(registry, ensure_ascii=False))
+
+        t0 = time.perf_counter()
+        services = servicectl._load_config()["services"]
+        servicectl._service_index(services)
+        cold = time.perf_counter() - t0
+
+        servicectl._INDEX_MEMO["services"] = None
+        t0 = time.perf_counter()
+        services = servicectl._load_config()["services"]
+        servicectl._service_index(services)
+        warm = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        results = [outcome(servicectl._resolve_service, services, n) for n in names]
+        indexed = time.perf_counter() - t0
+
+        check = names if args.check == 0 else names[: args.check]
+        t0 = time.perf_counter()
+        expected = [outcome(reference_resolve, services, n) for n in check]
+        linear = time.perf_counter() - t0
+
+    mismatches = [(n, r, e) for n, r, e in zip(check, results, expected) if r != e]
+    print(f"registry: {args.services} services, {args.names} lookups")
+    print(f"load + index build (cold cache): {cold * 1000:.1f} ms")
+    print(f"load + index from disk cache:    {warm * 1000:.1f} ms")
+    print(f"indexed resolve: {indexed * 1000:.1f} ms total, {indexed / len(names) * 1e6:.1f} us/lookup")
+    print(f"linear resolve:  {linear / len(check) * 1e6:.1f} us/lookup (over {len(check)} lookups)")
+    print(f"parity mismatches: {len(mismatches)}")
+    for n, r, e in mismatches[:10]:
+        print(f"  {n!r}: index={r!r} linear={e!r}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""Cold-start benchmark for servicectl's read-only subcommands.
+
+Copies servicectl.py and its package into a scratch tree with a synthetic registry, then for each
+subcommand measures wall-clock time over N fresh interpreter runs and reports the
+overhead above a bare `python3 -c pass`. One `python3 -X importtime` run per
+subcommand lists the most expensive imports. Exits 1 when a subcommand's median
+overhead exceeds its budget.
+
+    python3 benchmarks/bench_startup.py --runs 20 --budget list=60
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+SCRIPT = Path(__file__).resolve().parents[1] / "scripts" / "servicectl.py"
+PACKAGE = SCRIPT.parent / "servicectl_lib"
+
+# Milliseconds of median overhead above a bare interpreter start.
+DEFAULT_BUDGETS = {"list": 80.0, "show": 80.0, "update --dry-run": 90.0, "restart --dry-run": 90.0}
+
+
+def make_registry(n: int) -> Dict:
+    services = {}
+    for i in range(n):
+        key = f"svc-{i:04d}"
+        services[key] = {
+            "display_name": f"Service {i}",
+            "aliases": [f"s{i}", f"服务{i}"],
+            "path": f"/tmp/servicectl-bench/{key}",
+            "runtime": "docker_compose",
+            "shell_init": ":",
+            "actions": {
+                "update": "docker compose pull && docker compose up -d --remove-orphans",
+                "restart": "docker compose restart",
+                "status": "docker compose ps",
+                "health": "docker compose ps",
+            },
+        }
+    return {"services": services}
+
+
+def time_runs(argv: List[str], runs: int, env: Dict[str, str]) -> List[float]:
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        subprocess.run(argv, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env, check=False)
+        samples.append((time.perf_counter() - t0) * 1000)
+    return samples
+
+
+def top_imports(argv: List[str], env: Dict[str, str], limit: int) -> Tuple[float, List[Tuple[str, float]]]:
+    """Total self time of all imports plus the slowest top-level imports (cumulative ms)."""
+    cp = subprocess.run([argv[0], "-X", "importtime"] + argv[1:], capture_output=True, text=True, env=env, check=False)
+    total = 0.0
+    ranked = []
+    for line in cp.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line.split(":", 1)[1].split("|")
+        total += int(self_us) / 1000
+        if not name[1:].startswith(" "):
+            ranked.append((name.strip(), int(cumulative_us) / 1000))
+    ranked.sort(key=lambda r: -r[1])
+    return total, ranked[:limit]
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--runs", type=int, default=15)
+    p.add_argument("--services", type=int, default=200, help="synthetic registry size")
+    p.add_argument("--budget", action="append", default=[], help="SUBCOMMAND=MS, e.g. list=60")
+    p.add_argument("--top", type=int, default=8, help="imports listed per subcommand")
+    p.add_argument("--json", dest="json_path", help="also write results to this file")
+    args = p.parse_args()
+
+    budgets = dict(DEFAULT_BUDGETS)
+    for pair in args.budget:
+        name, _, value = pair.rpartition("=")
+        budgets[name] = float(value)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        (Path(tmp) / "scripts").mkdir()
+        (Path(tmp) / "data").mkdir()
+        script = Path(tmp) / "scripts" / "servicectl.py"
+        shutil.copy(SCRIPT, script)
+        shutil.copytree(PACKAGE, script.parent / PACKAGE.name, ignore=shutil.ignore_patterns("__pycache__"))
+        registry = Path(tmp) / "data" / "services.json"
+        registry.write_text(json.dumps(make_registry(args.services), ensure_ascii=False, indent=2), encoding="utf-8")
+
+        env = dict(os.environ, SERVICECTL_NO_DAEMON="1", PYTHONDONTWRITEBYTECODE="1")
+        py = sys.executable
+        cases = {
+            "list": [py, str(script), "list"],
+            "show": [py, str(script), "show", "s7"],
+            "update --dry-run": [py, str(script), "update", "svc-0007", "--dry-run"],
+            "restart --dry-run": [py, str(script), "restart", "服务7", "--dry-run"],
+        }
+        # Warm-up run builds the registry snapshot and resolution index caches, and the
+        # package's bytecode cache as the first run of an installed copy would.
+        warm_env = {k: v for k, v in env.items() if k != "PYTHONDONTWRITEBYTECODE"}
+        for argv in cases.values():
+            subprocess.run(argv, stdout=subprocess.DEVNULL, env=warm_env, check=False)
+
+        baseline = statistics.median(time_runs([py, "-c", "pass"], args.runs, env))
+        print(f"bare interpreter: {baseline:.1f} ms (median of {args.runs})")
+
+        results = {}
+        failed = []
+        for name, argv in cases.items():
+            samples = sorted(time_runs(argv, args.runs, env))
+            median = statistics.median(samples)
+            overhead = median - baseline
+            import_total, ranked = top_imports(argv, env, args.top)
+            budget = budgets.get(name)
+            ok = budget is None or overhead <= budget
+            if not ok:
+                failed.append(name)
+            results[name] = {
+                "median_ms": round(median, 2),
+                "min_ms": round(samples[0], 2),
+                "max_ms": round(samples[-1], 2),
+                "overhead_ms": round(overhead, 2),
+                "import_ms": round(import_total, 2),
+                "budget_ms": budget,
+                "ok": ok,
+                "top_imports": [{"module": m, "cumulative_ms": round(ms, 2)} for m, ms in ranked],
+            }
+            verdict = "ok" if ok else "OVER BUDGET"
+            print(
+                f"{name:<18} median {median:6.1f} ms  min {samples[0]:6.1f}  overhead {overhead:6.1f} ms"
+                f"  budget {budget if budget is not None else '-'}  [{verdict}]"
+            )
+            print(f"  imports {import_total:.1f} ms; top: " + ", ".join(f"{m} {ms:.1f}" for m, ms in ranked))
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({"baseline_ms": round(baseline, 2), "runs": args.runs, "results": results}, f, indent=2)
+            f.write("\n")
+
+    if failed:
+        print(f"over budget: {', '.join(failed)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
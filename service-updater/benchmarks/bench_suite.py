@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""End-to-end benchmark of servicectl against a fake docker CLI and synthetic registries.
+
+For each registry size a scratch tree gets a copy of servicectl.py, a generated
+services.json and a `bin/` directory with a fake `docker` (tunable latency, container
+count and inspect payload size) plus a logging shell wrapper. Every scenario runs in
+fresh interpreters and records wall time, processes spawned (shells + docker calls)
+and the peak RSS of the servicectl process:
+
+    list, show, resolve (in-process _resolve_service), update --dry-run,
+    update (cold: empty history store), update (warm: snapshots reuse the store) and
+    status --all (one host-wide container listing for the whole registry)
+
+Results go to a JSON file; `--compare OLD.json` prints the change per metric.
+
+    python3 benchmarks/bench_suite.py --sizes 10,1000,10000 --output bench-results.json
+    python3 benchmarks/bench_suite.py --compare bench-results.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+SCRIPT = Path(__file__).resolve().parents[1] / "scripts" / "servicectl.py"
+PACKAGE = SCRIPT.parent / "servicectl_lib"
+
+CJK_WORDS = ["代理", "网关", "接口", "聊天", "存储", "监控", "日志", "数据"]
+LATIN_WORDS = ["api", "proxy", "hub", "chat", "store", "mon", "log", "data"]
+
+FAKE_DOCKER = r'''#!/usr/bin/env python3
+import json, os, re, sys, time
+args = sys.argv[1:]
+with open(os.environ["BENCH_SPAWN_LOG"], "a") as f:
+    f.write("docker " + " ".join(args[:2]) + "\n")
+time.sleep(float(os.environ.get("BENCH_DOCKER_LATENCY", "0")))
+project = os.path.basename(os.getcwd())
+count = int(os.environ.get("BENCH_CONTAINERS", "2"))
+payload = "x" * int(os.environ.get("BENCH_PAYLOAD", "0"))
+image = lambda i: "sha256:" + ("%x" % i).rjust(64, "0")
+template = args[args.index("--format") + 1] if "--format" in args else ""
+targets = args[args.index("--format") + 2:] if template else args[1 + (args[0] == "image"):]
+
+def lookup(obj, expr):
+    m = re.match(r'\(index (\S+) "([^"]+)"\)', expr)
+    value = obj
+    for part in (m.group(1) if m else expr).strip(".").split("."):
+        value = (value or {}).get(part)
+    return (value or {}).get(m.group(2), "") if m else value
+
+def emit(objs):
+    if "{{json" in template:
+        for obj in objs:
+            print(re.sub(r"\{\{json (.+?)\}\}", lambda m: json.dumps(lookup(obj, m.group(1))), template))
+    else:
+        print(json.dumps(objs))
+
+if args[:2] == ["compose", "ps"]:
+    for i in range(count):
+        print(f"{project}-{i}".ljust(64, "0") if "-q" in args else f"{project}-svc{i}-1 Up")
+elif args[:1] == ["inspect"]:
+    emit([{"Id": c, "Name": f"/{project}-svc{i}-1", "Image": image(i), "RestartCount": 0,
+           "State": {"Status": "running"},
+           "Config": {"Image": f"repo/svc{i}:latest", "Labels": {"com.docker.compose.service": f"svc{i}", "bench.payload": payload}}}
+          for i, c in enumerate(targets)])
+elif args[:2] == ["image", "inspect"] and template and "{{json" not in template:
+    for i, _ in enumerate(targets):
+        print(image(i))
+elif args[:2] == ["image", "inspect"]:
+    emit([{"Id": i, "RepoDigests": ["repo@sha256:" + "d" * 64],
+           "Config": {"Labels": {"org.opencontainers.image.version": "1.0.0", "bench.payload": payload}}} for i in targets])
+elif args[:1] == ["ps"]:
+    with open(os.environ["BENCH_PROJECTS"], encoding="utf-8") as f:
+        for path in f.read().splitlines():
+            name = os.path.basename(path)
+            for i in range(count):
+                print("\t".join([f"{name}-{i}".ljust(64, "0"), "running", "Up 2 hours (healthy)", name, path]))
+elif args[:2] == ["compose", "config"]:
+    print(json.dumps({"services": {f"svc{i}": {"image": f"repo/svc{i}:latest"} for i in range(count)}}))
+'''
+
+SPAWN_SHELL = """#!/bin/sh
+echo sh >> "$BENCH_SPAWN_LOG"
+exec /bin/sh "$@"
+"""
+
+
+def make_registry(n: int, root: Path, shell: str) -> Dict:
+    services = {}
+    for i in range(n):
+        word = LATIN_WORDS[i % len(LATIN_WORDS)]
+        key = f"{word}-{i:05d}"
+        services[key] = {
+            "display_name": f"{word.title()}Svc{i}",
+            "aliases": [f"{word}{i}", f"{CJK_WORDS[i % len(CJK_WORDS)]}{i}"],
+            "path": str(root / "svcs" / key),
+            "runtime": "docker_compose",
+            "shell": shell,
+            "shell_init": ":",
+            "tags": [word],
+            "actions": {
+                "update": "docker compose pull && docker compose up -d --remove-orphans",
+                "restart": "docker compose restart",
+                "status": "docker compose ps",
+                "health": "docker compose ps",
+            },
+        }
+    return {"services": services}
+
+
+def make_tree(root: Path, size: int) -> Tuple[Path, str]:
+    (root / "scripts").mkdir(parents=True)
+    (root / "data").mkdir()
+    (root / "bin").mkdir()
+    script = root / "scripts" / "servicectl.py"
+    shutil.copy(SCRIPT, script)
+    shutil.copytree(PACKAGE, script.parent / PACKAGE.name, ignore=shutil.ignore_patterns("__pycache__"))
+    for name, body in [("docker", FAKE_DOCKER), ("sh-spawn", SPAWN_SHELL)]:
+        path = root / "bin" / name
+        path.write_text(body, encoding="utf-8")
+        path.chmod(0o755)
+    registry = make_registry(size, root, str(root / "bin" / "sh-spawn"))
+    (root / "data" / "services.json").write_text(json.dumps(registry, ensure_ascii=False, indent=2), encoding="utf-8")
+    target = next(iter(registry["services"]))
+    (root / "projects.txt").write_text("\n".join(s["path"] for s in registry["services"].values()), encoding="utf-8")
+    (root / "svcs" / target).mkdir(parents=True)
+    return script, target
+
+
+def run_once(argv: List[str], env: Dict[str, str], spawn_log: Path) -> Dict[str, float]:
+    """Run one fresh process; returns wall ms, spawned processes and its own peak RSS in KiB."""
+    spawn_log.write_text("", encoding="utf-8")
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(argv, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env)
+    _, status, usage = os.wait4(proc.pid, 0)
+    wall = (time.perf_counter() - t0) * 1000
+    proc.returncode = os.waitstatus_to_exitcode(status) if hasattr(os, "waitstatus_to_exitcode") else status >> 8
+    rss_kib = usage.ru_maxrss / 1024 if sys.platform == "darwin" else usage.ru_maxrss
+    spawns = len(spawn_log.read_text(encoding="utf-8").splitlines())
+    return {"wall_ms": wall, "spawns": spawns, "peak_rss_kib": rss_kib, "rc": proc.returncode}
+
+
+def summarize(samples: List[Dict[str, float]]) -> Dict[str, Any]:
+    walls = sorted(s["wall_ms"] for s in samples)
+    return {
+        "wall_ms_median": round(statistics.median(walls), 2),
+        "wall_ms_min": round(walls[0], 2),
+        "spawns": max(s["spawns"] for s in samples),
+        "peak_rss_kib": int(max(s["peak_rss_kib"] for s in samples)),
+        "failures": sum(1 for s in samples if s["rc"] != 0),
+    }
+
+
+RESOLVE_SNIPPET = """
+import json, sys, time
+sys.path.insert(0, sys.argv[1])
+from servicectl_lib import registry as servicectl
+services = servicectl._load_config()["services"]
+names = [a for entry in services.values() for a in entry["aliases"]][: int(sys.argv[2])]
+t0 = time.perf_counter()
+for name in names:
+    servicectl._resolve_service(services, name)
+print(json.dumps({"lookups": len(names), "us_per_lookup": (time.perf_counter() - t0) * 1e6 / max(1, len(names))}))
+"""
+
+
+def bench_size(size: int, args: argparse.Namespace) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        script, target = make_tree(root, size)
+        spawn_log = root / "spawns.log"
+        env = dict(
+            os.environ,
+            PATH=f"{root / 'bin'}{os.pathsep}{os.environ.get('PATH', '')}",
+            SERVICECTL_NO_DAEMON="1",
+            PYTHONDONTWRITEBYTECODE="1",
+            BENCH_SPAWN_LOG=str(spawn_log),
+            BENCH_DOCKER_LATENCY=str(args.latency),
+            BENCH_CONTAINERS=str(args.containers),
+            BENCH_PAYLOAD=str(args.payload),
+            BENCH_PROJECTS=str(root / "projects.txt"),
+        )
+        py = sys.executable
+        alias = f"{LATIN_WORDS[0]}0"
+        # Builds the registry snapshot and the resolution index once, as any first run would.
+        subprocess.run([py, str(script), "list"], stdout=subprocess.DEVNULL, env=env, check=False)
+
+        scenarios: Dict[str, Any] = {}
+        plain = {
+            "list": [py, str(script), "list"],
+            "show": [py, str(script), "show", alias],
+            "resolve": [py, "-c", RESOLVE_SNIPPET, str(script.parent), str(args.lookups)],
+            "update_dry_run": [py, str(script), "update", alias, "--dry-run"],
+        }
+        for name, argv in plain.items():
+            scenarios[name] = summarize([run_once(argv, env, spawn_log) for _ in range(args.runs)])
+        out = subprocess.run(plain["resolve"], capture_output=True, text=True, env=env, check=False).stdout
+        scenarios["resolve"].update(json.loads(out or "{}"))
+
+        update = [py, str(script), "update", alias]
+        history = root / "data" / "history.sqlite3"
+        cold = []
+        for _ in range(args.runs):
+            for path in root.glob("data/history.sqlite3*"):
+                path.unlink()
+            cold.append(run_once(update, env, spawn_log))
+        scenarios["update_cold"] = summarize(cold)
+        scenarios["update_warm"] = summarize([run_once(update, env, spawn_log) for _ in range(args.runs)])
+        scenarios["update_warm"]["history_bytes"] = history.stat().st_size if history.exists() else 0
+        # The first run inspects every container once; later runs take them from the history store.
+        scenarios["status_all"] = summarize([run_once([py, str(script), "status", "--all"], env, spawn_log) for _ in range(args.runs)])
+        return {"services": size, "target": target, "scenarios": scenarios}
+
+
+def git_revision() -> Optional[str]:
+    try:
+        cp = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SCRIPT.parent, capture_output=True, text=True, check=False)
+    except OSError:
+        return None
+    return cp.stdout.strip() or None
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any]) -> None:
+    old_by_size = {r["services"]: r for r in old.get("results", [])}
+    print(f"comparing {old.get('revision') or '?'} -> {new.get('revision') or '?'}")
+    for result in new.get("results", []):
+        base = old_by_size.get(result["services"])
+        if base is None:
+            continue
+        for name, metrics in result["scenarios"].items():
+            before = base["scenarios"].get(name, {})
+            deltas = []
+            for metric in ["wall_ms_median", "spawns", "peak_rss_kib"]:
+                if metric in metrics and before.get(metric):
+                    change = (metrics[metric] - before[metric]) * 100.0 / before[metric]
+                    deltas.append(f"{metric} {before[metric]} -> {metrics[metric]} ({change:+.1f}%)")
+            print(f"{result['services']:>6} {name:<15} " + "; ".join(deltas))
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--sizes", default="10,100,1000,10000", help="comma-separated registry sizes")
+    p.add_argument("--runs", type=int, default=5, help="runs per scenario")
+    p.add_argument("--latency", type=float, default=0.0, help="seconds the fake docker sleeps per call")
+    p.add_argument("--containers", type=int, default=4, help="containers per compose project")
+    p.add_argument("--payload", type=int, default=0, help="extra bytes per inspect object")
+    p.add_argument("--lookups", type=int, default=2000, help="names resolved by the resolve scenario")
+    p.add_argument("--output", default="bench-results.json", help="JSON results file")
+    p.add_argument("--compare", help="earlier results file to compare against")
+    args = p.parse_args()
+
+    results = []
+    for size in [int(s) for s in args.sizes.split(",") if s.strip()]:
+        result = bench_size(size, args)
+        results.append(result)
+        for name, m in result["scenarios"].items():
+            print(
+                f"{size:>6} {name:<15} median {m['wall_ms_median']:8.1f} ms  spawns {m['spawns']:3d}"
+                f"  peak rss {m['peak_rss_kib'] / 1024:6.1f} MiB" + (f"  failures {m['failures']}" if m["failures"] else "")
+            )
+
+    report = {
+        "revision": git_revision(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {k: getattr(args, k) for k in ["runs", "latency", "containers", "payload", "lookups"]},
+        "results": results,
+    }
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), report)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
+    print(f"results written to {args.output}")
+    return 1 if any(m["failures"] for r in results for m in r["scenarios"].values()) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,7 @@
+"""servicectl's implementation, imported by scripts/servicectl.py.
+
+A package rather than one script so that each run loads cached bytecode, and so that a
+command imports only what it uses: `list`, `show` and --dry-run load the registry and the
+command runner, while the Docker engine client, history, probes, fleet scheduling and the
+daemon are imported by the commands that need them.
+"""
@@ -0,0 +1,384 @@
+"""Single-service actions: precheck, version capture, update/restart and post-checks."""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from contextlib import nullcontext
+
+from .common import COMPOSE_PULL_CMD, COMPOSE_SWAP_CMD, DEFAULT_SHELL, NATIVE_RUNTIMES, _image_lock, _span
+from .compose import (
+    _component_version_text, _compose_config, _docker_compose_version_snapshot, _docker_precheck,
+    _is_default_compose_update, _local_image_ids,
+)
+from .native import _has_native_status, _native_precheck, _native_version_snapshot, _run_native_status
+from .registry import _load_config, _resolve_service
+from .runner import _run_action, _run_command, _run_shell
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any, Dict, List, Optional, Tuple
+
+
+def _precheck(entry: Dict, action: str) -> int:
+    if action != "update":
+        return 0
+
+    runtime = str(entry.get("runtime", "custom")).strip().lower()
+    if runtime != "docker_compose" and runtime not in NATIVE_RUNTIMES:
+        return 0
+
+    with _span("precheck") as span:
+        span["rc"] = _docker_precheck(entry) if runtime == "docker_compose" else _native_precheck(runtime, entry)
+    return span["rc"]
+
+
+def _custom_version_snapshot(entry: Dict) -> Dict[str, Any]:
+    version_cmd = str(entry.get("version_cmd", "")).strip()
+    if not version_cmd:
+        return {"ok": False, "output": "", "error": "version_cmd not configured"}
+
+    cp = _run_shell(entry, version_cmd)
+    out = (cp.stdout or "").strip()
+    err = (cp.stderr or "").strip()
+    return {
+        "ok": cp.returncode == 0,
+        "output": out,
+        "error": "" if cp.returncode == 0 else (err or out or f"exit {cp.returncode}"),
+    }
+
+
+def _capture_version(entry: Dict, phase: str = "snapshot", record: bool = True) -> Dict[str, Any]:
+    """Version snapshot of an update/restart/rollback; record=True keeps its containers and images in the history store."""
+    runtime = str(entry.get("runtime", "custom"))
+    snap: Dict[str, Any] = {"runtime": runtime}
+
+    with _span(phase) as span:
+        if runtime == "docker_compose":
+            snap["runtime_snapshot"] = _docker_compose_version_snapshot(entry, record)
+            span["rc"] = 0 if snap["runtime_snapshot"].get("ok") else 1
+        elif runtime in NATIVE_RUNTIMES:
+            snap["runtime_snapshot"] = _native_version_snapshot(runtime, entry)
+            span["rc"] = 0 if snap["runtime_snapshot"].get("ok") else 1
+
+        if str(entry.get("version_cmd", "")).strip():
+            snap["custom_snapshot"] = _custom_version_snapshot(entry)
+
+    return snap
+
+
+def _version_report_lines(before: Dict[str, Any], after: Dict[str, Any], indent: str = "") -> List[str]:
+    lines: List[str] = []
+    before_runtime = before.get("runtime_snapshot") if isinstance(before, dict) else None
+    after_runtime = after.get("runtime_snapshot") if isinstance(after, dict) else None
+
+    if isinstance(before_runtime, dict) and isinstance(after_runtime, dict):
+        bcomps = before_runtime.get("components", {}) or {}
+        acomps = after_runtime.get("components", {}) or {}
+        all_names = sorted(set(bcomps.keys()) | set(acomps.keys()))
+        if all_names:
+            lines.append(f"{indent}- components:")
+            for name in all_names:
+                b = bcomps.get(name)
+                a = acomps.get(name)
+                if b and a:
+                    btxt = _component_version_text(b)
+                    atxt = _component_version_text(a)
+                    changed = btxt != atxt or b.get("image_id") != a.get("image_id")
+                    restarted = b.get("container_id") != a.get("container_id")
+                    status = "changed" if changed else "restarted" if restarted else "same"
+                    lines.append(f"{indent}  - {name}: {btxt} -> {atxt} ({status})")
+                elif (not b) and a:
+                    atxt = _component_version_text(a)
+                    lines.append(f"{indent}  - {name}: (new) -> {atxt}")
+                elif b and (not a):
+                    btxt = _component_version_text(b)
+                    lines.append(f"{indent}  - {name}: {btxt} -> (removed)")
+
+    b_custom = before.get("custom_snapshot") if isinstance(before, dict) else None
+    a_custom = after.get("custom_snapshot") if isinstance(after, dict) else None
+    if isinstance(b_custom, dict) or isinstance(a_custom, dict):
+        b_text = (b_custom or {}).get("output", "") if isinstance(b_custom, dict) else ""
+        a_text = (a_custom or {}).get("output", "") if isinstance(a_custom, dict) else ""
+        if b_text or a_text:
+            lines.append(f"{indent}- custom_version:")
+            lines.append(f"{indent}  - before: {b_text or '-'}")
+            lines.append(f"{indent}  - after: {a_text or '-'}")
+    return lines
+
+
+def _result_text(rc: int) -> str:
+    return "success" if rc == 0 else f"failed (exit {rc})"
+
+
+def _rollback_text(rollback: Dict[str, Any]) -> str:
+    components = ", ".join(rollback["components"]) or "nothing to roll back"
+    return f"{_result_text(rollback['rc'])} in {rollback['duration']:.2f}s ({components})"
+
+
+def _print_version_report(
+    service_key: str,
+    before: Dict[str, Any],
+    after: Dict[str, Any],
+    action: str,
+    rc: int,
+    note: str = "",
+    duration: Optional[float] = None,
+) -> None:
+    print("[VERSION_REPORT]", flush=True)
+    print(f"- target: {service_key}", flush=True)
+    print(f"- action: {action}", flush=True)
+    print(f"- result: {_result_text(rc)}", flush=True)
+    if duration is not None:
+        print(f"- duration: {duration:.2f}s", flush=True)
+    if note:
+        print(f"- note: {note}", flush=True)
+    for line in _version_report_lines(before, after):
+        print(line, flush=True)
+
+
+def _print_fleet_version_report(action: str, results: List[Dict[str, Any]]) -> None:
+    failed = [r for r in results if r["rc"] != 0]
+    print("[VERSION_REPORT]", flush=True)
+    print(f"- action: {action}", flush=True)
+    print(f"- targets: {len(results)} (success {len(results) - len(failed)}, failed {len(failed)})", flush=True)
+    for r in results:
+        print(f"- target: {r['key']}", flush=True)
+        print(f"  - result: {_result_text(r['rc'])}", flush=True)
+        if r.get("note"):
+            print(f"  - note: {r['note']}", flush=True)
+        if r.get("swap_window") is not None:
+            print(f"  - swap_window: {r['swap_window']:.2f}s", flush=True)
+        if r.get("rollback"):
+            print(f"  - rollback: {_rollback_text(r['rollback'])}", flush=True)
+        for line in _version_report_lines(r["before"], r["after"], indent="  "):
+            print(line, flush=True)
+
+
+def _ensure_service(data: Dict, name: str) -> Tuple[str, Dict]:
+    key = name.strip().lower()
+    if not key:
+        raise ValueError("service name cannot be empty")
+
+    services = data.setdefault("services", {})
+    if key not in services:
+        services[key] = {
+            "display_name": name.strip(),
+            "path": "",
+            "runtime": "custom",
+            "aliases": [],
+            "shell": DEFAULT_SHELL,
+            "shell_init": ":",
+            "env": {},
+            "actions": {},
+        }
+    return key, services[key]
+
+
+SMART_SKIP_NOTE = "unchanged: pulled images match running containers, up -d and post-check skipped"
+
+
+def _compose_update_is_noop(entry: Dict, before: Dict[str, Any]) -> bool:
+    """True when every compose service is running and each container already uses the image its ref now points to.
+
+    Only images are compared: compose file edits still need a regular update.
+    """
+    runtime_snap = before.get("runtime_snapshot") or {}
+    components = runtime_snap.get("components") or {}
+    if not runtime_snap.get("ok") or not components:
+        return False
+
+    error, config = _compose_config(entry)
+    if error is not None:
+        return False
+    expected = set()
+    for name, svc in (config.get("services") or {}).items():
+        replicas = ((svc or {}).get("deploy") or {}).get("replicas")
+        if replicas != 0:
+            expected.add(name)
+    if not expected <= set(components):
+        return False
+
+    refs = sorted({str(c.get("image_ref", "")) for c in components.values() if c.get("image_ref")})
+    local_ids = _local_image_ids(entry, refs)
+    if not local_ids:
+        return False
+    return all(c.get("image_ref") and local_ids.get(c["image_ref"]) == c.get("image_id") for c in components.values())
+
+
+def _run_smart_update(entry: Dict, before: Dict[str, Any]) -> Tuple[int, bool]:
+    """Pull, then swap only if something changed. Returns (exit code, skipped)."""
+    rc = _precheck(entry, "update")
+    if rc != 0:
+        return rc, False
+    rc = _run_command(entry, COMPOSE_PULL_CMD, "update", phase="pull")
+    if rc != 0:
+        return rc, False
+    if _compose_update_is_noop(entry, before):
+        print("[SMART] pulled images match the running containers; skipping up -d", flush=True)
+        return 0, True
+    return _run_command(entry, COMPOSE_SWAP_CMD, "update", phase="up"), False
+
+
+def _perform_action(
+    key: str,
+    entry: Dict,
+    action: str,
+    dry_run: bool,
+    report: bool = True,
+    smart: bool = False,
+    rolling: Optional[Dict[str, Any]] = None,
+    auto_rollback: bool = False,
+) -> Dict[str, Any]:
+    print(f"[SERVICE] {key}", flush=True)
+    locks_images = action == "update" and not dry_run and str(entry.get("runtime", "custom")) == "docker_compose"
+    with _span(action, service=key) as span, (_image_lock(exclusive=False) if locks_images else nullcontext()):
+        need_version_report = (action in {"update", "restart"}) and (not dry_run)
+        before_snap: Dict[str, Any] = {}
+        after_snap: Dict[str, Any] = {}
+        started_at = time.time()
+        if need_version_report:
+            before_snap = _capture_version(entry, "snapshot_before")
+
+        skipped = False
+        compose = str(entry.get("runtime", "custom")) == "docker_compose"
+        if rolling is not None and compose and action in {"update", "restart"}:
+            if dry_run:
+                print(f"[DRY-RUN] rolling {action} in batches of {rolling['batch_size']}"
+                      f" (min available {rolling.get('min_available') or '-'}); containers are resolved at run time", flush=True)
+                rc = 0
+            else:
+                from .rolling import _run_rolling
+
+                rc = _run_rolling(key, entry, action, rolling["batch_size"], rolling.get("min_available"))
+        elif smart and action == "update" and not dry_run and _is_default_compose_update(entry):
+            rc, skipped = _run_smart_update(entry, before_snap)
+        else:
+            rc = _run_action(entry, action, dry_run=dry_run)
+        note = SMART_SKIP_NOTE if skipped else ""
+
+        result = {"key": key, "rc": rc, "before": before_snap, "after": after_snap, "reported": need_version_report, "note": note}
+        if need_version_report:
+            from .history import _record_history
+            from .rollback import _auto_rollback
+
+            after_snap = result["after"] = before_snap if skipped else _capture_version(entry, "snapshot_after")
+            _record_history(key, entry, action, started_at, result)
+            if report:
+                _print_version_report(service_key=key, before=before_snap, after=after_snap, action=action, rc=rc, note=note)
+
+            check_rc = result["check_rc"] = _post_check(key, entry) if rc == 0 and not skipped else 0
+            if auto_rollback and action == "update" and (rc != 0 or check_rc != 0):
+                result["rollback"] = _auto_rollback(key, entry, before_snap, after_snap, report)
+                result["rc"] = rc or check_rc
+        span["rc"] = result["rc"]
+
+    return result
+
+
+def _post_check(key: str, entry: Dict) -> int:
+    """Run the status action and, when declared, the health probes once; returns the first failure."""
+    from .probes import _run_probe_health, _service_probes
+
+    rc = 0
+    actions = entry.get("actions", {}) or {}
+    with _span("post_check") as span:
+        if "status" in actions and str(actions.get("status", "")).strip():
+            print("[POST_CHECK] status", flush=True)
+            rc = _run_action(entry, "status", dry_run=False)
+        elif _has_native_status(entry):
+            print("[POST_CHECK] status", flush=True)
+            rc = _run_native_status([(key, entry)], dry_run=False)
+        if _service_probes(entry):
+            print("[POST_CHECK] probes", flush=True)
+            with _span("probes") as probes:
+                probes["rc"] = _run_probe_health([(key, entry)], 1, dry_run=False)
+            rc = rc or probes["rc"]
+        span["rc"] = rc
+    return rc
+
+
+def _run_named_action(
+    service: str,
+    action: str,
+    dry_run: bool,
+    smart: bool = False,
+    timeout: Optional[float] = None,
+    rolling: Optional[Dict[str, Any]] = None,
+    auto_rollback: bool = False,
+) -> int:
+    data = _load_config()
+    services = data.get("services", {})
+    try:
+        key, entry = _resolve_service(services, service)
+    except KeyError as e:
+        print(f"[ERROR] {e}", file=sys.stderr)
+        return 1
+
+    entry = _with_timeout_override(entry, action, timeout)
+    return _perform_action(key, entry, action, dry_run, smart=smart, rolling=rolling, auto_rollback=auto_rollback)["rc"]
+
+
+def _select_services(services: Dict, names: List[str], select_all: bool, tags: List[str]) -> List[Tuple[str, Dict]]:
+    selected: Dict[str, Dict] = {}
+    if select_all:
+        for key in sorted(services.keys()):
+            selected[key] = services[key]
+
+    wanted_tags = {t.strip().lower() for t in tags if t.strip()}
+    if wanted_tags:
+        for key in sorted(services.keys()):
+            entry_tags = {str(t).strip().lower() for t in services[key].get("tags", [])}
+            if entry_tags & wanted_tags:
+                selected.setdefault(key, services[key])
+
+    for name in names:
+        key, entry = _resolve_service(services, name)
+        selected.setdefault(key, entry)
+
+    return list(selected.items())
+
+
+def _with_timeout_override(entry: Dict, action: str, timeout: Optional[float]) -> Dict:
+    if timeout is None:
+        return entry
+    timeouts = dict(entry.get("timeouts", {}) or {})
+    timeouts[action] = timeout
+    return {**entry, "timeouts": timeouts}
+
+
+def _selected_targets(args: argparse.Namespace, action: str) -> Optional[List[Tuple[str, Dict]]]:
+    data = _load_config()
+    services = data.get("services", {})
+    try:
+        targets = _select_services(services, args.service, args.all, args.tag)
+    except KeyError as e:
+        print(f"[ERROR] {e}", file=sys.stderr)
+        return None
+    if not targets:
+        print("[ERROR] no services selected (pass service names, --all or --tag)", file=sys.stderr)
+        return None
+    return [(key, _with_timeout_override(entry, action, args.timeout)) for key, entry in targets]
+
+
+def _rolling_options(args: argparse.Namespace) -> Optional[Dict[str, Any]]:
+    if not getattr(args, "rolling", False):
+        return None
+    return {"batch_size": args.batch_size, "min_available": args.min_available}
+
+
+def _run_selected_action(args: argparse.Namespace, action: str) -> int:
+    smart = bool(getattr(args, "smart", False))
+    rolling = _rolling_options(args)
+    auto_rollback = bool(getattr(args, "auto_rollback", False))
+    if len(args.service) == 1 and not args.all and not args.tag:
+        return _run_named_action(
+            args.service[0], action, args.dry_run, smart=smart, timeout=args.timeout, rolling=rolling, auto_rollback=auto_rollback
+        )
+
+    from .fleet import _run_fleet_action
+
+    targets = _selected_targets(args, action)
+    if targets is None:
+        return 1
+    return _run_fleet_action(targets, action, args.dry_run, args.jobs, smart=smart, rolling=rolling, auto_rollback=auto_rollback)
@@ -0,0 +1,711 @@
+"""Command-line parsing and the command entry points; each command imports the modules it needs."""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import nullcontext
+
+from .common import (
+    DAEMON_COMMANDS, DEFAULT_TIMEOUTS, DOCKER_COMPOSE_DEFAULTS, HISTORY_PATH, NATIVE_RUNTIMES, _SPANS, _VERBOSE,
+    _FleetRouter, _image_lock, _span,
+)
+from .registry import (
+    REGISTRY_RETRIES, _REGISTRY_MEMO, _load_config, _load_service, _migrate_registry, _resolve_service, _service_index,
+    _store_service,
+)
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Dict
+
+DEFAULT_HISTORY_LIMIT = 20
+DAEMON_POLL_SECONDS = 2.0
+DEFAULT_FLEET_JOBS = 4
+DEFAULT_PULL_JOBS = 4
+DOCKER_BACKENDS = ["cli", "engine"]
+DEFAULT_REGISTRY_JOBS = 8
+DEFAULT_REGISTRY_CACHE_TTL = 300.0
+DEFAULT_GC_KEEP = 2
+
+
+def cmd_list(args: argparse.Namespace) -> int:
+    data = _load_config()
+    services = data.get("services", {})
+    if not services:
+        print("(no services configured)")
+        return 0
+
+    statuses = _status_summaries(services) if args.with_status else {}
+
+    for key in sorted(services.keys()):
+        entry = services[key]
+        display = entry.get("display_name") or key
+        runtime = entry.get("runtime", "custom")
+        path = entry.get("path", "")
+        aliases = ",".join(entry.get("aliases", []))
+        tags = ",".join(entry.get("tags", []))
+        depends_on = ",".join(entry.get("depends_on", []))
+        units = ",".join(entry.get("units", []))
+        print(f"- {key} ({display})")
+        print(f"  runtime: {runtime}")
+        print(f"  path: {path}")
+        if aliases:
+            print(f"  aliases: {aliases}")
+        if tags:
+            print(f"  tags: {tags}")
+        if depends_on:
+            print(f"  depends_on: {depends_on}")
+        if units:
+            print(f"  units: {units}")
+        if key in statuses:
+            print(f"  status: {statuses[key]}")
+    return 0
+
+
+def _status_summaries(services: Dict) -> Dict[str, str]:
+    """One-line state of every compose, systemd and pm2 service, batched like `status --all`."""
+    from .compose import _compose_status_rows
+    from .native import _native_states, _native_summary
+
+    targets = sorted(services.items())
+    compose = [(key, entry) for key, entry in targets if str(entry.get("runtime", "custom")) == "docker_compose"]
+    native = [(key, entry) for key, entry in targets if str(entry.get("runtime", "custom")) in NATIVE_RUNTIMES]
+    summaries: Dict[str, str] = {}
+    if compose:
+        error, rows = _compose_status_rows(compose)
+        for key, _ in compose:
+            row = rows.get(key)
+            summaries[key] = f"unknown ({error})" if row is None else (
+                f"{row['running']} running, health {row['health']}, up {row['uptime']}, version {row['version']}"
+            )
+    for key, (error, components) in (_native_states(native) if native else {}).items():
+        summaries[key] = _native_summary(error, components)
+    return summaries
+
+
+def cmd_show(args: argparse.Namespace) -> int:
+    data = _load_config()
+    services = data.get("services", {})
+    try:
+        key, entry = _resolve_service(services, args.service)
+    except KeyError as e:
+        print(f"[ERROR] {e}", file=sys.stderr)
+        return 1
+
+    print(json.dumps({"id": key, **entry}, ensure_ascii=False, indent=2, sort_keys=True))
+    return 0
+
+
+def cmd_history(args: argparse.Namespace) -> int:
+    from .actions import _result_text, _version_report_lines
+    from .history import _history_store
+
+    data = _load_config()
+    services = data.get("services", {})
+    try:
+        key, _ = _resolve_service(services, args.service)
+    except KeyError:
+        # History outlives the registry entry: fall back to the literal id of a removed service.
+        key = args.service
+
+    store = _history_store() if os.path.exists(HISTORY_PATH) else None
+    deployments = store.deployments(key, max(1, args.limit)) if store is not None else []
+    if args.json:
+        print(json.dumps(deployments, ensure_ascii=False, indent=2, sort_keys=True))
+        return 0
+    if not deployments:
+        print(f"[HISTORY] no deployments recorded for {key}")
+        return 0
+
+    print(f"[HISTORY] {key}: showing {len(deployments)} of {store.count(key)} deployments")
+    for d in deployments:
+        when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(d["started_at"]))
+        print(f"- #{d['id']} {when} {d['action']} {_result_text(d['rc'])} ({d['finished_at'] - d['started_at']:.2f}s)")
+        if d["note"]:
+            print(f"  - note: {d['note']}")
+        for line in _version_report_lines(d["before"], d["after"], indent="  "):
+            print(line)
+    return 0
+
+
+def _min_available_arg(text: str) -> str:
+    """argparse type for --min-available: a container count or a percentage of replicas."""
+    value = text.strip()
+    number = value[:-1] if value.endswith("%") else value
+    if not number.isdigit() or (value.endswith("%") and int(number) > 100):
+        raise argparse.ArgumentTypeError(f"expected a count or a percentage, got '{text}'")
+    return value
+
+
+def cmd_rollback(args: argparse.Namespace) -> int:
+    from .rollback import _rollback_service
+
+    data = _load_config()
+    services = data.get("services", {})
+    try:
+        key, entry = _resolve_service(services, args.service)
+    except KeyError as e:
+        print(f"[ERROR] {e}", file=sys.stderr)
+        return 1
+    if str(entry.get("runtime", "custom")) != "docker_compose":
+        print(f"[ERROR] rollback needs a docker_compose service: {key}", file=sys.stderr)
+        return 1
+
+    print(f"[SERVICE] {key}", flush=True)
+    with _span("rollback", service=key) as span, (nullcontext() if args.dry_run else _image_lock(exclusive=False)):
+        span["rc"] = _rollback_service(key, entry, args.to, args.dry_run)
+    return span["rc"]
+
+
+def cmd_update(args: argparse.Namespace) -> int:
+    from .actions import _run_selected_action, _selected_targets
+
+    if args.two_phase and args.rolling:
+        print("[ERROR] --two-phase and --rolling cannot be combined", file=sys.stderr)
+        return 2
+    if not args.two_phase:
+        rc = _run_selected_action(args, "update")
+    else:
+        from .fleet import _run_two_phase_update
+
+        targets = _selected_targets(args, "update")
+        if targets is None:
+            return 1
+        with nullcontext() if args.dry_run else _image_lock(exclusive=False):
+            rc = _run_two_phase_update(
+                targets, args.jobs, args.pull_jobs, args.dry_run, smart=args.smart, auto_rollback=args.auto_rollback
+            )
+    if not args.gc:
+        return rc
+    if rc != 0:
+        print("[GC] skipped: update failed", flush=True)
+        return rc
+    from .gc import _gc_registered
+
+    return _gc_registered(args.gc_keep, args.dry_run)
+
+
+def cmd_restart(args: argparse.Namespace) -> int:
+    from .actions import _run_selected_action
+
+    return _run_selected_action(args, "restart")
+
+
+def cmd_status(args: argparse.Namespace) -> int:
+    """Several compose services on the default status command are read from one container listing and
+    systemd/pm2 services share one state query; the rest run their status action."""
+    from .actions import _run_selected_action, _selected_targets
+    from .compose import _has_listing_status, _run_compose_listing_status
+    from .native import _has_native_status, _run_native_status
+
+    targets = _selected_targets(args, "status")
+    if targets is None:
+        return 1
+    fleet = len(targets) > 1 or args.all or bool(args.tag)
+    listed = [(key, entry) for key, entry in targets if fleet and _has_listing_status(entry)]
+    native = [(key, entry) for key, entry in targets if _has_native_status(entry)]
+    if not listed and not native:
+        return _run_selected_action(args, "status")
+
+    rc = 0
+    if listed:
+        rc = _run_compose_listing_status(listed, args.dry_run)
+    if native:
+        rc_native = _run_native_status(native, args.dry_run)
+        rc = rc or rc_native
+    batched = {key for key, _ in listed + native}
+    others = [(key, entry) for key, entry in targets if key not in batched]
+    if others:
+        from .fleet import _run_fleet_action
+
+        rc_others = _run_fleet_action(others, "status", args.dry_run, args.jobs)
+        rc = rc or rc_others
+    return rc
+
+
+def cmd_health(args: argparse.Namespace) -> int:
+    """Services with declared probes are checked by the probe runner; the rest run their health action."""
+    from .actions import _run_selected_action, _selected_targets
+    from .probes import _run_probe_health, _service_probes
+
+    targets = _selected_targets(args, "health")
+    if targets is None:
+        return 1
+    probed = [(key, entry) for key, entry in targets if _service_probes(entry)]
+    if not probed:
+        return _run_selected_action(args, "health")
+
+    rc = _run_probe_health(probed, args.samples, args.dry_run)
+    others = [(key, entry) for key, entry in targets if not _service_probes(entry)]
+    if others:
+        from .fleet import _run_fleet_action
+
+        rc_others = _run_fleet_action(others, "health", args.dry_run, args.jobs)
+        rc = rc or rc_others
+    return rc
+
+
+def cmd_gc(args: argparse.Namespace) -> int:
+    from .gc import _gc_registered
+
+    return _gc_registered(args.keep, args.dry_run)
+
+
+def cmd_outdated(args: argparse.Namespace) -> int:
+    """Report which compose services would change on update, from registry manifest digests; nothing is pulled."""
+    from .actions import _selected_targets
+    from .outdated import _run_outdated
+
+    targets = _selected_targets(args, "outdated")
+    if targets is None:
+        return 1
+    compose = [(key, entry) for key, entry in targets if entry.get("runtime") == "docker_compose"]
+    for key, entry in targets:
+        if entry.get("runtime") != "docker_compose" and not args.quiet:
+            print(f"[SKIP] {key}: {entry.get('runtime', 'custom')} services have no registry images")
+    if not compose:
+        return 0
+    return _run_outdated(compose, args.jobs, args.cache_ttl, args.quiet)
+
+
+def cmd_watch(args: argparse.Namespace) -> int:
+    from .actions import _selected_targets
+    from .runner import _timeout_for
+    from .watch import _watch_services
+
+    targets = _selected_targets(args, "watch")
+    if targets is None:
+        return 1
+    others = [key for key, entry in targets if str(entry.get("runtime", "custom")) != "docker_compose"]
+    if others:
+        print(f"[ERROR] watch needs docker_compose services: {', '.join(others)}", file=sys.stderr)
+        return 1
+    timeout = max(_timeout_for(entry, "watch") or DEFAULT_TIMEOUTS["watch"] for _, entry in targets)
+    return _watch_services(targets, timeout)
+
+
+def cmd_logs(args: argparse.Namespace) -> int:
+    import re
+    from .actions import _selected_targets
+    from .logs import _run_logs
+
+    targets = _selected_targets(args, "logs")
+    if targets is None:
+        return 1
+    others = [key for key, entry in targets if str(entry.get("runtime", "custom")) != "docker_compose"]
+    if others:
+        print(f"[ERROR] logs needs docker_compose services: {', '.join(others)}", file=sys.stderr)
+        return 1
+    try:
+        pattern = re.compile(args.grep) if args.grep else None
+    except re.error as e:
+        print(f"[ERROR] invalid --grep pattern: {e}", file=sys.stderr)
+        return 2
+    return _run_logs(targets, args.since, args.tail, args.follow, pattern)
+
+
+def cmd_run(args: argparse.Namespace) -> int:
+    from .actions import _run_named_action
+
+    return _run_named_action(args.service, args.action, args.dry_run, timeout=args.timeout)
+
+
+def cmd_set(args: argparse.Namespace) -> int:
+    import copy
+    from .actions import _ensure_service
+
+    key = args.service.strip().lower()
+    for _ in range(REGISTRY_RETRIES):
+        # Only --depends-on needs the other services, to resolve their names and aliases.
+        services = _load_config()["services"] if args.depends_on else {}
+        expected = services.get(key) if args.depends_on else _load_service(key)
+        data = {"services": {key: copy.deepcopy(expected)} if expected is not None else {}}
+        key, entry = _ensure_service(data, args.service)
+        rc = _apply_service_args(key, entry, args, {**services, key: entry})
+        if rc != 0:
+            return rc
+        if _store_service(key, entry, expected):
+            print(f"[OK] service saved: {key}")
+            return 0
+    print(f"[ERROR] {key} was changed by another writer {REGISTRY_RETRIES} times; try again", file=sys.stderr)
+    return 1
+
+
+def _apply_service_args(key: str, entry: Dict, args: argparse.Namespace, services: Dict) -> int:
+    from .native import _service_units
+    from .probes import _parse_probe_spec, _service_probes
+
+    if args.display_name is not None:
+        entry["display_name"] = args.display_name
+    if args.path is not None:
+        entry["path"] = args.path
+    if args.runtime is not None:
+        entry["runtime"] = args.runtime
+
+    if args.alias:
+        existing = {str(a).strip().lower(): a for a in entry.get("aliases", []) if str(a).strip()}
+        for alias in args.alias:
+            k = alias.strip().lower()
+            if k:
+                existing[k] = alias.strip()
+        entry["aliases"] = sorted(existing.values(), key=lambda x: x.lower())
+
+    if args.tag:
+        existing_tags = {str(t).strip().lower() for t in entry.get("tags", []) if str(t).strip()}
+        for tag in args.tag:
+            t = tag.strip().lower()
+            if t:
+                existing_tags.add(t)
+        entry["tags"] = sorted(existing_tags)
+
+    if args.depends_on or args.no_depends_on:
+        upstreams = {str(d).strip().lower() for d in entry.get("depends_on", []) if str(d).strip()}
+        for name in args.depends_on:
+            try:
+                upstream, _ = _resolve_service(services, name)
+            except KeyError as e:
+                print(f"[ERROR] invalid --depends-on: {e}", file=sys.stderr)
+                return 2
+            if upstream == key:
+                print(f"[ERROR] {key} cannot depend on itself", file=sys.stderr)
+                return 2
+            upstreams.add(upstream)
+        for name in args.no_depends_on:
+            upstreams.discard(name.strip().lower())
+        if upstreams:
+            entry["depends_on"] = sorted(upstreams)
+        else:
+            entry.pop("depends_on", None)
+
+    if args.unit or args.no_unit:
+        units = [u for u in _service_units(entry) + [u.strip() for u in args.unit if u.strip()] if u not in args.no_unit]
+        entry["units"] = list(dict.fromkeys(units))
+    if entry.get("runtime") in NATIVE_RUNTIMES:
+        if not _service_units(entry):
+            entry["units"] = [f"{key}.service" if entry["runtime"] == "systemd" else key]
+        if not str(entry.get("path", "")).strip():
+            entry["path"] = "/"
+
+    if args.shell is not None:
+        entry["shell"] = args.shell
+
+    if args.shell_init is not None:
+        entry["shell_init"] = args.shell_init
+
+    if args.shell_session is not None:
+        entry["shell_session"] = args.shell_session == "on"
+
+    if args.env:
+        existing_env = entry.get("env", {})
+        if not isinstance(existing_env, dict):
+            existing_env = {}
+        for pair in args.env:
+            if "=" not in pair:
+                print(f"[ERROR] invalid --env '{pair}', expected KEY=VALUE", file=sys.stderr)
+                return 2
+            key, value = pair.split("=", 1)
+            key = key.strip()
+            if not key:
+                print(f"[ERROR] invalid --env '{pair}', key is empty", file=sys.stderr)
+                return 2
+            existing_env[key] = value
+        entry["env"] = existing_env
+
+    if args.timeout:
+        timeouts = entry.get("timeouts", {})
+        if not isinstance(timeouts, dict):
+            timeouts = {}
+        for pair in args.timeout:
+            name, _, value = pair.partition("=")
+            name = name.strip()
+            try:
+                seconds = float(value)
+            except ValueError:
+                seconds = -1.0
+            if not name or seconds < 0:
+                print(f"[ERROR] invalid --timeout '{pair}', expected NAME=SECONDS", file=sys.stderr)
+                return 2
+            if seconds == 0:
+                timeouts.pop(name, None)
+            else:
+                timeouts[name] = seconds
+        entry["timeouts"] = timeouts
+
+    if args.probe:
+        probes = {p["name"]: p for p in _service_probes(entry)}
+        for spec in args.probe:
+            try:
+                name, probe = _parse_probe_spec(spec)
+            except ValueError as e:
+                print(f"[ERROR] invalid --probe '{spec}': {e}", file=sys.stderr)
+                return 2
+            if probe is None:
+                probes.pop(name, None)
+            else:
+                probes[name] = probe
+        entry["probes"] = list(probes.values())
+
+    if args.version_cmd is not None:
+        entry["version_cmd"] = args.version_cmd
+
+    if args.compose_project is not None:
+        entry["compose_project"] = args.compose_project
+
+    if args.docker_backend is not None:
+        entry["docker_backend"] = args.docker_backend
+
+    actions = entry.setdefault("actions", {})
+
+    if (args.runtime == "docker_compose") or (entry.get("runtime") == "docker_compose"):
+        for k, v in DOCKER_COMPOSE_DEFAULTS.items():
+            actions.setdefault(k, v)
+
+    if args.update_cmd is not None:
+        actions["update"] = args.update_cmd
+    if args.restart_cmd is not None:
+        actions["restart"] = args.restart_cmd
+    if args.status_cmd is not None:
+        actions["status"] = args.status_cmd
+    if args.health_cmd is not None:
+        actions["health"] = args.health_cmd
+
+    return 0
+
+
+def cmd_remove(args: argparse.Namespace) -> int:
+    key = args.service.strip().lower()
+    for _ in range(REGISTRY_RETRIES):
+        expected = _load_service(key)
+        if expected is None:
+            print(f"[ERROR] service not found: {args.service}", file=sys.stderr)
+            return 1
+        if _store_service(key, None, expected):
+            print(f"[OK] service removed: {key}")
+            return 0
+    print(f"[ERROR] {key} was changed by another writer {REGISTRY_RETRIES} times; try again", file=sys.stderr)
+    return 1
+
+
+def cmd_migrate(args: argparse.Namespace) -> int:
+    return _migrate_registry(args.dry_run)
+
+
+def cmd_serve(args: argparse.Namespace) -> int:
+    import signal
+    import socket
+    import socketserver
+    from .daemon import _daemon_socket_path, _handle_daemon_request, _watch_registry
+
+    class DaemonHandler(socketserver.StreamRequestHandler):
+        def handle(self) -> None:
+            _handle_daemon_request(self.rfile, self.wfile)
+
+    class DaemonServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+    path = args.socket or _daemon_socket_path()
+    if os.path.exists(path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+            print(f"[ERROR] a daemon is already listening on {path}", file=sys.stderr)
+            return 1
+        except OSError:
+            os.unlink(path)
+        finally:
+            probe.close()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    _REGISTRY_MEMO["enabled"] = True
+    _service_index(_load_config().get("services", {}))
+    sys.stdout = _FleetRouter(sys.__stdout__, "stdout")
+    sys.stderr = _FleetRouter(sys.__stderr__, "stderr")
+
+    old_umask = os.umask(0o177)
+    try:
+        server = DaemonServer(path, DaemonHandler)
+    finally:
+        os.umask(old_umask)
+
+    stop = threading.Event()
+    threading.Thread(target=_watch_registry, args=(args.poll, stop), daemon=True).start()
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown, daemon=True).start())
+    print(f"[SERVE] listening on {path}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+        if os.path.exists(path):
+            os.unlink(path)
+    print("[SERVE] stopped", flush=True)
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Service registry runner")
+    p.add_argument("--verbose", action="store_true", help="print exit code and elapsed time of every command")
+    p.add_argument("--timings", action="store_true", help="print a per-phase timing table after the command")
+    p.add_argument("--trace", metavar="FILE", help="write per-phase spans as Chrome trace-event JSON")
+    p.add_argument("--metrics-dir", metavar="DIR", help="write each service's last-run timings as Prometheus textfiles")
+    sub = p.add_subparsers(dest="cmd", required=True)
+
+    sp = sub.add_parser("list", help="list services")
+    sp.add_argument("--with-status", action="store_true", help="add each service's live state (one batched query per runtime)")
+    sp.set_defaults(func=cmd_list)
+
+    sp = sub.add_parser("show", help="show service json")
+    sp.add_argument("service")
+    sp.set_defaults(func=cmd_show)
+
+    for name, fn in [("update", cmd_update), ("restart", cmd_restart), ("status", cmd_status), ("health", cmd_health)]:
+        sp = sub.add_parser(name, help=f"run {name} action")
+        sp.add_argument("service", nargs="*")
+        sp.add_argument("--all", action="store_true", help="target every registered service")
+        sp.add_argument("--tag", action="append", default=[], help="target services carrying this tag")
+        sp.add_argument("--jobs", type=int, default=DEFAULT_FLEET_JOBS, help="max services processed concurrently")
+        sp.add_argument("--timeout", type=float, help=f"kill the {name} command after this many seconds")
+        sp.add_argument("--dry-run", action="store_true")
+        if name == "update":
+            sp.add_argument("--two-phase", action="store_true", help="pull all unique images first, then swap containers")
+            sp.add_argument("--pull-jobs", type=int, default=DEFAULT_PULL_JOBS, help="max concurrent image pulls (--two-phase)")
+            sp.add_argument("--smart", action="store_true", help="skip up -d and post-check when pulled images are unchanged")
+            sp.add_argument("--auto-rollback", action="store_true", help="restore the previous images if the update or post-check fails")
+            sp.add_argument("--gc", action="store_true", help="remove images no registered service needs after a successful update")
+            sp.add_argument("--gc-keep", type=int, default=DEFAULT_GC_KEEP, help="previous images kept per component (--gc)")
+        if name in {"update", "restart"}:
+            sp.add_argument("--rolling", action="store_true", help="cycle compose containers in readiness-gated batches")
+            sp.add_argument("--batch-size", type=int, default=1, help="containers per batch (--rolling)")
+            sp.add_argument(
+                "--min-available", type=_min_available_arg, help="containers (N or N%%) of each compose service kept running (--rolling)"
+            )
+        if name == "health":
+            sp.add_argument("--samples", type=int, default=1, help="probe each endpoint this many times and report p50/p95")
+        sp.set_defaults(func=fn)
+
+    sp = sub.add_parser("gc", help="remove images no registered compose service runs or may roll back to")
+    sp.add_argument("--keep", type=int, default=DEFAULT_GC_KEEP, help="previously deployed images kept per service component")
+    sp.add_argument("--dry-run", action="store_true")
+    sp.set_defaults(func=cmd_gc)
+
+    sp = sub.add_parser("outdated", help="show which compose services have newer images in their registry (no pull)")
+    sp.add_argument("service", nargs="*")
+    sp.add_argument("--all", action="store_true", help="check every registered service")
+    sp.add_argument("--tag", action="append", default=[], help="check services carrying this tag")
+    sp.add_argument("--jobs", type=int, default=DEFAULT_REGISTRY_JOBS, help="max concurrent snapshots and registry requests")
+    sp.add_argument(
+        "--cache-ttl", type=float, default=DEFAULT_REGISTRY_CACHE_TTL, help="reuse registry answers younger than this many seconds (0 disables)"
+    )
+    sp.add_argument("--quiet", action="store_true", help="print only the names of services that would change")
+    sp.set_defaults(func=cmd_outdated, timeout=None)
+
+    sp = sub.add_parser("rollback", help="re-pin compose services to the images they ran before the last update")
+    sp.add_argument("service")
+    sp.add_argument("--to", type=int, help="history deployment id to restore the pre-deployment images of")
+    sp.add_argument("--dry-run", action="store_true")
+    sp.set_defaults(func=cmd_rollback)
+
+    sp = sub.add_parser("watch", help="follow docker events until all containers are running and healthy")
+    sp.add_argument("service", nargs="*")
+    sp.add_argument("--all", action="store_true", help="watch every registered service")
+    sp.add_argument("--tag", action="append", default=[], help="watch services carrying this tag")
+    sp.add_argument("--timeout", type=float, help=f"give up after this many seconds (default {DEFAULT_TIMEOUTS['watch']:.0f})")
+    sp.set_defaults(func=cmd_watch)
+
+    sp = sub.add_parser("logs", help="stream container logs of compose services, merged in timestamp order")
+    sp.add_argument("service", nargs="*")
+    sp.add_argument("--all", action="store_true", help="show logs of every registered service")
+    sp.add_argument("--tag", action="append", default=[], help="show logs of services carrying this tag")
+    sp.add_argument("--since", help="only entries newer than this (e.g. 10m, 2h, or an RFC 3339 timestamp)")
+    sp.add_argument("--tail", help="entries per container to start from (default: all)")
+    sp.add_argument("--grep", help="only entries whose message matches this regular expression")
+    sp.add_argument("-f", "--follow", action="store_true", help="keep streaming new entries until interrupted")
+    sp.set_defaults(func=cmd_logs, timeout=None)
+
+    sp = sub.add_parser("history", help="show past update/restart runs and their versions")
+    sp.add_argument("service")
+    sp.add_argument("--limit", type=int, default=DEFAULT_HISTORY_LIMIT, help="most recent deployments to show")
+    sp.add_argument("--json", action="store_true", help="print deployments as json")
+    sp.set_defaults(func=cmd_history)
+
+    sp = sub.add_parser("run", help="run custom action")
+    sp.add_argument("service")
+    sp.add_argument("action")
+    sp.add_argument("--timeout", type=float, help="kill the action after this many seconds")
+    sp.add_argument("--dry-run", action="store_true")
+    sp.set_defaults(func=cmd_run)
+
+    sp = sub.add_parser("set", help="create/update a service")
+    sp.add_argument("service")
+    sp.add_argument("--display-name")
+    sp.add_argument("--path")
+    sp.add_argument("--runtime", choices=["docker_compose", "systemd", "pm2", "custom"])
+    sp.add_argument("--alias", action="append", default=[])
+    sp.add_argument("--tag", action="append", default=[])
+    sp.add_argument("--depends-on", action="append", default=[], help="service that must be updated/restarted (and pass its post-check) first")
+    sp.add_argument("--no-depends-on", action="append", default=[], help="drop a dependency")
+    sp.add_argument("--unit", action="append", default=[], help="systemd unit or pm2 app name (repeatable; default <service>.service / <service>)")
+    sp.add_argument("--no-unit", action="append", default=[], help="drop a unit")
+    sp.add_argument("--shell")
+    sp.add_argument("--shell-init")
+    sp.add_argument("--shell-session", choices=["on", "off"], help="run all commands of one operation in a single shell (shell_init runs once)")
+    sp.add_argument("--env", action="append", default=[])
+    sp.add_argument("--timeout", action="append", default=[], help="NAME=SECONDS for an action or 'probe' (0 removes)")
+    sp.add_argument("--probe", action="append", default=[], help="health probe '[NAME=]URL [status=N] [timeout=S] [retries=N]' (NAME= removes)")
+    sp.add_argument("--version-cmd")
+    sp.add_argument("--compose-project", help="compose project name (defaults to the path basename)")
+    sp.add_argument("--docker-backend", choices=DOCKER_BACKENDS, help="cli (default) or engine (Docker API over the socket)")
+    sp.add_argument("--update-cmd")
+    sp.add_argument("--restart-cmd")
+    sp.add_argument("--status-cmd")
+    sp.add_argument("--health-cmd")
+    sp.set_defaults(func=cmd_set)
+
+    sp = sub.add_parser("remove", help="remove a service")
+    sp.add_argument("service")
+    sp.set_defaults(func=cmd_remove)
+
+    sp = sub.add_parser("migrate", help="convert data/services.json into the sharded data/services.d registry")
+    sp.add_argument("--dry-run", action="store_true")
+    sp.set_defaults(func=cmd_migrate)
+
+    sp = sub.add_parser("serve", help="run a resident daemon answering list/show/history/update/restart/rollback/status/health/outdated/gc")
+    sp.add_argument("--socket", help="unix socket path (default: data/.cache/servicectl.sock or $SERVICECTL_SOCKET)")
+    sp.add_argument("--poll", type=float, default=DAEMON_POLL_SECONDS, help="registry reload poll interval in seconds")
+    sp.set_defaults(func=cmd_serve)
+
+    return p
+
+
+def main() -> int:
+    from .runner import _shell_sessions
+
+    argv = sys.argv[1:]
+    if argv and argv[0] in DAEMON_COMMANDS and not os.environ.get("SERVICECTL_NO_DAEMON"):
+        from .daemon import _forward_to_daemon
+
+        rc = _forward_to_daemon(argv)
+        if rc is not None:
+            return rc
+
+    parser = build_parser()
+    args = parser.parse_args()
+    _VERBOSE["enabled"] = args.verbose
+    if not (args.timings or args.trace or args.metrics_dir):
+        with _shell_sessions():
+            return int(args.func(args))
+
+    _SPANS.update(enabled=True, origin=time.monotonic(), wall_origin=time.time())
+    try:
+        with _shell_sessions():
+            return int(args.func(args))
+    finally:
+        from .timings import _report_spans
+
+        _report_spans(args)
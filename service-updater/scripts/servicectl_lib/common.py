@@ -0,0 +1,225 @@
+"""Paths, defaults and the helpers every command shares: output, phase spans and small file utilities."""
+from __future__ import annotations
+
+# Keep module-level imports to what every command needs: read-only paths (list, show,
+# --dry-run) must start fast, so subprocess, sockets, HTTP and thread pools are imported
+# inside the functions that use them, and each command imports only the modules it needs.
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any, Dict, List, Tuple
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+CACHE_DIR = os.path.join(BASE_DIR, "data", ".cache")
+HISTORY_PATH = os.path.join(BASE_DIR, "data", "history.sqlite3")
+# Read-only commands; update, restart, rollback and gc always run in the caller's own process.
+DAEMON_COMMANDS = {"list", "show", "status", "health", "history", "outdated"}
+
+COMPOSE_PULL_CMD = "docker compose pull"
+COMPOSE_SWAP_CMD = "docker compose up -d --remove-orphans"
+
+DOCKER_COMPOSE_DEFAULTS = {
+    "update": f"{COMPOSE_PULL_CMD} && {COMPOSE_SWAP_CMD}",
+    "restart": "docker compose restart",
+    "status": "docker compose ps",
+    "health": "docker compose ps",
+}
+
+NATIVE_RUNTIMES = ["systemd", "pm2"]
+
+DEFAULT_SHELL = "/bin/sh"
+# Seconds; per-service "timeouts" in services.json override these. Actions have no default limit.
+DEFAULT_TIMEOUTS = {"probe": 120.0, "watch": 120.0, "ready": 120.0}
+READ_CHUNK = 65536
+IMAGE_LOCK_PATH = os.path.join(CACHE_DIR, "images.lock")
+
+_OUTPUT_LOCK = threading.Lock()
+_FLEET_LOCAL = threading.local()
+_VERBOSE = {"enabled": False}
+# Phase spans collected when --timings, --trace or --metrics-dir is given; see _span.
+_SPANS: Dict[str, Any] = {"enabled": False, "origin": 0.0, "wall_origin": 0.0, "records": []}
+_SPANS_LOCK = threading.Lock()
+_SPAN_LOCAL = threading.local()
+
+
+@contextmanager
+def _span(name: str, service: str = "", **attrs: Any) -> Any:
+    """Time one phase; the caller may set "rc" (or other fields) on the yielded dict.
+
+    Spans nest per thread and inherit the service of the enclosing span. Every process
+    started by _exec is counted on all spans open on the calling thread.
+    """
+    record: Dict[str, Any] = {"name": name, **attrs}
+    if not _SPANS["enabled"]:
+        yield record
+        return
+    stack = getattr(_SPAN_LOCAL, "stack", None)
+    if stack is None:
+        stack = _SPAN_LOCAL.stack = []
+    parent = stack[-1] if stack else None
+    record.update(
+        service=service or (parent["service"] if parent else ""),
+        path=f"{parent['path']}/{name}" if parent else name,
+        depth=len(stack),
+        tid=threading.get_ident(),
+        rc=None,
+        spawns=0,
+    )
+    stack.append(record)
+    started = time.monotonic()
+    try:
+        yield record
+    finally:
+        record["start"] = started - _SPANS["origin"]
+        record["duration"] = time.monotonic() - started
+        stack.pop()
+        with _SPANS_LOCK:
+            _SPANS["records"].append(record)
+
+
+def _count_spawn() -> None:
+    for record in getattr(_SPAN_LOCAL, "stack", None) or []:
+        record["spawns"] += 1
+
+
+class _PrefixedStream:
+    """Line-buffered writer that prefixes every complete line and writes it atomically."""
+
+    def __init__(self, target: Any, prefix: str) -> None:
+        self._target = target
+        self._prefix = prefix
+        self._pending = ""
+
+    def write(self, text: str) -> int:
+        self._pending += text
+        while "\n" in self._pending:
+            line, self._pending = self._pending.split("\n", 1)
+            with _OUTPUT_LOCK:
+                self._target.write(f"{self._prefix}{line}\n")
+                self._target.flush()
+        return len(text)
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        if self._pending:
+            self.write("\n")
+
+
+class _FleetRouter:
+    """sys.stdout/sys.stderr stand-in routing fleet worker output through per-service prefixed streams."""
+
+    def __init__(self, target: Any, stream_name: str) -> None:
+        self._target = target
+        self._stream_name = stream_name
+
+    def _current(self) -> Any:
+        streams = getattr(_FLEET_LOCAL, "streams", None)
+        if streams:
+            return streams[self._stream_name]
+        return None
+
+    def write(self, text: str) -> int:
+        stream = self._current()
+        if stream is not None:
+            return stream.write(text)
+        with _OUTPUT_LOCK:
+            return self._target.write(text)
+
+    def flush(self) -> None:
+        if self._current() is None:
+            self._target.flush()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._target, name)
+
+
+@contextmanager
+def _image_lock(exclusive: bool) -> Any:
+    """Advisory lock on the local images: compose updates and rollbacks hold it shared, gc exclusively.
+
+    gc therefore never removes an image that an in-flight update has just pulled or is about to
+    record as the previous version, and updates wait for a running gc to finish.
+    """
+    import fcntl
+
+    os.makedirs(os.path.dirname(IMAGE_LOCK_PATH), exist_ok=True)
+    with open(IMAGE_LOCK_PATH, "a") as f:
+        mode = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+        try:
+            fcntl.flock(f.fileno(), mode | fcntl.LOCK_NB)
+        except BlockingIOError:
+            waiting_for = "running updates/rollbacks" if exclusive else "image gc"
+            print(f"[LOCK] waiting for {waiting_for} to finish", flush=True)
+            fcntl.flock(f.fileno(), mode)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _write_atomic(path: str, raw: bytes) -> None:
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(raw)
+    os.replace(tmp_path, path)
+
+
+def _dump_json(data: Any) -> bytes:
+    return (json.dumps(data, ensure_ascii=False, indent=2, sort_keys=True) + "\n").encode("utf-8")
+
+
+def _shell_quote(text: str) -> str:
+    import shlex
+
+    return shlex.quote(text)
+
+
+def _format_argv(argv: List[str]) -> str:
+    return " ".join(_shell_quote(x) for x in argv)
+
+
+def _short(s: str, n: int = 12) -> str:
+    if not s:
+        return "-"
+    return s[:n]
+
+
+def _safe_json_loads(text: str, fallback: Any) -> Any:
+    try:
+        return json.loads(text)
+    except Exception:
+        return fallback
+
+
+def _content_digest(paths: List[str], extra: Tuple[str, ...] = ()) -> str:
+    """sha256 over the named files (path and contents; unreadable files hash as empty) and extra strings."""
+    import hashlib
+
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(path.encode("utf-8", "surrogateescape") + b"\0")
+        try:
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(READ_CHUNK), b""):
+                    digest.update(chunk)
+        except OSError:
+            pass
+        digest.update(b"\0")
+    for text in extra:
+        digest.update(text.encode("utf-8", "surrogateescape") + b"\0")
+    return digest.hexdigest()
+
+
+def _format_size(size: float) -> str:
+    for unit in ["B", "KiB", "MiB"]:
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
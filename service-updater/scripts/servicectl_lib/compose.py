@@ -0,0 +1,631 @@
+"""docker compose projects: container and image records, version snapshots and status listings."""
+from __future__ import annotations
+
+import json
+import os
+import sys
+
+from .common import DOCKER_COMPOSE_DEFAULTS, HISTORY_PATH, _format_argv, _safe_json_loads, _shell_quote, _short, _span
+from .runner import _build_runner, _run_shell, _service_env, _service_workdir, _shell_bin, _shell_init
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any, Dict, List, Optional, Tuple
+
+    from .engine import _DockerEngine
+
+COMPOSE_PROJECT_LABEL = "com.docker.compose.project"
+COMPOSE_WORKDIR_LABEL = "com.docker.compose.project.working_dir"
+# One `docker ps` row per container: enough to group by project and to read state, health and uptime.
+COMPOSE_LISTING_FIELDS = ["id", "state", "status", "project", "working_dir"]
+COMPOSE_LISTING_FORMAT = "\t".join(
+    ["{{.ID}}", "{{.State}}", "{{.Status}}", f'{{{{.Label "{COMPOSE_PROJECT_LABEL}"}}}}', f'{{{{.Label "{COMPOSE_WORKDIR_LABEL}"}}}}']
+)
+INSPECT_BATCH = 1000
+# Projected `--format` output: one line per object of tab-separated JSON values (JSON escapes tabs),
+# so snapshots never load the env, mounts or history blocks of a full inspect.
+CONTAINER_INSPECT_FORMAT = "\t".join(
+    ["{{json .Id}}", "{{json .Name}}", "{{json .Config.Image}}", "{{json .Image}}", '{{json (index .Config.Labels "com.docker.compose.service")}}']
+)
+IMAGE_INSPECT_FORMAT = "\t".join(
+    [
+        "{{json .Id}}",
+        "{{json .RepoDigests}}",
+        '{{json (index .Config.Labels "org.opencontainers.image.version")}}',
+        '{{json (index .Config.Labels "org.label-schema.version")}}',
+        '{{json (index .Config.Labels "org.opencontainers.image.revision")}}',
+    ]
+)
+DURATION_SECONDS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400, "week": 604800, "month": 2592000, "year": 31536000}
+DOCKER_HUB_HOSTS = {"docker.io", "index.docker.io", "registry-1.docker.io"}
+
+
+def _docker_precheck(entry: Dict) -> int:
+    import shutil
+    from .engine import _DockerEngineError, _docker_engine
+
+    engine = _docker_engine(entry)
+    if engine is not None and shutil.which("docker", path=_service_env(entry).get("PATH")):
+        try:
+            engine.ping()
+            return 0
+        except _DockerEngineError:
+            pass
+
+    cp_docker = _run_shell(entry, "command -v docker >/dev/null 2>&1")
+    if cp_docker.returncode != 0:
+        print("[PRECHECK] docker command not found in PATH", file=sys.stderr)
+        print(f"[PRECHECK] PATH={_service_env(entry).get('PATH', '')}", file=sys.stderr)
+        return 2
+
+    cp_info = _run_shell(entry, "docker info >/dev/null 2>&1")
+    if cp_info.returncode != 0:
+        detail = (cp_info.stderr or cp_info.stdout or "").strip()
+        print("[PRECHECK] docker daemon is not reachable (start Docker Desktop / Docker daemon first)", file=sys.stderr)
+        if detail:
+            print(f"[PRECHECK_DETAIL] {detail}", file=sys.stderr)
+        return 2
+
+    return 0
+
+
+def _explicit_project_name(entry: Dict) -> str:
+    return str(entry.get("compose_project") or _service_env(entry).get("COMPOSE_PROJECT_NAME") or "").strip()
+
+
+def _compose_project_name(entry: Dict) -> str:
+    """Project name as configured, else the default docker compose derives from the directory name.
+
+    The default is a guess: a compose file `name:` or a .env COMPOSE_PROJECT_NAME overrides it.
+    Code that matches containers to services uses _compose_labels_match instead.
+    """
+    explicit = _explicit_project_name(entry)
+    if explicit:
+        return explicit
+    # Same normalization docker compose applies to the project directory name.
+    base = os.path.basename(os.path.normpath(_service_workdir(entry))).lower()
+    name = "".join(ch for ch in base if ch.isascii() and (ch.isalnum() or ch in "-_"))
+    return name.lstrip("-_")
+
+
+def _compose_labels_match(entry: Dict, labels: Dict[str, Any]) -> bool:
+    """Whether a container with these labels belongs to the service.
+
+    A configured project name is compared with the project label. Otherwise the working-dir
+    label is compared with the service path, which holds whatever name the project ends up with.
+    """
+    explicit = _explicit_project_name(entry)
+    if explicit:
+        return labels.get(COMPOSE_PROJECT_LABEL) == explicit
+    workdir = str(labels.get(COMPOSE_WORKDIR_LABEL) or "")
+    return bool(workdir) and os.path.realpath(workdir) == os.path.realpath(_service_workdir(entry))
+
+
+def _snapshot_error(message: str, mode: str = "docker_compose") -> Dict[str, Any]:
+    return {"mode": mode, "ok": False, "error": message, "components": {}}
+
+
+def _compose_container_ids_cli(entry: Dict, service: str = "") -> Tuple[Optional[str], List[str]]:
+    cp_ids = _run_shell(entry, "docker compose ps -q" + (f" {_shell_quote(service)}" if service else ""))
+    if cp_ids.returncode != 0:
+        return (cp_ids.stderr or cp_ids.stdout or "docker compose ps -q failed").strip(), []
+    return None, [line.strip() for line in (cp_ids.stdout or "").splitlines() if line.strip()]
+
+
+def _inspect_cli(entry: Dict, inspect_cmd: str, ids: List[str]) -> Tuple[Optional[str], List[Dict[str, Any]]]:
+    results: List[Dict[str, Any]] = []
+    # Batched so a host-wide listing cannot overflow the argument list.
+    for start in range(0, len(ids), INSPECT_BATCH):
+        cp = _run_shell(entry, f"{inspect_cmd} {_format_argv(ids[start:start + INSPECT_BATCH])}")
+        if cp.returncode != 0:
+            return (cp.stderr or cp.stdout or f"{inspect_cmd} failed").strip(), []
+        items = _safe_json_loads(cp.stdout or "", [])
+        results.extend(items if isinstance(items, list) else [])
+    return None, results
+
+
+def _inspect_projected(entry: Dict, inspect_cmd: str, template: str, ids: List[str]) -> Tuple[Optional[str], List[List[Any]]]:
+    """Rows of `inspect_cmd --format template` for ids, decoded line by line.
+
+    An object that vanished since it was listed only drops its row; a batch is an error
+    only when it failed without printing anything.
+    """
+    width = template.count("\t") + 1
+    rows: List[List[Any]] = []
+    for start in range(0, len(ids), INSPECT_BATCH):
+        cmd = f"{inspect_cmd} --format {_shell_quote(template)} {_format_argv(ids[start:start + INSPECT_BATCH])}"
+        cp = _run_shell(entry, cmd)
+        decoded = 0
+        for line in (cp.stdout or "").splitlines():
+            fields = line.split("\t")
+            if len(fields) != width:
+                continue
+            try:
+                rows.append([json.loads(v) for v in fields])
+            except ValueError:
+                continue
+            decoded += 1
+        if cp.returncode != 0 and not decoded:
+            return (cp.stderr or cp.stdout or f"{inspect_cmd} failed").strip(), []
+    return None, rows
+
+
+class _ContainerRecord:
+    """What snapshots keep of a container; every field is fixed for the container's lifetime."""
+
+    __slots__ = ("container_id", "container", "component", "image_ref", "image_id")
+
+    def __init__(self, container_id: str, container: str, component: str, image_ref: str, image_id: str) -> None:
+        self.container_id = container_id
+        self.container = container
+        self.component = component
+        self.image_ref = image_ref
+        self.image_id = image_id
+
+    @classmethod
+    def from_fields(cls, container_id: Any, name: Any, image_ref: Any, image_id: Any, service: Any) -> _ContainerRecord:
+        name = str(name or "").lstrip("/")
+        return cls(str(container_id or "").strip(), name, str(service or "").strip() or name or "unknown",
+                   str(image_ref or "").strip(), str(image_id or "").strip())
+
+    def row(self) -> Tuple[str, str, str, str, str]:
+        return (self.container_id, self.container, self.component, self.image_ref, self.image_id)
+
+
+class _ImageRecord:
+    """What snapshots keep of an image: its ID, version label, registry digests and revision label.
+
+    `digest` keeps every RepoDigests entry (`repo@sha256:...`, space separated): an image pulled
+    from one registry and tagged for a mirror has one per repository, and only the entry of the
+    repository a container runs it from is its registry digest (see `digest_for`).
+    """
+
+    __slots__ = ("image_id", "version", "digest", "revision")
+
+    def __init__(self, image_id: str, version: str, digest: str, revision: str) -> None:
+        self.image_id = image_id
+        self.version = version
+        self.digest = digest
+        self.revision = revision
+
+    @classmethod
+    def from_fields(cls, image_id: Any, repo_digests: Any, version: Any, schema_version: Any, revision: Any) -> _ImageRecord:
+        digest = " ".join(str(d).strip() for d in repo_digests if d) if isinstance(repo_digests, list) else ""
+        return cls(str(image_id or "").strip(), str(version or "").strip() or str(schema_version or "").strip(),
+                   digest, str(revision or "").strip())
+
+    def row(self) -> Tuple[str, str, str, str]:
+        return (self.image_id, self.version, self.digest, self.revision)
+
+    def digest_for(self, image_ref: str) -> str:
+        return _ref_digest(image_ref, self.digest)
+
+
+def _ref_digest(image_ref: str, repo_digests: str) -> str:
+    """The digest among repo_digests whose repository is image_ref's, or "" if none is.
+
+    A bare digest (a history row written before every RepoDigests entry was kept) is taken as is.
+    """
+    repo = _image_repo(image_ref)
+    for item in repo_digests.split():
+        name, sep, digest = item.partition("@")
+        if not sep:
+            return name
+        if repo is not None and _image_repo(name) == repo:
+            return digest
+    return ""
+
+
+def _repo_digest_entry(image_ref: str, digest: str) -> str:
+    """The RepoDigests entry (`repo@digest`) a component's registry digest came from."""
+    name = image_ref.split("@", 1)[0]
+    if name.rfind(":") > name.rfind("/"):
+        name = name[:name.rfind(":")]
+    return f"{name}@{digest}" if digest and "@" not in digest and _image_repo(image_ref) else digest
+
+
+def _container_record(c: Dict[str, Any]) -> _ContainerRecord:
+    """The record of a full `docker inspect` / Engine API container object."""
+    config = c.get("Config", {}) or {}
+    labels = config.get("Labels", {}) or {}
+    return _ContainerRecord.from_fields(c.get("Id"), c.get("Name"), config.get("Image"), c.get("Image"), labels.get("com.docker.compose.service"))
+
+
+def _image_record(img: Dict[str, Any]) -> _ImageRecord:
+    labels = (img.get("Config", {}) or {}).get("Labels", {}) or {}
+    return _ImageRecord.from_fields(
+        img.get("Id"),
+        img.get("RepoDigests"),
+        labels.get("org.opencontainers.image.version"),
+        labels.get("org.label-schema.version"),
+        labels.get("org.opencontainers.image.revision"),
+    )
+
+
+def _compose_snapshot_records(
+    entry: Dict, engine: Optional[_DockerEngine], record: bool = False
+) -> Tuple[Optional[str], List[_ContainerRecord], Dict[str, _ImageRecord]]:
+    """Container and image records for the service's running containers.
+
+    Containers and images already in the history store are taken from it; only IDs it has
+    not seen are inspected, so an unchanged deployment costs a single listing call.
+    record=True is for update/restart/rollback snapshots; see _container_image_records.
+    """
+    if engine is not None:
+        explicit = _explicit_project_name(entry)
+        listed = engine.list_containers([f"{COMPOSE_PROJECT_LABEL}={explicit}" if explicit else COMPOSE_PROJECT_LABEL])
+        ids = [str(c.get("Id", "")) for c in listed if c.get("Id") and _compose_labels_match(entry, c.get("Labels") or {})]
+    else:
+        error, ids = _compose_container_ids_cli(entry)
+        if error is not None:
+            return error, [], {}
+    if not ids:
+        return None, [], {}
+    return _container_image_records(entry, engine, ids, record)
+
+
+def _container_image_records(
+    entry: Dict, engine: Optional[_DockerEngine], ids: List[str], record: bool = False
+) -> Tuple[Optional[str], List[_ContainerRecord], Dict[str, _ImageRecord]]:
+    """Container and image records for ids; only containers the history store has not seen are inspected.
+
+    Read-only commands only read the store. With record=True the new containers are stored
+    and every image is inspected again and refreshed: an image's RepoDigests grow when it
+    is pulled or pushed under another repository, so cached image rows may be stale.
+    """
+    from .history import _history_store
+
+    store = _history_store() if record or os.path.exists(HISTORY_PATH) else None
+    known = store.containers(ids) if store is not None else {}
+    containers = [known[i] for i in ids if i in known]
+    missing = [i for i in ids if i not in known]
+    if missing:
+        if engine is not None:
+            fresh = [_container_record(c) for c in engine.inspect_containers(missing)]
+        else:
+            error, rows = _inspect_projected(entry, "docker inspect", CONTAINER_INSPECT_FORMAT, missing)
+            if error is not None:
+                return error, [], {}
+            fresh = [_ContainerRecord.from_fields(*row) for row in rows]
+        fresh = [c for c in fresh if c.container_id]
+        containers.extend(fresh)
+        if record and store is not None:
+            store.add_containers(fresh)
+
+    image_ids = sorted({c.image_id for c in containers if c.image_id})
+    images = store.images(image_ids) if store is not None and not record else {}
+    missing = [i for i in image_ids if i not in images]
+    if missing:
+        if engine is not None:
+            fresh_images = [_image_record(img) for img in engine.inspect_images(missing)]
+        else:
+            # A failed image inspect only costs metadata, not the snapshot.
+            _, rows = _inspect_projected(entry, "docker image inspect", IMAGE_INSPECT_FORMAT, missing)
+            fresh_images = [_ImageRecord.from_fields(*row) for row in rows]
+        fresh_images = [img for img in fresh_images if img.image_id]
+        images.update((img.image_id, img) for img in fresh_images)
+        if record and store is not None:
+            store.refresh_images(fresh_images)
+
+    return None, containers, images
+
+
+def _with_engine_fallback(entry: Dict, fn: Any) -> Any:
+    """fn(entry, engine) through the Engine API when configured, retried with the docker CLI if that fails."""
+    from .engine import _DockerEngineError, _docker_engine
+
+    engine = _docker_engine(entry)
+    if engine is not None:
+        try:
+            return fn(entry, engine)
+        except (_DockerEngineError, ValueError) as e:
+            print(f"[ENGINE] {e}; falling back to docker CLI", file=sys.stderr, flush=True)
+    return fn(entry, None)
+
+
+def _compose_records(entry: Dict, record: bool = False) -> Tuple[Optional[str], List[_ContainerRecord], Dict[str, _ImageRecord]]:
+    return _with_engine_fallback(entry, lambda e, engine: _compose_snapshot_records(e, engine, record))
+
+
+def _docker_compose_version_snapshot(entry: Dict, record: bool = False) -> Dict[str, Any]:
+    error, containers, images = _compose_records(entry, record)
+    if error is not None:
+        return _snapshot_error(error)
+    return {"mode": "docker_compose", "ok": True, "components": _compose_components(containers, images)}
+
+
+def _compose_components(containers: List[_ContainerRecord], images: Dict[str, _ImageRecord]) -> Dict[str, Dict[str, Any]]:
+    components: Dict[str, Dict[str, Any]] = {}
+    for c in containers:
+        img = images.get(c.image_id)
+        components[c.component] = {
+            "container": c.container,
+            "container_id": c.container_id,
+            "image_ref": c.image_ref,
+            "image_id": c.image_id,
+            "version": img.version if img else "",
+            "digest": img.digest_for(c.image_ref) if img else "",
+            "revision": img.revision if img else "",
+        }
+
+    return components
+
+
+def _compose_listing_cmd() -> str:
+    return f"docker ps -a --no-trunc --filter label={COMPOSE_PROJECT_LABEL} --format {_shell_quote(COMPOSE_LISTING_FORMAT)}"
+
+
+def _list_compose_containers(entry: Dict, engine: Optional[_DockerEngine]) -> Tuple[Optional[str], List[Dict[str, str]]]:
+    """Every compose container on the host, stopped ones included, from a single listing call."""
+    if engine is not None:
+        rows = []
+        for c in engine.list_containers([COMPOSE_PROJECT_LABEL], include_stopped=True):
+            labels = c.get("Labels", {}) or {}
+            values = [c.get("Id"), c.get("State"), c.get("Status"), labels.get(COMPOSE_PROJECT_LABEL), labels.get(COMPOSE_WORKDIR_LABEL)]
+            rows.append(dict(zip(COMPOSE_LISTING_FIELDS, (str(v or "") for v in values))))
+        return None, [r for r in rows if r["id"]]
+
+    cp = _run_shell(entry, _compose_listing_cmd())
+    if cp.returncode != 0:
+        return (cp.stderr or cp.stdout or "docker ps failed").strip(), []
+    rows = [dict(zip(COMPOSE_LISTING_FIELDS, line.split("\t"))) for line in (cp.stdout or "").splitlines()]
+    return None, [r for r in rows if len(r) == len(COMPOSE_LISTING_FIELDS) and r["id"]]
+
+
+def _compose_listing_records(
+    entry: Dict, engine: Optional[_DockerEngine]
+) -> Tuple[Optional[str], List[Dict[str, str]], List[_ContainerRecord], Dict[str, _ImageRecord]]:
+    entry = _state_query_entry(entry)
+    error, listed = _list_compose_containers(entry, engine)
+    if error is not None:
+        return error, [], [], {}
+    ids = [r["id"] for r in listed]
+    error, containers, images = _container_image_records(_state_query_entry(entry), engine, ids) if ids else (None, [], {})
+    return error, listed, containers, images
+
+
+def _status_health(status: str) -> str:
+    for marker, health in [("(healthy)", "healthy"), ("(unhealthy)", "unhealthy"), ("(health: starting)", "starting")]:
+        if marker in status:
+            return health
+    return ""
+
+
+def _status_uptime(status: str) -> Tuple[float, str]:
+    """(seconds, text) from `docker ps` status such as "Up 3 hours (healthy)" or "Up About a minute"."""
+    text = status.split(" (", 1)[0].strip()
+    if not text.startswith("Up "):
+        return float("inf"), ""
+    text = text[3:].strip()
+    words = text.lower().split()
+    count = int(words[0]) if words and words[0].isdigit() else 1
+    unit = words[-1].rstrip("s") if words else ""
+    return count * DURATION_SECONDS.get(unit, 1), text
+
+
+def _compose_status_row(
+    items: List[Tuple[Dict[str, str], _ContainerRecord]], images: Dict[str, _ImageRecord]
+) -> Dict[str, Any]:
+    """Running/expected containers, health, youngest uptime and versions of one service's containers."""
+    running = [(row, record) for row, record in items if row["state"] == "running"]
+    healths = [_status_health(row["status"]) for row, _ in running]
+    unhealthy = healths.count("unhealthy")
+    starting = healths.count("starting")
+    if unhealthy:
+        health = f"unhealthy {unhealthy}/{len(running)}"
+    elif starting:
+        health = f"starting {starting}/{len(running)}"
+    else:
+        health = "healthy" if "healthy" in healths else "-"
+    uptimes = [_status_uptime(row["status"]) for row, _ in running]
+    components = _compose_components([record for _, record in running or items], images)
+    versions = sorted({_component_version_text(comp) for comp in components.values()})
+    return {
+        "running": f"{len(running)}/{len(items)}",
+        "health": health,
+        "uptime": min(uptimes)[1] if uptimes else "-",
+        "version": ",".join(versions) or "-",
+        "ok": bool(items) and len(running) == len(items) and not unhealthy,
+    }
+
+
+def _listing_project_name(entry: Dict) -> str:
+    """Compose project name of a service, or "" when it has neither a path nor an explicit project."""
+    try:
+        return _compose_project_name(entry)
+    except ValueError:
+        return ""
+
+
+def _group_listing(
+    members: List[Tuple[str, Dict]], listed: List[Dict[str, str]], containers: List[_ContainerRecord]
+) -> Dict[str, List[Tuple[Dict[str, str], _ContainerRecord]]]:
+    """Listed containers per service, matched by working-dir label (against the service path), then by project name.
+
+    A service registered without a path matches only by an explicit compose project name.
+    """
+    by_workdir: Dict[str, str] = {}
+    by_project: Dict[str, str] = {}
+    for key, entry in members:
+        project = _listing_project_name(entry)
+        if project:
+            by_project[project] = key
+        if str(entry.get("path", "")).strip():
+            by_workdir[os.path.realpath(_service_workdir(entry))] = key
+    records = {c.container_id: c for c in containers}
+    grouped: Dict[str, List[Tuple[Dict[str, str], _ContainerRecord]]] = {key: [] for key, _ in members}
+    for row in listed:
+        key = by_workdir.get(os.path.realpath(row["working_dir"])) if row["working_dir"] else None
+        key = key or by_project.get(row["project"])
+        if key is not None and row["id"] in records:
+            grouped[key].append((row, records[row["id"]]))
+    return grouped
+
+
+def _compose_status_rows(targets: List[Tuple[str, Dict]]) -> Tuple[Optional[str], Dict[str, Dict[str, Any]]]:
+    """Status rows of compose services from one container listing per docker environment."""
+    rows: Dict[str, Dict[str, Any]] = {}
+    for members in _state_query_groups(targets):
+        with _span("status", services=len(members)) as span:
+            error, listed, containers, images = _with_engine_fallback(members[0][1], _compose_listing_records)
+            span["rc"] = 0 if error is None else 1
+        if error is not None:
+            return error, {}
+        grouped = _group_listing(members, listed, containers)
+        for key, entry in members:
+            project = grouped[key][0][0]["project"] if grouped[key] else _listing_project_name(entry) or "-"
+            rows[key] = {"project": project, **_compose_status_row(grouped[key], images)}
+    return None, rows
+
+
+def _print_status_table(rows: Dict[str, Dict[str, Any]]) -> None:
+    header = ("SERVICE", "PROJECT", "RUNNING", "HEALTH", "UPTIME", "VERSION")
+    table = [header] + [(key, r["project"], r["running"], r["health"], r["uptime"], r["version"]) for key, r in sorted(rows.items())]
+    widths = [max(len(row[i]) for row in table) for i in range(len(header))]
+    for row in table:
+        print("  ".join(f"{cell:<{width}}" for cell, width in zip(row, widths)).rstrip(), flush=True)
+
+
+def _has_listing_status(entry: Dict) -> bool:
+    actions = entry.get("actions", {}) or {}
+    return str(entry.get("runtime", "custom")) == "docker_compose" and actions.get("status") == DOCKER_COMPOSE_DEFAULTS["status"]
+
+
+def _run_compose_listing_status(targets: List[Tuple[str, Dict]], dry_run: bool) -> int:
+    """Fleet status of compose services on the default status command, as one table from one listing."""
+    if dry_run:
+        for members in _state_query_groups(targets):
+            print("[DRY-RUN]", _format_argv(_build_runner(_state_query_entry(members[0][1]), _compose_listing_cmd())), flush=True)
+        return 0
+    error, rows = _compose_status_rows(targets)
+    if error is not None:
+        print(f"[ERROR] docker container listing failed: {error}", file=sys.stderr)
+        return 1
+    print(f"[STATUS] {len(rows)} compose services", flush=True)
+    _print_status_table(rows)
+    return 0 if all(r["ok"] for r in rows.values()) else 3
+
+
+def _state_query_entry(entry: Dict) -> Dict:
+    # State queries do not depend on the working directory, which may be unset or gone.
+    path = str(entry.get("path", "")).strip()
+    return entry if path and os.path.isdir(os.path.expanduser(path)) else {**entry, "path": "/"}
+
+
+def _state_query_groups(targets: List[Tuple[str, Dict]]) -> List[List[Tuple[str, Dict]]]:
+    """Targets that can share one state query: same runtime, shell, shell_init, env and docker backend."""
+    from .engine import _docker_backend
+
+    groups: Dict[str, List[Tuple[str, Dict]]] = {}
+    for key, entry in targets:
+        runtime = str(entry.get("runtime", "custom")).strip().lower()
+        group = json.dumps(
+            [runtime, _shell_bin(entry), _shell_init(entry), entry.get("env", {}), _docker_backend(entry)], sort_keys=True, default=str
+        )
+        groups.setdefault(group, []).append((key, entry))
+    return list(groups.values())
+
+
+def _component_version_text(comp: Dict[str, Any]) -> str:
+    version = str(comp.get("version", "")).strip()
+    if version:
+        return version
+    digest = str(comp.get("digest", "")).strip()
+    if digest:
+        return f"digest:{_short(digest)}"
+    image_id = str(comp.get("image_id", "")).strip()
+    kind, _, ident = image_id.partition(":")
+    if kind in ("unit", "app"):
+        return f"{kind}:{_short(ident)}"
+    if image_id:
+        return f"image:{_short(image_id)}"
+    return "unknown"
+
+
+def _local_image_ids(entry: Dict, refs: List[str]) -> Dict[str, str]:
+    from .engine import _DockerEngineError, _docker_engine
+
+    if not refs:
+        return {}
+    engine = _docker_engine(entry)
+    if engine is not None:
+        try:
+            return {ref: str(engine.inspect_image(ref).get("Id", "")) for ref in refs}
+        except _DockerEngineError:
+            pass
+    cmd = "docker image inspect --format '{{.Id}}' " + _format_argv(refs)
+    cp = _run_shell(entry, cmd)
+    ids = [line.strip() for line in (cp.stdout or "").splitlines() if line.strip()]
+    if cp.returncode != 0 or len(ids) != len(refs):
+        return {}
+    return dict(zip(refs, ids))
+
+
+def _is_default_compose_update(entry: Dict) -> bool:
+    runtime = str(entry.get("runtime", "custom")).strip().lower()
+    update_cmd = str((entry.get("actions", {}) or {}).get("update", "")).strip()
+    return runtime == "docker_compose" and update_cmd == DOCKER_COMPOSE_DEFAULTS["update"]
+
+
+def _compose_config(entry: Dict) -> Tuple[Optional[str], Dict[str, Any]]:
+    cp = _run_shell(entry, "docker compose config --format json")
+    if cp.returncode != 0:
+        return (cp.stderr or cp.stdout or "docker compose config failed").strip(), {}
+    config = _safe_json_loads(cp.stdout or "", {})
+    return None, config if isinstance(config, dict) else {}
+
+
+def _compose_image_refs(entry: Dict) -> Tuple[Optional[str], List[str]]:
+    error, config = _compose_config(entry)
+    if error is not None:
+        return error, []
+
+    compose_services = config.get("services", {})
+    refs = set()
+    for svc in (compose_services or {}).values():
+        if not isinstance(svc, dict):
+            continue
+        image = str(svc.get("image", "")).strip()
+        # Same rule as `docker compose pull --ignore-buildable`: locally built services are never pulled.
+        if not image or svc.get("build") or str(svc.get("pull_policy", "")).strip() in {"build", "never"}:
+            continue
+        refs.add(image)
+    return None, sorted(refs)
+
+
+def _parse_image_ref(ref: str) -> Optional[Tuple[str, str, str]]:
+    """(registry host, repository, tag) of a tag reference; None for digest-pinned refs and bare image IDs.
+
+    Follows docker's normalization: without a registry host the image is on Docker Hub, where
+    single-name repositories live under library/.
+    """
+    name = ref.strip()
+    if not name or "@" in name or name.startswith("sha256:"):
+        return None
+    tag = "latest"
+    slash, colon = name.rfind("/"), name.rfind(":")
+    if colon > slash:
+        name, tag = name[:colon], name[colon + 1:]
+    first, sep, rest = name.partition("/")
+    if sep and ("." in first or ":" in first or first == "localhost"):
+        host, repo = first, rest
+    else:
+        host, repo = "docker.io", name
+    if host in DOCKER_HUB_HOSTS:
+        host = "docker.io"
+        if "/" not in repo:
+            repo = f"library/{repo}"
+    if not repo or not tag:
+        return None
+    return host, repo, tag
+
+
+def _registry_ref_key(parsed: Tuple[str, str, str]) -> str:
+    host, repo, tag = parsed
+    return f"{host}/{repo}:{tag}"
+
+
+def _image_repo(ref: str) -> Optional[Tuple[str, str]]:
+    """(registry host, repository) an image ref or `docker image ls` repository name belongs to."""
+    parsed = _parse_image_ref(ref.split("@", 1)[0])
+    return (parsed[0], parsed[1]) if parsed else None
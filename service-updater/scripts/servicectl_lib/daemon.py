@@ -0,0 +1,166 @@
+"""The `serve` daemon that keeps the registry warm, and forwarding commands to it."""
+from __future__ import annotations
+
+import json
+import os
+import sys
+import threading
+
+from .common import CACHE_DIR, DAEMON_COMMANDS, _FLEET_LOCAL, _safe_json_loads
+from .registry import _load_config, _service_index
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any, Dict, List, Optional
+
+DAEMON_SOCKET_NAME = "servicectl.sock"
+# Shell bookkeeping left out when comparing a client's environment with the daemon's.
+DAEMON_VOLATILE_ENV = {"_", "OLDPWD", "PWD", "SHLVL", "SERVICECTL_SOCKET", "SERVICECTL_NO_DAEMON"}
+DAEMON_CONNECT_TIMEOUT = 0.5
+
+
+def _daemon_socket_path() -> str:
+    explicit = os.environ.get("SERVICECTL_SOCKET", "").strip()
+    if explicit:
+        return explicit
+    path = os.path.join(CACHE_DIR, DAEMON_SOCKET_NAME)
+    # AF_UNIX paths are limited to ~104-108 bytes; deep checkouts fall back to a per-user temp path.
+    if len(path.encode()) < 100:
+        return path
+    import hashlib
+
+    digest = hashlib.sha256(path.encode()).hexdigest()[:12]
+    return os.path.join("/tmp", f"servicectl-{os.getuid()}-{digest}.sock")
+
+
+class _SocketStream:
+    """Text stream forwarding writes to a daemon client as JSON lines."""
+
+    def __init__(self, wfile: Any, name: str, lock: threading.Lock) -> None:
+        self._wfile = wfile
+        self._name = name
+        self._lock = lock
+
+    def write(self, text: str) -> int:
+        if text:
+            _send_frame(self._wfile, {"stream": self._name, "data": text}, self._lock)
+        return len(text)
+
+    def flush(self) -> None:
+        pass
+
+
+def _send_frame(wfile: Any, frame: Dict[str, Any], lock: threading.Lock) -> None:
+    payload = (json.dumps(frame, ensure_ascii=False) + "\n").encode("utf-8")
+    with lock:
+        wfile.write(payload)
+        wfile.flush()
+
+
+def _daemon_context() -> Dict[str, Any]:
+    """What processes started for a command inherit: the working directory and the environment."""
+    return {"cwd": os.getcwd(), "env": {k: v for k, v in os.environ.items() if k not in DAEMON_VOLATILE_ENV}}
+
+
+def _daemon_execute(argv: List[str], context: Any) -> Optional[int]:
+    """Run a forwarded command; None when it starts processes and the client's context differs from ours."""
+    from .cli import build_parser
+    from .runner import _shell_sessions
+
+    try:
+        args = build_parser().parse_args(argv)
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else 2
+    if args.cmd not in DAEMON_COMMANDS:
+        print(f"[ERROR] '{args.cmd}' is not served by the daemon", file=sys.stderr)
+        return 2
+    starts_processes = args.cmd not in {"show", "history"} and (args.cmd != "list" or args.with_status)
+    if starts_processes and context != _daemon_context():
+        return None
+    with _shell_sessions():
+        return int(args.func(args))
+
+
+def _handle_daemon_request(rfile: Any, wfile: Any) -> None:
+    request = _safe_json_loads(rfile.readline().decode("utf-8", "replace"), {})
+    argv = request.get("argv") if isinstance(request, dict) else None
+    context = request.get("context") if isinstance(request, dict) else None
+    lock = threading.Lock()
+    if not isinstance(argv, list):
+        _send_frame(wfile, {"exit": 2, "error": "bad request"}, lock)
+        return
+
+    _FLEET_LOCAL.streams = {
+        "stdout": _SocketStream(wfile, "stdout", lock),
+        "stderr": _SocketStream(wfile, "stderr", lock),
+    }
+    rc: Optional[int] = 1
+    try:
+        rc = _daemon_execute([str(a) for a in argv], context)
+    except (BrokenPipeError, ConnectionResetError):
+        return
+    except Exception as e:
+        print(f"[ERROR] daemon: {e}", file=sys.stderr)
+    finally:
+        _FLEET_LOCAL.streams = None
+    try:
+        _send_frame(wfile, {"exit": rc} if rc is not None else {"local": "cwd or environment differs from the daemon"}, lock)
+    except OSError:
+        pass
+
+
+def _watch_registry(interval: float, stop: threading.Event) -> None:
+    while not stop.wait(interval):
+        try:
+            _service_index(_load_config().get("services", {}))
+        except Exception as e:
+            print(f"[SERVE] registry reload failed: {e}", file=sys.__stderr__, flush=True)
+
+
+def _forward_to_daemon(argv: List[str]) -> Optional[int]:
+    """Run argv on a running daemon. None means the caller should run in-process.
+
+    That is the case when no daemon answers, or when the command would start processes and this
+    process's working directory or environment differs from the daemon's.
+    """
+    path = _daemon_socket_path()
+    if not os.path.exists(path):
+        return None
+    import socket
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(DAEMON_CONNECT_TIMEOUT)
+    try:
+        sock.connect(path)
+        sock.sendall((json.dumps({"argv": argv, "context": _daemon_context()}) + "\n").encode("utf-8"))
+    except OSError:
+        sock.close()
+        return None
+
+    sock.settimeout(None)
+    outputs = {"stdout": sys.stdout, "stderr": sys.stderr}
+    try:
+        with sock, sock.makefile("rb") as rfile:
+            for raw in rfile:
+                frame = _safe_json_loads(raw.decode("utf-8", "replace"), {})
+                if not isinstance(frame, dict):
+                    continue
+                if "exit" in frame:
+                    return int(frame["exit"])
+                if "local" in frame:
+                    return None
+                out = outputs.get(frame.get("stream", ""))
+                if out is not None:
+                    out.write(str(frame.get("data", "")))
+                    out.flush()
+    except BrokenPipeError:
+        import signal
+
+        # Our reader went away (`| head`): leave quietly, as a process killed by SIGPIPE would, and keep
+        # the exit-time flush of the other stream from failing too.
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        for out in outputs.values():
+            os.dup2(devnull, out.fileno())
+        return 128 + signal.SIGPIPE
+    print("[ERROR] daemon connection closed before the command finished", file=sys.stderr)
+    return 1
@@ -0,0 +1,164 @@
+"""A minimal Docker Engine API client over the daemon's unix socket."""
+from __future__ import annotations
+
+import json
+import os
+import threading
+
+from .common import _safe_json_loads
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    import http.client
+    from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+DEFAULT_DOCKER_SOCKET = "/var/run/docker.sock"
+
+
+class _DockerEngineError(Exception):
+    pass
+
+
+def _unix_http_connection(socket_path: str, timeout: float) -> http.client.HTTPConnection:
+    import http.client
+    import socket
+
+    class _UnixHTTPConnection(http.client.HTTPConnection):
+        def connect(self) -> None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(socket_path)
+            except OSError:
+                sock.close()
+                raise
+            self.sock = sock
+
+    return _UnixHTTPConnection("localhost", timeout=timeout)
+
+
+class _DockerEngine:
+    """Minimal Docker Engine API client speaking HTTP/1.1 over one kept-alive connection.
+
+    Only the read-only calls used for prechecks and version snapshots are implemented;
+    actions still go through the docker CLI.
+    """
+
+    def __init__(self, address: str, timeout: float = 10.0) -> None:
+        self.address = address
+        self.timeout = timeout
+        self._conn: Optional[http.client.HTTPConnection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> http.client.HTTPConnection:
+        import http.client
+
+        if self.address.startswith("unix://"):
+            return _unix_http_connection(self.address[len("unix://"):], self.timeout)
+        if self.address.startswith("tcp://"):
+            return http.client.HTTPConnection(self.address[len("tcp://"):], timeout=self.timeout)
+        raise _DockerEngineError(f"unsupported docker host: {self.address}")
+
+    def _request(self, method: str, path: str, query: Optional[Dict[str, str]] = None) -> Tuple[int, bytes]:
+        import http.client
+        from urllib.parse import urlencode
+
+        url = path + (f"?{urlencode(query)}" if query else "")
+        with self._lock:
+            for attempt in range(2):
+                if self._conn is None:
+                    self._conn = self._connect()
+                try:
+                    self._conn.request(method, url, headers={"Host": "docker"})
+                    resp = self._conn.getresponse()
+                    body = resp.read()
+                except (OSError, http.client.HTTPException) as e:
+                    self.close_locked()
+                    # A kept-alive connection may have been closed by the daemon; retry once on a fresh one.
+                    if attempt == 0:
+                        continue
+                    raise _DockerEngineError(f"docker engine request failed: {method} {path}: {e}") from e
+                if resp.will_close:
+                    self.close_locked()
+                return resp.status, body
+        raise _DockerEngineError(f"docker engine request failed: {method} {path}")
+
+    def _get_json(self, path: str, query: Optional[Dict[str, str]] = None) -> Any:
+        status, body = self._request("GET", path, query)
+        if status != 200:
+            detail = _safe_json_loads(body.decode("utf-8", "replace"), {})
+            message = detail.get("message", "") if isinstance(detail, dict) else ""
+            raise _DockerEngineError(f"GET {path} -> HTTP {status} {message}".strip())
+        try:
+            return json.loads(body.decode("utf-8"))
+        except ValueError as e:
+            raise _DockerEngineError(f"GET {path} -> invalid JSON: {e}") from e
+
+    def close_locked(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def ping(self) -> None:
+        status, body = self._request("GET", "/_ping")
+        if status != 200:
+            raise _DockerEngineError(f"docker engine ping failed: HTTP {status} {body[:200]!r}")
+
+    def list_containers(self, labels: List[str], include_stopped: bool = False) -> List[Dict[str, Any]]:
+        query = {"filters": json.dumps({"label": labels})}
+        if include_stopped:
+            query["all"] = "1"
+        result = self._get_json("/containers/json", query)
+        return result if isinstance(result, list) else []
+
+    def inspect_containers(self, ids: List[str]) -> Iterator[Dict[str, Any]]:
+        """Full container objects one at a time, so callers can reduce each to a record before the next is read."""
+        from urllib.parse import quote
+
+        for i in ids:
+            yield self._get_json(f"/containers/{quote(i, safe='')}/json")
+
+    def inspect_image(self, ref: str) -> Dict[str, Any]:
+        from urllib.parse import quote
+
+        return self._get_json(f"/images/{quote(ref, safe='')}/json")
+
+    def inspect_images(self, ids: List[str]) -> Iterator[Dict[str, Any]]:
+        for i in ids:
+            try:
+                yield self.inspect_image(i)
+            except _DockerEngineError:
+                # Mirrors `docker image inspect` tolerance: a vanished image just lacks metadata.
+                continue
+
+
+_ENGINES: Dict[str, _DockerEngine] = {}
+_ENGINES_LOCK = threading.Lock()
+
+
+def _docker_backend(entry: Dict) -> str:
+    backend = os.environ.get("SERVICECTL_DOCKER_BACKEND") or str(entry.get("docker_backend") or "cli")
+    return backend.strip().lower()
+
+
+def _docker_engine(entry: Dict) -> Optional[_DockerEngine]:
+    """Engine client for this service when the engine backend is selected and usable, else None (use the CLI)."""
+    from .runner import _service_env
+
+    if _docker_backend(entry) != "engine":
+        return None
+
+    env = _service_env(entry)
+    if env.get("DOCKER_TLS_VERIFY") or env.get("DOCKER_CONTEXT"):
+        return None
+    address = str(env.get("DOCKER_HOST") or f"unix://{DEFAULT_DOCKER_SOCKET}").strip()
+    if not address.startswith(("unix://", "tcp://")):
+        return None
+    if address.startswith("unix://") and not os.path.exists(address[len("unix://"):]):
+        return None
+
+    with _ENGINES_LOCK:
+        engine = _ENGINES.get(address)
+        if engine is None:
+            engine = _ENGINES[address] = _DockerEngine(address)
+    return engine
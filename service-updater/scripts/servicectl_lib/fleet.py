@@ -0,0 +1,413 @@
+"""Fleet runs: parallel and dependency-ordered actions over many services, and two-phase updates."""
+from __future__ import annotations
+
+import sys
+import time
+from contextlib import contextmanager
+
+from .actions import (
+    SMART_SKIP_NOTE, _capture_version, _compose_update_is_noop, _perform_action, _post_check, _precheck,
+    _print_fleet_version_report,
+)
+from .common import (
+    COMPOSE_PULL_CMD, COMPOSE_SWAP_CMD, _FLEET_LOCAL, _FleetRouter, _PrefixedStream, _format_argv, _shell_quote, _span,
+)
+from .compose import _compose_image_refs, _is_default_compose_update
+from .runner import _build_runner, _run_action, _run_command, _run_shell
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any, Dict, List, Optional, Tuple
+
+
+def _thread_pool(max_workers: int) -> Any:
+    from concurrent.futures import ThreadPoolExecutor
+
+    return ThreadPoolExecutor(max_workers=max_workers)
+
+
+@contextmanager
+def _fleet_routing() -> Any:
+    if isinstance(sys.stdout, _FleetRouter):
+        # Already routed (serve daemon): swapping the globals would race with other requests.
+        yield
+        return
+    saved_streams = (sys.stdout, sys.stderr)
+    sys.stdout = _FleetRouter(sys.__stdout__, "stdout")
+    sys.stderr = _FleetRouter(sys.__stderr__, "stderr")
+    try:
+        yield
+    finally:
+        sys.stdout, sys.stderr = saved_streams
+
+
+@contextmanager
+def _service_output(label: str) -> Any:
+    parent = getattr(_FLEET_LOCAL, "streams", None)
+    targets = parent or {"stdout": sys.__stdout__, "stderr": sys.__stderr__}
+    prefix = f"[{label}] "
+    _FLEET_LOCAL.streams = {
+        "stdout": _PrefixedStream(targets["stdout"], prefix),
+        "stderr": _PrefixedStream(targets["stderr"], prefix),
+    }
+    try:
+        yield
+    finally:
+        for stream in _FLEET_LOCAL.streams.values():
+            stream.close()
+        _FLEET_LOCAL.streams = parent
+
+
+def _with_parent_output(fn: Any) -> Any:
+    """Wrap fn so a pool thread writes to the submitting thread's output (e.g. a daemon client)."""
+    parent = getattr(_FLEET_LOCAL, "streams", None)
+
+    def run(*args: Any, **kwargs: Any) -> Any:
+        _FLEET_LOCAL.streams = parent
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _FLEET_LOCAL.streams = None
+
+    return run
+
+
+def _fleet_worker(
+    key: str, entry: Dict, action: str, dry_run: bool, smart: bool, rolling: Optional[Dict[str, Any]], auto_rollback: bool
+) -> Dict[str, Any]:
+    with _service_output(key):
+        try:
+            return _perform_action(
+                key, entry, action, dry_run, report=False, smart=smart, rolling=rolling, auto_rollback=auto_rollback
+            )
+        except Exception as e:
+            print(f"[ERROR] {e}", file=sys.stderr)
+            return {"key": key, "rc": 1, "before": {}, "after": {}, "reported": not dry_run}
+
+
+def _print_fleet_summary(results: List[Dict[str, Any]]) -> None:
+    failed = [r["key"] for r in results if r["rc"] != 0]
+    print(f"[FLEET] done: {len(results) - len(failed)} ok, {len(failed)} failed", flush=True)
+    if failed:
+        print(f"[FLEET] failed: {', '.join(failed)}", flush=True)
+
+
+def _target_dependencies(targets: List[Tuple[str, Dict]]) -> Dict[str, List[str]]:
+    """Upstreams of each target among the targets themselves; depends_on outside the selection is ignored."""
+    keys = {key for key, _ in targets}
+    deps: Dict[str, List[str]] = {}
+    for key, entry in targets:
+        declared = entry.get("depends_on") or []
+        upstreams = {str(d).strip().lower() for d in declared if isinstance(declared, list)}
+        deps[key] = sorted(u for u in upstreams if u in keys and u != key)
+    return deps
+
+
+def _dependency_cycle(remaining: Dict[str, List[str]]) -> List[str]:
+    """Follow unresolved upstreams from any blocked key until one repeats."""
+    node = min(remaining)
+    path: List[str] = []
+    seen: Dict[str, int] = {}
+    while node not in seen:
+        seen[node] = len(path)
+        path.append(node)
+        node = min(u for u in remaining[node] if u in remaining)
+    return path[seen[node]:] + [node]
+
+
+def _dag_waves(deps: Dict[str, List[str]]) -> List[List[str]]:
+    """Topological waves: every key depends only on keys of earlier waves. ValueError on a cycle."""
+    remaining = dict(deps)
+    done: set = set()
+    waves: List[List[str]] = []
+    while remaining:
+        wave = sorted(k for k, ups in remaining.items() if all(u in done for u in ups))
+        if not wave:
+            raise ValueError("dependency cycle: " + " -> ".join(_dependency_cycle(remaining)) + " (-> means depends on)")
+        waves.append(wave)
+        done.update(wave)
+        for key in wave:
+            del remaining[key]
+    return waves
+
+
+def _run_dag(order: List[str], deps: Dict[str, List[str]], jobs: int, run_one: Any) -> Dict[str, Dict[str, Any]]:
+    """Call run_one(key) -> ok for each key once all its upstreams returned ok, at most `jobs` at a time.
+
+    Keys start as soon as their own upstreams are done rather than waiting for the whole
+    wave. A key whose upstream failed or was cancelled is not run: its state records the
+    failed upstream as "cancelled_by". Completed keys get monotonic "start"/"end" times.
+    """
+    from concurrent.futures import FIRST_COMPLETED, wait
+
+    state: Dict[str, Dict[str, Any]] = {}
+    pending = list(order)
+    running: Dict[Any, Tuple[str, float]] = {}
+    with _thread_pool(max_workers=jobs) as pool:
+        while pending or running:
+            for key in list(pending):
+                failed = next((u for u in deps[key] if u in state and not state[u]["ok"]), None)
+                if failed is not None:
+                    state[key] = {"ok": False, "cancelled_by": state[failed].get("cancelled_by") or failed}
+                    pending.remove(key)
+            for key in list(pending):
+                if len(running) >= jobs:
+                    break
+                if all(u in state for u in deps[key]):
+                    pending.remove(key)
+                    running[pool.submit(_with_parent_output(run_one), key)] = (key, time.monotonic())
+            if not running:
+                continue
+            finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in finished:
+                key, started = running.pop(future)
+                try:
+                    ok = bool(future.result())
+                except Exception as e:
+                    print(f"[ERROR] {key}: {e}", file=sys.stderr, flush=True)
+                    ok = False
+                state[key] = {"ok": ok, "start": started, "end": time.monotonic()}
+    return state
+
+
+def _critical_path(order: List[str], deps: Dict[str, List[str]], state: Dict[str, Dict[str, Any]]) -> Tuple[float, List[str]]:
+    """Longest chain of dependent services by measured duration (`order` must be topological)."""
+    best: Dict[str, Tuple[float, List[str]]] = {}
+    for key in order:
+        if "start" not in state.get(key, {}):
+            continue
+        upstream = max((best[u] for u in deps[key] if u in best), default=(0.0, []))
+        best[key] = (upstream[0] + state[key]["end"] - state[key]["start"], upstream[1] + [key])
+    return max(best.values(), default=(0.0, []))
+
+
+def _print_dag_plan(waves: List[List[str]], deps: Dict[str, List[str]]) -> None:
+    for number, wave in enumerate(waves, 1):
+        labels = [f"{k} (after {', '.join(deps[k])})" if deps[k] else k for k in wave]
+        print(f"[DAG] wave {number}: {', '.join(labels)}", flush=True)
+
+
+def _print_critical_path(order: List[str], deps: Dict[str, List[str]], state: Dict[str, Dict[str, Any]], wall: float) -> None:
+    total, chain = _critical_path(order, deps, state)
+    if not chain:
+        return
+    steps = " -> ".join(f"{k} {state[k]['end'] - state[k]['start']:.2f}s" for k in chain)
+    print(f"[DAG] critical path: {steps} = {total:.2f}s (wall {wall:.2f}s)", flush=True)
+
+
+def _cancelled_note(state: Dict[str, Any]) -> str:
+    return f"cancelled: upstream {state['cancelled_by']} failed"
+
+
+def _run_fleet_action(
+    targets: List[Tuple[str, Dict]],
+    action: str,
+    dry_run: bool,
+    jobs: int,
+    smart: bool = False,
+    rolling: Optional[Dict[str, Any]] = None,
+    auto_rollback: bool = False,
+) -> int:
+    jobs = max(1, min(jobs, len(targets)))
+    deps = _target_dependencies(targets) if action in {"update", "restart"} else {key: [] for key, _ in targets}
+    try:
+        waves = _dag_waves(deps)
+    except ValueError as e:
+        print(f"[ERROR] {e}", file=sys.stderr, flush=True)
+        return 2
+    ordered_keys = [key for wave in waves for key in wave]
+    staged = any(deps.values())
+    if staged:
+        print(f"[FLEET] {action}: {len(targets)} services in {len(waves)} dependency waves, concurrency {jobs}", flush=True)
+        _print_dag_plan(waves, deps)
+    else:
+        print(f"[FLEET] {action}: {len(targets)} services, concurrency {jobs}", flush=True)
+
+    entries = dict(targets)
+    results: Dict[str, Dict[str, Any]] = {}
+
+    def run_one(key: str) -> bool:
+        result = results[key] = _fleet_worker(key, entries[key], action, dry_run, smart, rolling, auto_rollback)
+        if result["rc"] == 0 and result.get("check_rc", 0) != 0:
+            result["note"] = "; ".join(filter(None, [result.get("note"), "post-check failed"]))
+        return result["rc"] == 0 and result.get("check_rc", 0) == 0
+
+    started = time.monotonic()
+    with _fleet_routing():
+        state = _run_dag(ordered_keys if staged else list(entries), deps, jobs, run_one)
+    for key, s in state.items():
+        if "cancelled_by" in s:
+            results[key] = {"key": key, "rc": 1, "before": {}, "after": {}, "reported": not dry_run, "note": _cancelled_note(s)}
+    ordered = [results[key] for key, _ in targets]
+
+    if any(r["reported"] for r in ordered):
+        _print_fleet_version_report(action, ordered)
+    else:
+        _print_fleet_summary(ordered)
+    if staged:
+        _print_critical_path(ordered_keys, deps, state, time.monotonic() - started)
+
+    return next((r["rc"] for r in ordered if r["rc"] != 0), 0)
+
+
+def _run_two_phase_update(
+    targets: List[Tuple[str, Dict]],
+    jobs: int,
+    pull_jobs: int,
+    dry_run: bool,
+    smart: bool = False,
+    auto_rollback: bool = False,
+) -> int:
+    """Pull every unique image of the targets first, then swap (`up -d`) only once all pulls succeeded."""
+    from .history import _record_history
+    from .rollback import _auto_rollback
+
+    jobs = max(1, min(jobs, len(targets)))
+    pull_jobs = max(1, pull_jobs)
+    entries = dict(targets)
+    deps = _target_dependencies(targets)
+    try:
+        waves = _dag_waves(deps)
+    except ValueError as e:
+        print(f"[ERROR] {e}", file=sys.stderr, flush=True)
+        return 2
+    staged = any(deps.values())
+    results = {key: {"key": key, "rc": 0, "before": {}, "after": {}, "reported": not dry_run} for key, _ in targets}
+    timings: Dict[str, float] = {}
+    started = time.monotonic()
+    print(f"[PIPELINE] two-phase update: {len(targets)} services, swap concurrency {jobs}, pull concurrency {pull_jobs}", flush=True)
+    if staged:
+        _print_dag_plan(waves, deps)
+
+    def prepare(key: str) -> List[str]:
+        entry = entries[key]
+        refs: List[str] = []
+        with _service_output(key), _span("prepare", service=key):
+            if not _is_default_compose_update(entry):
+                print("[PIPELINE] custom update action; it runs unchanged in the swap phase", flush=True)
+            else:
+                rc = 0 if dry_run else _precheck(entry, "update")
+                if rc != 0:
+                    results[key]["rc"] = rc
+                    return []
+                error, refs = _compose_image_refs(entry)
+                if error is not None and dry_run:
+                    # Only a plan: the service's own pull stands in for images the compose file could not list.
+                    print(f"[DRY-RUN] images not resolved ({error.splitlines()[0]}); pull phase would run:", flush=True)
+                    print("[DRY-RUN]", _format_argv(_build_runner(entry, COMPOSE_PULL_CMD)), flush=True)
+                    return []
+                if error is not None:
+                    print(f"[ERROR] {error}", file=sys.stderr, flush=True)
+                    results[key]["rc"] = 2
+                    return []
+            if not dry_run:
+                results[key]["started_at"] = time.time()
+                results[key]["before"] = _capture_version(entry, "snapshot_before")
+            return refs
+
+    def pull(ref: str, owner: str) -> int:
+        entry = entries[owner]
+        with _service_output("pull"):
+            cmd = f"docker pull {_shell_quote(ref)}"
+            if dry_run:
+                print("[DRY-RUN]", _format_argv(_build_runner(entry, cmd)), flush=True)
+                return 0
+            with _span("pull", service=owner, image=ref) as span:
+                cp = _run_shell(entry, cmd, timeout_key="update", tail_lines=20)
+                span["rc"] = cp.returncode
+            if cp.returncode != 0:
+                detail = (cp.stderr or cp.stdout or "").strip().splitlines()
+                print(f"[PULL] {ref}: failed (exit {cp.returncode}, {cp.elapsed:.2f}s) {detail[-1] if detail else ''}".rstrip(), flush=True)
+            else:
+                print(f"[PULL] {ref}: ok ({cp.elapsed:.2f}s)", flush=True)
+            return cp.returncode
+
+    def swap(key: str) -> bool:
+        entry = entries[key]
+        with _service_output(key), _span("swap", service=key) as span:
+            if dry_run:
+                cmd = COMPOSE_SWAP_CMD if _is_default_compose_update(entry) else str(entry["actions"]["update"]).strip()
+                print("[DRY-RUN]", _format_argv(_build_runner(entry, cmd)), flush=True)
+                return True
+            if smart and _is_default_compose_update(entry) and _compose_update_is_noop(entry, results[key]["before"]):
+                print("[SMART] pulled images match the running containers; skipping up -d", flush=True)
+                results[key]["after"] = results[key]["before"]
+                results[key]["note"] = SMART_SKIP_NOTE
+                _record_history(key, entry, "update", results[key]["started_at"], results[key])
+                return True
+            t0 = time.monotonic()
+            if _is_default_compose_update(entry):
+                rc = _run_command(entry, COMPOSE_SWAP_CMD, "update", phase="up")
+            else:
+                rc = _run_action(entry, "update")
+            results[key]["swap_window"] = time.monotonic() - t0
+            results[key]["rc"] = rc
+            results[key]["after"] = _capture_version(entry, "snapshot_after")
+            _record_history(key, entry, "update", results[key]["started_at"], results[key])
+            check_rc = _post_check(key, entry) if rc == 0 else 0
+            if auto_rollback and (rc != 0 or check_rc != 0):
+                results[key]["rollback"] = _auto_rollback(key, entry, results[key]["before"], results[key]["after"], report=False)
+                results[key]["rc"] = rc or check_rc
+            elif check_rc != 0:
+                results[key]["note"] = "post-check failed"
+            span["rc"] = results[key]["rc"]
+            return rc == 0 and check_rc == 0
+
+    with _fleet_routing():
+        t0 = time.monotonic()
+        with _thread_pool(max_workers=jobs) as pool:
+            refs_by_key = dict(zip(entries, pool.map(_with_parent_output(prepare), entries)))
+        timings["prepare"] = time.monotonic() - t0
+
+        owners: Dict[str, List[str]] = {}
+        for key, refs in refs_by_key.items():
+            for ref in refs:
+                owners.setdefault(ref, []).append(key)
+        total_refs = sum(len(refs) for refs in refs_by_key.values())
+
+        failed_pulls: List[str] = []
+        if not any(r["rc"] != 0 for r in results.values()):
+            t0 = time.monotonic()
+            with _thread_pool(max_workers=pull_jobs) as pool:
+                pull_rcs = list(pool.map(_with_parent_output(lambda ref: pull(ref, owners[ref][0])), sorted(owners)))
+            timings["pull"] = time.monotonic() - t0
+            failed_pulls = [ref for ref, rc in zip(sorted(owners), pull_rcs) if rc != 0]
+
+        blocked = failed_pulls or any(r["rc"] != 0 for r in results.values())
+        if blocked:
+            for key, r in results.items():
+                if r["rc"] == 0:
+                    r["rc"] = 1
+                    r["note"] = "swap skipped: pull phase did not complete"
+                elif not r.get("note"):
+                    r["note"] = "prepare failed"
+        else:
+            t0 = time.monotonic()
+            order = [key for wave in waves for key in wave] if staged else list(entries)
+            state = _run_dag(order, deps, jobs, swap)
+            for key, s in state.items():
+                if "cancelled_by" in s:
+                    results[key].update(rc=1, note=_cancelled_note(s))
+            timings["swap"] = time.monotonic() - t0
+    timings["total"] = time.monotonic() - started
+
+    ordered = [results[key] for key in entries]
+    if dry_run:
+        _print_fleet_summary(ordered)
+    else:
+        _print_fleet_version_report("update", ordered)
+
+    print("[PIPELINE_TIMINGS]", flush=True)
+    for phase in ["prepare", "pull", "swap", "total"]:
+        if phase not in timings:
+            continue
+        detail = ""
+        if phase == "pull":
+            detail = f" ({len(owners)} unique images for {total_refs} references)"
+            if failed_pulls:
+                detail += f", failed: {', '.join(failed_pulls)}"
+        print(f"- {phase}: {timings[phase]:.2f}s{detail}", flush=True)
+    if staged and "swap" in timings:
+        _print_critical_path(order, deps, state, timings["swap"])
+
+    return next((r["rc"] for r in ordered if r["rc"] != 0), 0)
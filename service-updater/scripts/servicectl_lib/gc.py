@@ -0,0 +1,127 @@
+"""Removing old images of registered services that no recorded deployment still needs."""
+from __future__ import annotations
+
+import os
+import sys
+from contextlib import nullcontext
+
+from .common import HISTORY_PATH, _format_size, _image_lock, _shell_quote, _short, _span
+from .compose import (
+    _compose_listing_records, _group_listing, _image_repo, _inspect_projected, _parse_image_ref, _registry_ref_key,
+    _state_query_entry, _state_query_groups, _with_engine_fallback,
+)
+from .registry import _load_config
+from .runner import _run_shell
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any, Dict, List, Optional, Tuple
+
+IMAGE_LISTING_FORMAT = "{{.ID}}\t{{.Repository}}\t{{.Tag}}"
+IMAGE_SIZE_FORMAT = "{{json .Id}}\t{{json .Size}}"
+
+
+def _gc_plan(members: List[Tuple[str, Dict]], keep: int) -> Tuple[Optional[str], Dict[str, Any]]:
+    """Images of the services' repositories that nothing needs any more, from one container and one image listing.
+
+    Kept: images of every compose container on the host (stopped ones and unregistered projects
+    included), images carrying a tag some container runs from (a freshly pulled update), and the
+    `keep` most recently deployed previous images of each service component in the history store.
+    Only repositories the services run or ran are considered; locally built `<none>` images are left alone.
+    """
+    from .history import _history_store
+
+    entry = _state_query_entry(members[0][1])
+    error, listed, containers, _ = _with_engine_fallback(members[0][1], _compose_listing_records)
+    if error is not None:
+        return error, {}
+    in_use = {c.image_id for c in containers if c.image_id}
+    tags_in_use = {_registry_ref_key(p) for p in (_parse_image_ref(c.image_ref) for c in containers) if p}
+    grouped = _group_listing(members, listed, containers)
+    repos = {_image_repo(c.image_ref) for items in grouped.values() for _, c in items}
+
+    store = _history_store() if os.path.exists(HISTORY_PATH) else None
+    history = store.component_images([key for key, _ in members]) if store is not None else []
+    repos.update(_image_repo(image_ref) for _, _, _, image_ref in history)
+    repos.discard(None)
+    previous: Dict[str, str] = {}
+    counts: Dict[Tuple[str, str], int] = {}
+    for service, component, image_id, _ in history:
+        if image_id in in_use or image_id in previous or counts.get((service, component), 0) >= keep:
+            continue
+        counts[(service, component)] = counts.get((service, component), 0) + 1
+        previous[image_id] = f"{service}/{component}"
+
+    cp = _run_shell(entry, f"docker image ls --no-trunc --format {_shell_quote(IMAGE_LISTING_FORMAT)}")
+    if cp.returncode != 0:
+        return (cp.stderr or cp.stdout or "docker image ls failed").strip(), {}
+    names: Dict[str, List[str]] = {}
+    kept = set()
+    for line in (cp.stdout or "").splitlines():
+        parts = line.split("\t")
+        if len(parts) != 3 or parts[1] == "<none>" or _image_repo(parts[1]) not in repos:
+            continue
+        image_id, repository, tag = parts
+        ref = f"{repository}:{tag}" if tag != "<none>" else ""
+        parsed = _parse_image_ref(ref) if ref else None
+        if image_id in in_use or image_id in previous or (parsed is not None and _registry_ref_key(parsed) in tags_in_use):
+            kept.add(image_id)
+            continue
+        names.setdefault(image_id, []).extend([ref] if ref else [])
+    remove = {image_id: refs for image_id, refs in names.items() if image_id not in kept}
+    return None, {"entry": entry, "remove": remove, "kept": len(kept), "in_use": len(in_use), "previous": previous}
+
+
+def _gc_group(members: List[Tuple[str, Dict]], keep: int, dry_run: bool) -> int:
+    error, plan = _gc_plan(members, keep)
+    if error is not None:
+        print(f"[ERROR] {error}", file=sys.stderr, flush=True)
+        return 1
+    entry, remove = plan["entry"], plan["remove"]
+    print(f"[GC] {len(members)} services, {plan['in_use']} images in use, {len(plan['previous'])} previous kept"
+          f" (up to {keep} per component), {len(remove)} to remove", flush=True)
+    if not remove:
+        return 0
+
+    _, rows = _inspect_projected(entry, "docker image inspect", IMAGE_SIZE_FORMAT, sorted(remove))
+    sizes = {str(row[0]): int(row[1] or 0) for row in rows}
+    for image_id in sorted(remove, key=lambda i: -sizes.get(i, 0)):
+        refs = ", ".join(remove[image_id]) or "<untagged>"
+        print(f"[GC] {'would remove' if dry_run else 'remove'} {_short(image_id, 19)} {refs} {_format_size(sizes.get(image_id, 0))}", flush=True)
+    # Tagged images are removed by tag so an extra tag outside the registry only loses our names.
+    args = [arg for image_id in sorted(remove) for arg in (remove[image_id] or [image_id])]
+    cmd = "docker image rm " + " ".join(_shell_quote(a) for a in args)
+    if dry_run:
+        print(f"[DRY-RUN] {cmd}", flush=True)
+        print(f"[GC] would reclaim up to {_format_size(sum(sizes.get(i, 0) for i in remove))}", flush=True)
+        return 0
+
+    cp = _run_shell(entry, cmd)
+    deleted = {line.split(":", 1)[1].strip() for line in (cp.stdout or "").splitlines() if line.startswith("Deleted:")}
+    removed = [image_id for image_id in remove if image_id in deleted]
+    for line in (cp.stderr or "").strip().splitlines():
+        print(f"[GC] kept: {line}", flush=True)
+    # Sizes count layers shared with kept images too, so this is an upper bound.
+    print(f"[GC] removed {len(removed)} of {len(remove)} images, reclaimed up to {_format_size(sum(sizes.get(i, 0) for i in removed))}", flush=True)
+    return 0 if cp.returncode == 0 else 1
+
+
+def _gc_registered(keep: int, dry_run: bool) -> int:
+    """Remove images no registered compose service needs, one pass per docker environment."""
+    services = _load_config().get("services", {})
+    compose = [(key, entry) for key, entry in sorted(services.items()) if str(entry.get("runtime", "custom")) == "docker_compose"]
+    if not compose:
+        print("[GC] no docker_compose services registered", flush=True)
+        return 0
+    rc = 0
+    with nullcontext() if dry_run else _image_lock(exclusive=True):
+        for members in _state_query_groups(compose):
+            with _span("gc", services=len(members)) as span:
+                try:
+                    span["rc"] = _gc_group(members, max(0, keep), dry_run)
+                except ValueError as e:
+                    # A bad registry entry skips its docker environment, not the whole pass.
+                    print(f"[ERROR] gc {', '.join(key for key, _ in members)}: {e}", file=sys.stderr, flush=True)
+                    span["rc"] = 1
+            rc = rc or span["rc"]
+    return rc
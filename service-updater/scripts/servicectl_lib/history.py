@@ -0,0 +1,285 @@
+"""Deployment history in SQLite: the images each service ran, per deployment."""
+from __future__ import annotations
+
+import os
+import sys
+import threading
+import time
+
+from .common import HISTORY_PATH, NATIVE_RUNTIMES, _span
+from .compose import _ContainerRecord, _ImageRecord, _ref_digest, _repo_digest_entry
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any, Dict, List, Optional, Tuple
+
+HISTORY_SCHEMA_VERSION = 1
+
+_HISTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS containers (
+    container_id TEXT PRIMARY KEY,
+    container TEXT NOT NULL,
+    component TEXT NOT NULL,
+    image_ref TEXT NOT NULL,
+    image_id TEXT NOT NULL,
+    first_seen REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS images (
+    image_id TEXT PRIMARY KEY,
+    version TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    revision TEXT NOT NULL,
+    first_seen REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS deployments (
+    id INTEGER PRIMARY KEY,
+    service TEXT NOT NULL,
+    action TEXT NOT NULL,
+    runtime TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    finished_at REAL NOT NULL,
+    rc INTEGER NOT NULL,
+    note TEXT NOT NULL,
+    before_version TEXT NOT NULL,
+    after_version TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS deployments_by_service ON deployments (service, id);
+CREATE TABLE IF NOT EXISTS deployment_containers (
+    deployment_id INTEGER NOT NULL REFERENCES deployments (id),
+    phase TEXT NOT NULL,
+    container_id TEXT NOT NULL REFERENCES containers (container_id)
+);
+CREATE INDEX IF NOT EXISTS deployment_containers_by_deployment ON deployment_containers (deployment_id);
+"""
+
+
+class _HistoryStore:
+    """Append-only SQLite log of update/restart runs.
+
+    Containers are stored once, keyed by their IDs (immutable in Docker), and each
+    deployment references the containers seen before and after it. Images are keyed by
+    their IDs too, but their RepoDigests are not immutable: refresh_images rewrites them.
+    Store errors are reported and otherwise ignored: history never fails an action.
+    """
+
+    # SQLite's default limit on bound parameters is 999 on older builds.
+    _CHUNK = 500
+
+    def __init__(self, path: str) -> None:
+        import sqlite3
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10.0, isolation_level=None, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+            if version > HISTORY_SCHEMA_VERSION:
+                raise sqlite3.DatabaseError(f"history schema v{version} is newer than this servicectl (v{HISTORY_SCHEMA_VERSION})")
+            self._conn.executescript(_HISTORY_SCHEMA)
+            self._conn.execute(f"PRAGMA user_version={HISTORY_SCHEMA_VERSION}")
+
+    def _query(self, sql: str, params: Tuple = ()) -> List[Tuple]:
+        import sqlite3
+
+        try:
+            with self._lock:
+                return self._conn.execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            print(f"[HISTORY] read failed: {e}", file=sys.stderr, flush=True)
+            return []
+
+    def _select_by_ids(self, sql: str, ids: List[str]) -> List[Tuple]:
+        rows: List[Tuple] = []
+        for i in range(0, len(ids), self._CHUNK):
+            chunk = ids[i:i + self._CHUNK]
+            rows.extend(self._query(sql.format(marks=",".join("?" * len(chunk))), tuple(chunk)))
+        return rows
+
+    def _write(self, fn: Any) -> Any:
+        """Run fn(cursor) in one write transaction; returns its result, or None if the store failed."""
+        import sqlite3
+
+        try:
+            with self._lock:
+                cur = self._conn.cursor()
+                cur.execute("BEGIN IMMEDIATE")
+                try:
+                    result = fn(cur)
+                    cur.execute("COMMIT")
+                except BaseException:
+                    cur.execute("ROLLBACK")
+                    raise
+                return result
+        except sqlite3.Error as e:
+            print(f"[HISTORY] write failed: {e}", file=sys.stderr, flush=True)
+            return None
+
+    def containers(self, ids: List[str]) -> Dict[str, _ContainerRecord]:
+        sql = "SELECT container_id, container, component, image_ref, image_id FROM containers WHERE container_id IN ({marks})"
+        return {row[0]: _ContainerRecord(*row) for row in self._select_by_ids(sql, ids)}
+
+    def images(self, ids: List[str]) -> Dict[str, _ImageRecord]:
+        # Rows holding one bare digest predate keeping every RepoDigests entry; they are inspected again.
+        sql = "SELECT image_id, version, digest, revision FROM images WHERE image_id IN ({marks}) AND (digest = '' OR instr(digest, '@') > 0)"
+        return {row[0]: _ImageRecord(*row) for row in self._select_by_ids(sql, ids)}
+
+    @staticmethod
+    def _insert_containers(cur: Any, records: List[_ContainerRecord], now: float) -> None:
+        cur.executemany(
+            "INSERT OR IGNORE INTO containers VALUES (?, ?, ?, ?, ?, ?)", [(*r.row(), now) for r in records if r.container_id]
+        )
+
+    @staticmethod
+    def _insert_images(cur: Any, records: List[_ImageRecord], now: float) -> None:
+        cur.executemany(
+            "INSERT INTO images VALUES (?, ?, ?, ?, ?) ON CONFLICT (image_id) DO UPDATE SET digest = excluded.digest"
+            " WHERE instr(images.digest, '@') = 0 AND instr(excluded.digest, '@') > 0",
+            [(*r.row(), now) for r in records if r.image_id],
+        )
+
+    def add_containers(self, records: List[_ContainerRecord]) -> None:
+        if records:
+            self._write(lambda cur: self._insert_containers(cur, records, time.time()))
+
+    def refresh_images(self, records: List[_ImageRecord]) -> None:
+        """Store freshly inspected images, replacing the metadata of rows already stored."""
+        rows = [(*r.row(), time.time()) for r in records if r.image_id]
+        if rows:
+            self._write(lambda cur: cur.executemany(
+                "INSERT INTO images VALUES (?, ?, ?, ?, ?) ON CONFLICT (image_id) DO UPDATE SET"
+                " version = excluded.version, digest = excluded.digest, revision = excluded.revision",
+                rows,
+            ))
+
+    def record_deployment(self, service: str, action: str, runtime: str, started_at: float, finished_at: float,
+                          rc: int, note: str, before: Dict[str, Any], after: Dict[str, Any]) -> Optional[int]:
+        phases = [("before", _snapshot_component_records(before)), ("after", _snapshot_component_records(after))]
+
+        def write(cur: Any) -> int:
+            now = time.time()
+            self._insert_containers(cur, [c for _, records in phases for c, _ in records], now)
+            self._insert_images(cur, [img for _, records in phases for _, img in records], now)
+            cur.execute(
+                "INSERT INTO deployments (service, action, runtime, started_at, finished_at, rc, note, before_version, after_version)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (service, action, runtime, started_at, finished_at, rc, note, _custom_version_output(before), _custom_version_output(after)),
+            )
+            deployment_id = cur.lastrowid
+            cur.executemany(
+                "INSERT INTO deployment_containers VALUES (?, ?, ?)",
+                [(deployment_id, phase, c.container_id) for phase, records in phases for c, _ in records if c.container_id],
+            )
+            return deployment_id
+
+        return self._write(write)
+
+    def count(self, service: str) -> int:
+        rows = self._query("SELECT COUNT(*) FROM deployments WHERE service = ?", (service,))
+        return rows[0][0] if rows else 0
+
+    def component_images(self, services: List[str]) -> List[Tuple[str, str, str, str]]:
+        """(service, component, image_id, image_ref) seen in the services' deployments, most recently seen first."""
+        sql = (
+            "SELECT d.service, c.component, c.image_id, c.image_ref, MAX(d.id) FROM deployments d"
+            " JOIN deployment_containers dc ON dc.deployment_id = d.id JOIN containers c ON c.container_id = dc.container_id"
+            " WHERE d.service IN ({marks}) AND c.image_id != '' GROUP BY d.service, c.component, c.image_id"
+        )
+        rows = sorted(self._select_by_ids(sql, services), key=lambda row: row[4], reverse=True)
+        return [(row[0], row[1], row[2], row[3]) for row in rows]
+
+    def deployments(self, service: str, limit: int) -> List[Dict[str, Any]]:
+        """Most recent deployments first, each with before/after snapshots rebuilt from the store."""
+        fields = ("id", "service", "action", "runtime", "started_at", "finished_at", "rc", "note", "before_version", "after_version")
+        rows = self._query(
+            f"SELECT {', '.join(fields)} FROM deployments WHERE service = ? ORDER BY id DESC LIMIT ?", (service, limit)
+        )
+        deployments = [dict(zip(fields, row)) for row in rows]
+        by_id: Dict[int, Dict[str, Any]] = {}
+        for d in deployments:
+            by_id[d["id"]] = d
+            d["before"] = _history_snapshot(d["runtime"], d.pop("before_version"))
+            d["after"] = _history_snapshot(d["runtime"], d.pop("after_version"))
+
+        sql = (
+            "SELECT dc.deployment_id, dc.phase, c.component, c.container, c.container_id, c.image_ref, c.image_id,"
+            " COALESCE(i.version, ''), COALESCE(i.digest, ''), COALESCE(i.revision, '')"
+            " FROM deployment_containers dc JOIN containers c ON c.container_id = dc.container_id"
+            " LEFT JOIN images i ON i.image_id = c.image_id WHERE dc.deployment_id IN ({marks})"
+        )
+        comp_fields = ("container", "container_id", "image_ref", "image_id", "version", "digest", "revision")
+        for row in self._select_by_ids(sql, [str(i) for i in by_id]):
+            snap = by_id[row[0]][row[1]].get("runtime_snapshot")
+            if snap is not None:
+                comp = dict(zip(comp_fields, row[3:]))
+                comp["digest"] = _ref_digest(comp["image_ref"], comp["digest"])
+                snap["components"][row[2]] = comp
+        return deployments
+
+
+def _snapshot_component_records(snap: Dict[str, Any]) -> List[Tuple[_ContainerRecord, _ImageRecord]]:
+    """(container record, image record) pairs for the components of a version snapshot."""
+    runtime_snap = snap.get("runtime_snapshot") if isinstance(snap, dict) else None
+    if not isinstance(runtime_snap, dict) or not runtime_snap.get("ok"):
+        return []
+    records = []
+    for name, comp in (runtime_snap.get("components") or {}).items():
+        container = _ContainerRecord(*(str(comp.get(k, "")) for k in ("container_id", "container")), name,
+                                     *(str(comp.get(k, "")) for k in ("image_ref", "image_id")))
+        image = _ImageRecord(str(comp.get("image_id", "")), str(comp.get("version", "")),
+                             _repo_digest_entry(str(comp.get("image_ref", "")), str(comp.get("digest", ""))), str(comp.get("revision", "")))
+        records.append((container, image))
+    return records
+
+
+def _custom_version_output(snap: Dict[str, Any]) -> str:
+    custom = snap.get("custom_snapshot") if isinstance(snap, dict) else None
+    return str(custom.get("output", "")) if isinstance(custom, dict) else ""
+
+
+def _history_snapshot(runtime: str, custom_output: str) -> Dict[str, Any]:
+    """Skeleton of a version snapshot as _capture_version returns it, for _version_report_lines."""
+    snap: Dict[str, Any] = {"runtime": runtime}
+    if runtime == "docker_compose" or runtime in NATIVE_RUNTIMES:
+        snap["runtime_snapshot"] = {"mode": runtime, "ok": True, "components": {}}
+    if custom_output:
+        snap["custom_snapshot"] = {"ok": True, "output": custom_output, "error": ""}
+    return snap
+
+
+_HISTORY: Dict[str, Any] = {"path": None, "store": None}
+_HISTORY_LOCK = threading.Lock()
+
+
+def _history_store() -> Optional[_HistoryStore]:
+    """The process-wide history store, or None when it cannot be opened (reported once)."""
+    import sqlite3
+
+    with _HISTORY_LOCK:
+        if _HISTORY["path"] != HISTORY_PATH:
+            _HISTORY["path"] = HISTORY_PATH
+            try:
+                _HISTORY["store"] = _HistoryStore(HISTORY_PATH)
+            except (OSError, sqlite3.Error) as e:
+                print(f"[HISTORY] unavailable ({HISTORY_PATH}): {e}", file=sys.stderr, flush=True)
+                _HISTORY["store"] = None
+        return _HISTORY["store"]
+
+
+def _record_history(key: str, entry: Dict, action: str, started_at: float, result: Dict[str, Any]) -> None:
+    store = _history_store()
+    if store is None:
+        return
+    with _span("history"):
+        store.record_deployment(
+            service=key,
+            action=action,
+            runtime=str(entry.get("runtime", "custom")),
+            started_at=started_at,
+            finished_at=time.time(),
+            rc=result["rc"],
+            note=result.get("note", ""),
+            before=result.get("before") or {},
+            after=result.get("after") or {},
+        )
@@ -0,0 +1,202 @@
+"""Merged, timestamp-ordered logs of several services."""
+from __future__ import annotations
+
+import os
+import sys
+import threading
+import time
+
+from .common import _count_spawn, _shell_quote, _span
+from .compose import _compose_records
+from .runner import _build_runner, _kill_process_group, _service_env
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    import subprocess
+    from typing import Any, Deque, Dict, List, Optional, Tuple
+
+LOG_STREAM_BUFFER = 256
+LOG_LINE_BYTES = 65536
+LOG_FOLLOW_LAG = 0.25
+LOG_WRITE_BATCH = 512
+
+
+class _LogStream:
+    """One container's `docker logs --timestamps` output, buffered up to LOG_STREAM_BUFFER entries."""
+
+    __slots__ = ("service", "container", "proc", "entries", "space", "done", "last_ts")
+
+    def __init__(self, service: str, container: str, proc: subprocess.Popen, lock: threading.Lock) -> None:
+        import collections
+
+        self.service = service
+        self.container = container
+        self.proc = proc
+        self.entries: Deque[Tuple[str, float, str]] = collections.deque()
+        # Shares the merge lock; the reader waits here while the buffer is full.
+        self.space = threading.Condition(lock)
+        self.done = False
+        self.last_ts = ""
+
+
+def _logs_command(container_id: str, since: Optional[str], tail: Optional[str], follow: bool) -> str:
+    parts = ["docker logs --timestamps"]
+    if since:
+        parts.append(f"--since {_shell_quote(since)}")
+    if tail:
+        parts.append(f"--tail {_shell_quote(tail)}")
+    if follow:
+        parts.append("--follow")
+    # stdout and stderr share one pipe so the stream stays in the container's own order.
+    return " ".join(parts + [_shell_quote(container_id), "2>&1"])
+
+
+def _is_log_timestamp(token: str) -> bool:
+    return len(token) >= 20 and token[4] == "-" and token[10] == "T" and token.endswith("Z")
+
+
+def _read_log_stream(stream: _LogStream, pattern: Any, ready: threading.Condition, stop: threading.Event) -> None:
+    """Parse one container's lines into its buffer.
+
+    --grep drops lines here, before they are buffered. A full buffer blocks this reader, and with
+    it the pipe and `docker logs`, until the merge has drained half of it. Lines longer than
+    LOG_LINE_BYTES are cut there. A line without a timestamp (a docker error) takes the previous
+    line's timestamp so it stays in place.
+    """
+    pipe = stream.proc.stdout
+    truncated = False
+    try:
+        for raw in iter(lambda: pipe.readline(LOG_LINE_BYTES), b""):
+            skip, truncated = truncated, not raw.endswith(b"\n")
+            if skip:
+                continue
+            line = raw.decode("utf-8", "replace").rstrip("\r\n")
+            ts, _, message = line.partition(" ")
+            if not _is_log_timestamp(ts):
+                ts, message = stream.last_ts, line
+            stream.last_ts = ts
+            if pattern is not None and not pattern.search(message):
+                continue
+            arrived = time.monotonic()
+            with ready:
+                while len(stream.entries) >= LOG_STREAM_BUFFER and not stop.is_set():
+                    stream.space.wait()
+                if stop.is_set():
+                    return
+                stream.entries.append((ts, arrived, message))
+                if len(stream.entries) == 1:
+                    ready.notify()
+    finally:
+        pipe.close()
+        with ready:
+            stream.done = True
+            ready.notify()
+
+
+def _merge_log_streams(streams: List[_LogStream], ready: threading.Condition, follow: bool) -> None:
+    """Print entries from all streams in timestamp order with a k-way heap merge.
+
+    The heap holds at most one head entry per stream. Each stream is already in order, so the
+    smallest head can be printed once every live stream has a head. While following, an idle
+    stream never produces a head. A head that has waited LOG_FOLLOW_LAG is then printed
+    anyway, and a later entry from the idle stream can come slightly out of order.
+    Output is written in batches outside the lock.
+    """
+    import heapq
+
+    heap: List[Tuple[str, int, float, str]] = []
+    waiting = set(range(len(streams)))
+    done = False
+    while not done:
+        out: List[str] = []
+        with ready:
+            while True:
+                for idx in list(waiting):
+                    stream = streams[idx]
+                    if stream.entries:
+                        ts, arrived, message = stream.entries.popleft()
+                        if len(stream.entries) == LOG_STREAM_BUFFER // 2:
+                            stream.space.notify()
+                        heapq.heappush(heap, (ts, idx, arrived, message))
+                        waiting.discard(idx)
+                    elif stream.done:
+                        waiting.discard(idx)
+                if not heap and not waiting:
+                    done = True
+                    break
+                lag = LOG_FOLLOW_LAG - (time.monotonic() - heap[0][2]) if follow and heap and waiting else None
+                if heap and (not waiting or (lag is not None and lag <= 0)):
+                    ts, idx, _, message = heapq.heappop(heap)
+                    stream = streams[idx]
+                    out.append(f"[{stream.service}] {stream.container} | {ts} {message}\n")
+                    waiting.add(idx)
+                    if len(out) < LOG_WRITE_BATCH:
+                        continue
+                    break
+                if out:
+                    break
+                sys.stdout.flush()
+                ready.wait(lag)
+        sys.stdout.write("".join(out))
+    sys.stdout.flush()
+
+
+def _run_logs(targets: List[Tuple[str, Dict]], since: Optional[str], tail: Optional[str], follow: bool, pattern: Any) -> int:
+    """Stream the logs of every running container of the targets, one `docker logs` per container.
+
+    Memory is bounded by the number of containers times LOG_STREAM_BUFFER, not by log volume.
+    """
+    import subprocess
+
+    containers = []
+    for key, entry in targets:
+        error, records, _ = _compose_records(entry)
+        if error is not None:
+            print(f"[ERROR] {key}: {error}", file=sys.stderr)
+            return 1
+        containers.extend((key, entry, c) for c in sorted(records, key=lambda c: c.container))
+    if not containers:
+        print("[ERROR] no running containers", file=sys.stderr)
+        return 1
+
+    lock = threading.Lock()
+    ready = threading.Condition(lock)
+    stop = threading.Event()
+    streams: List[_LogStream] = []
+    try:
+        for key, entry, c in containers:
+            proc = subprocess.Popen(
+                _build_runner(entry, _logs_command(c.container_id, since, tail, follow)),
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                env=_service_env(entry),
+                start_new_session=True,
+            )
+            _count_spawn()
+            stream = _LogStream(key, c.container, proc, lock)
+            streams.append(stream)
+            threading.Thread(target=_read_log_stream, args=(stream, pattern, ready, stop), daemon=True).start()
+        with _span("logs", streams=len(streams)):
+            _merge_log_streams(streams, ready, follow)
+    except KeyboardInterrupt:
+        pass
+    except BrokenPipeError:
+        # The reader went away (`| head`): stop quietly and keep the exit-time flush from failing too.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    finally:
+        stop.set()
+        with lock:
+            for stream in streams:
+                stream.space.notify()
+        for stream in streams:
+            if stream.proc.poll() is None:
+                _kill_process_group(stream.proc)
+
+    rc = 0
+    for stream in streams:
+        code = stream.proc.wait()
+        if code not in (0, -15) and not follow:
+            print(f"[ERROR] {stream.service} {stream.container}: docker logs exit {code}", file=sys.stderr)
+            rc = 1
+    return rc
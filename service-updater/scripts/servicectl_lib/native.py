@@ -0,0 +1,221 @@
+"""systemd and pm2 services: unit and process state, versions and prechecks."""
+from __future__ import annotations
+
+import json
+import sys
+import time
+
+from .common import NATIVE_RUNTIMES, _content_digest, _format_argv, _span
+from .compose import _snapshot_error, _state_query_entry, _state_query_groups
+from .runner import _build_runner, _run_shell
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any, Dict, List, Optional, Tuple
+
+SYSTEMD_PROPERTIES = [
+    "Id", "LoadState", "ActiveState", "SubState", "MainPID", "ExecMainStartTimestamp", "InvocationID",
+    "FragmentPath", "DropInPaths", "NeedDaemonReload",
+]
+
+
+def _service_units(entry: Dict) -> List[str]:
+    return [str(u).strip() for u in entry.get("units", []) or [] if str(u).strip()]
+
+
+def _native_query_cmd(runtime: str, units: List[str]) -> str:
+    if runtime == "systemd":
+        return f"systemctl show --property={','.join(SYSTEMD_PROPERTIES)} -- {_format_argv(units)}"
+    return "pm2 jlist"
+
+
+def _systemd_component(unit: str, props: Dict[str, str]) -> Dict[str, Any]:
+    """Component record of a unit; the unit file hash covers the fragment and its drop-ins."""
+    fragment = props.get("FragmentPath", "")
+    load_state = props.get("LoadState", "") or "not-found"
+    active = props.get("ActiveState", "") or "unknown"
+    pid = props.get("MainPID", "") or "0"
+    started = props.get("ExecMainStartTimestamp", "")
+    instance = props.get("InvocationID") or f"{pid}@{started}"
+    return {
+        "container": unit,
+        "container_id": f"{unit}@{instance}" if load_state == "loaded" else "",
+        "image_ref": fragment,
+        "image_id": f"unit:{_content_digest([fragment, *props.get('DropInPaths', '').split()])}" if fragment else "",
+        "version": "",
+        "digest": "",
+        "revision": "",
+        "state": f"{active} ({props.get('SubState', '') or '-'})" if load_state == "loaded" else load_state,
+        "running": active == "active",
+        "pid": pid,
+        "started": started,
+        "needs_reload": props.get("NeedDaemonReload") == "yes",
+    }
+
+
+def _systemd_components(entry: Dict, units: List[str]) -> Tuple[Optional[str], Dict[str, Dict[str, Any]]]:
+    """One `systemctl show` for all units; its property blocks come back in argument order."""
+    cp = _run_shell(_state_query_entry(entry), _native_query_cmd("systemd", units))
+    if cp.returncode != 0:
+        return (cp.stderr or cp.stdout or "systemctl show failed").strip(), {}
+    blocks = [b for b in (cp.stdout or "").strip("\n").split("\n\n")] if units else []
+    if len(blocks) != len(units):
+        return f"systemctl show returned {len(blocks)} property blocks for {len(units)} units", {}
+    components = {}
+    for unit, block in zip(units, blocks):
+        props = dict(line.partition("=")[::2] for line in block.splitlines() if "=" in line)
+        components[unit] = _systemd_component(unit, props)
+    return None, components
+
+
+def _pm2_component(proc: Dict[str, Any]) -> Dict[str, Any]:
+    """Component record of a pm2 process; the code identity is the script's content plus its version and git revision."""
+    env = proc.get("pm2_env", {}) or {}
+    name = str(proc.get("name") or env.get("name") or "")
+    exec_path = str(env.get("pm_exec_path", "") or "")
+    version = str(env.get("version", "") or "").strip()
+    version = "" if version == "N/A" else version
+    revision = str((env.get("versioning", {}) or {}).get("revision", "") or "").strip()
+    status = str(env.get("status", "") or "unknown")
+    uptime = env.get("pm_uptime")
+    started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(uptime / 1000)) if isinstance(uptime, (int, float)) else ""
+    return {
+        "container": name,
+        "container_id": f"{name}:{proc.get('pm_id', '')}@{uptime or ''}",
+        "image_ref": exec_path,
+        "image_id": f"app:{_content_digest([exec_path], (version, revision))}" if exec_path else "",
+        "version": version,
+        "digest": "",
+        "revision": revision,
+        "state": status,
+        "running": status == "online",
+        "pid": str(proc.get("pid") or 0),
+        "started": started,
+        "restarts": str(env.get("restart_time", "") or 0),
+    }
+
+
+def _pm2_components(entry: Dict, units: List[str]) -> Tuple[Optional[str], Dict[str, Dict[str, Any]]]:
+    """Every process from one `pm2 jlist`; cluster instances are keyed `<name>#<pm_id>`."""
+    cp = _run_shell(_state_query_entry(entry), _native_query_cmd("pm2", units))
+    out = cp.stdout or ""
+    start = out.find("[")
+    if cp.returncode != 0 or start < 0:
+        return (cp.stderr or out or "pm2 jlist failed").strip(), {}
+    try:
+        # pm2 may print daemon notices around the JSON document.
+        procs, _ = json.JSONDecoder().raw_decode(out, start)
+    except ValueError as e:
+        return f"pm2 jlist returned invalid JSON: {e}", {}
+    wanted = set(units)
+    by_name: Dict[str, List[Dict[str, Any]]] = {}
+    for proc in procs if isinstance(procs, list) else []:
+        if isinstance(proc, dict) and str(proc.get("name", "")) in wanted:
+            by_name.setdefault(str(proc["name"]), []).append(proc)
+    components = {}
+    for unit in units:
+        procs = by_name.get(unit, [])
+        for proc in procs:
+            name = unit if len(procs) == 1 else f"{unit}#{proc.get('pm_id', '')}"
+            components[name] = _pm2_component(proc)
+        if not procs:
+            components[unit] = {"container": unit, "container_id": "", "image_ref": "", "image_id": "", "version": "",
+                                "digest": "", "revision": "", "state": "not-found", "running": False}
+    return None, components
+
+
+def _native_components(runtime: str, entry: Dict, units: List[str]) -> Tuple[Optional[str], Dict[str, Dict[str, Any]]]:
+    if runtime == "systemd":
+        return _systemd_components(entry, units)
+    return _pm2_components(entry, units)
+
+
+def _native_version_snapshot(runtime: str, entry: Dict) -> Dict[str, Any]:
+    units = _service_units(entry)
+    if not units:
+        return _snapshot_error("no units configured (set --unit)", runtime)
+    error, components = _native_components(runtime, entry, units)
+    if error is not None:
+        return _snapshot_error(error, runtime)
+    return {"mode": runtime, "ok": True, "components": components}
+
+
+def _native_precheck(runtime: str, entry: Dict) -> int:
+    snap = _native_version_snapshot(runtime, entry)
+    if not snap["ok"]:
+        print(f"[PRECHECK] {runtime} state query failed: {snap['error']}", file=sys.stderr)
+        return 2
+    missing = [c["container"] for c in snap["components"].values() if c["state"] == "not-found"]
+    if missing:
+        print(f"[PRECHECK] {runtime} has no {'unit' if runtime == 'systemd' else 'process'}: {', '.join(missing)}", file=sys.stderr)
+        return 2
+    return 0
+
+
+def _native_state_text(comp: Dict[str, Any]) -> str:
+    parts = [str(comp["state"])]
+    if comp.get("pid") not in (None, "", "0"):
+        parts.append(f"pid {comp['pid']}")
+    if comp.get("started"):
+        parts.append(f"since {comp['started']}")
+    if comp.get("restarts") not in (None, "", "0"):
+        parts.append(f"restarts {comp['restarts']}")
+    if comp.get("needs_reload"):
+        parts.append("unit file changed, daemon-reload pending")
+    return ", ".join(parts)
+
+
+def _has_native_status(entry: Dict) -> bool:
+    runtime = str(entry.get("runtime", "custom")).strip().lower()
+    return runtime in NATIVE_RUNTIMES and not str((entry.get("actions", {}) or {}).get("status", "")).strip()
+
+
+def _native_states(targets: List[Tuple[str, Dict]]) -> Dict[str, Tuple[Optional[str], List[Tuple[str, Dict[str, Any]]]]]:
+    """Components of systemd/pm2 services from one state query per runtime and shell environment."""
+    states: Dict[str, Tuple[Optional[str], List[Tuple[str, Dict[str, Any]]]]] = {}
+    for members in _state_query_groups(targets):
+        entry = members[0][1]
+        runtime = str(entry.get("runtime", "custom")).strip().lower()
+        units = list(dict.fromkeys(u for _, e in members for u in _service_units(e)))
+        error, components = None, {}
+        if units:
+            with _span("status", runtime=runtime, units=len(units)) as span:
+                error, components = _native_components(runtime, entry, units)
+                span["rc"] = 0 if error is None else 1
+        for key, e in members:
+            if not _service_units(e):
+                states[key] = ("no units configured (set --unit)", [])
+            elif error is not None:
+                states[key] = (f"{runtime} state query failed: {error}", [])
+            else:
+                units_of = set(_service_units(e))
+                states[key] = (None, [(name, comp) for name, comp in components.items() if comp["container"] in units_of])
+    return states
+
+
+def _run_native_status(targets: List[Tuple[str, Dict]], dry_run: bool) -> int:
+    """Status of systemd/pm2 services: one state query per runtime and shell environment, however many services."""
+    if dry_run:
+        for members in _state_query_groups(targets):
+            entry = members[0][1]
+            runtime = str(entry.get("runtime", "custom")).strip().lower()
+            units = list(dict.fromkeys(u for _, e in members for u in _service_units(e)))
+            print("[DRY-RUN]", _format_argv(_build_runner(_state_query_entry(entry), _native_query_cmd(runtime, units))), flush=True)
+        return 0
+
+    rc = 0
+    for key, (error, components) in _native_states(targets).items():
+        if error is not None:
+            print(f"[ERROR] {key}: {error}", file=sys.stderr)
+            rc = rc or 1
+        for name, comp in components:
+            print(f"[STATUS] {key} {name}: {_native_state_text(comp)}", flush=True)
+            if not comp["running"]:
+                rc = rc or 3
+    return rc
+
+
+def _native_summary(error: Optional[str], components: List[Tuple[str, Dict[str, Any]]]) -> str:
+    if error is not None:
+        return f"unknown ({error})"
+    return "; ".join(f"{name} {_native_state_text(comp)}" for name, comp in components) or "-"
@@ -0,0 +1,336 @@
+"""Registry lookups of the digests image tags point to, for `outdated`."""
+from __future__ import annotations
+
+import json
+import os
+import sys
+import threading
+import time
+
+from .common import CACHE_DIR, _dump_json, _safe_json_loads, _short, _span, _write_atomic
+from .compose import _docker_compose_version_snapshot, _parse_image_ref, _registry_ref_key
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    import http.client
+    from typing import Any, Dict, List, Optional, Tuple
+
+REGISTRY_MANIFEST_ACCEPT = ", ".join(
+    [
+        "application/vnd.oci.image.index.v1+json",
+        "application/vnd.docker.distribution.manifest.list.v2+json",
+        "application/vnd.oci.image.manifest.v1+json",
+        "application/vnd.docker.distribution.manifest.v2+json",
+    ]
+)
+DOCKER_HUB_API = "registry-1.docker.io"
+LOOPBACK_HOSTS = {"localhost", "127.0.0.1", "::1"}
+REGISTRY_HOST_CONNECTIONS = 4
+REGISTRY_TIMEOUT = 10.0
+REGISTRY_CACHE_PATH = os.path.join(CACHE_DIR, "registry-digests.json")
+
+
+class _RegistryError(Exception):
+    pass
+
+
+def _registry_base_url(host: str) -> str:
+    from urllib.parse import urlsplit
+
+    if host == "docker.io":
+        return f"https://{DOCKER_HUB_API}"
+    insecure = {h.strip() for h in os.environ.get("SERVICECTL_INSECURE_REGISTRIES", "").split(",") if h.strip()}
+    # Like dockerd, loopback registries (a local registry:2 or test stand-in) are spoken to over plain HTTP.
+    if urlsplit(f"//{host}").hostname in LOOPBACK_HOSTS or host in insecure:
+        return f"http://{host}"
+    return f"https://{host}"
+
+
+def _docker_credentials(host: str) -> Optional[str]:
+    """Base64 `user:password` stored by `docker login` for host; credential helpers are not consulted."""
+    path = os.path.join(os.environ.get("DOCKER_CONFIG") or os.path.expanduser("~/.docker"), "config.json")
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+    except (OSError, ValueError):
+        return None
+    auths = config.get("auths", {}) if isinstance(config, dict) else {}
+    if host == "docker.io":
+        keys = ["https://index.docker.io/v1/", "index.docker.io", "docker.io"]
+    else:
+        keys = [host, f"https://{host}", f"http://{host}"]
+    for k in keys:
+        item = auths.get(k) if isinstance(auths, dict) else None
+        if isinstance(item, dict) and item.get("auth"):
+            return str(item["auth"])
+    return None
+
+
+class _RegistryClient:
+    """Manifest digest lookups over kept-alive HTTP(S) connections, pooled per registry and token host.
+
+    Concurrent lookups each borrow an idle connection to their host (or open one, at most
+    REGISTRY_HOST_CONNECTIONS per host) and hand it back afterwards, so a fleet's worth of HEAD
+    requests reuses a few TLS sessions. Authorization obtained
+    from a 401 challenge is kept per repository for the life of the client.
+    """
+
+    def __init__(self, timeout: float = REGISTRY_TIMEOUT) -> None:
+        self.timeout = timeout
+        self.connections = 0
+        self._idle: Dict[str, List[http.client.HTTPConnection]] = {}
+        self._slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._auth: Dict[Tuple[str, str], str] = {}
+        self._lock = threading.Lock()
+
+    def _connect(self, scheme: str, netloc: str) -> http.client.HTTPConnection:
+        import http.client
+
+        with self._lock:
+            self.connections += 1
+        if scheme == "https":
+            return http.client.HTTPSConnection(netloc, timeout=self.timeout)
+        return http.client.HTTPConnection(netloc, timeout=self.timeout)
+
+    def request(self, method: str, url: str, headers: Dict[str, str]) -> Tuple[int, Dict[str, str], bytes]:
+        from urllib.parse import urlsplit
+
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        with self._lock:
+            slots = self._slots.setdefault(origin, threading.BoundedSemaphore(REGISTRY_HOST_CONNECTIONS))
+        with slots:
+            return self._request_on(origin, parts.scheme, parts.netloc, method, target, headers)
+
+    def _request_on(
+        self, origin: str, scheme: str, netloc: str, method: str, target: str, headers: Dict[str, str]
+    ) -> Tuple[int, Dict[str, str], bytes]:
+        import http.client
+
+        for attempt in range(2):
+            with self._lock:
+                idle = self._idle.get(origin)
+                conn = idle.pop() if idle and attempt == 0 else None
+            reused = conn is not None
+            if conn is None:
+                conn = self._connect(scheme, netloc)
+            try:
+                conn.request(method, target, headers=headers)
+                resp = conn.getresponse()
+                body = resp.read()
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                # An idle connection may have been closed by the registry; retry once on a fresh one.
+                if reused:
+                    continue
+                raise _RegistryError(f"{method} {origin}{target}: {e}") from e
+            if resp.will_close:
+                conn.close()
+            else:
+                with self._lock:
+                    self._idle.setdefault(origin, []).append(conn)
+            return resp.status, {k.lower(): v for k, v in resp.getheaders()}, body
+        raise _RegistryError(f"{method} {origin}{target} failed")
+
+    def _authorize(self, host: str, repo: str, challenge: str) -> Optional[str]:
+        """Authorization header answering a 401 challenge: a bearer token from its realm, or basic docker login."""
+        import re
+        from urllib.parse import urlencode
+
+        scheme, _, params = challenge.strip().partition(" ")
+        creds = _docker_credentials(host)
+        if scheme.lower() == "basic":
+            return f"Basic {creds}" if creds else None
+        fields = dict(re.findall(r'(\w+)="([^"]*)"', params))
+        if scheme.lower() != "bearer" or not fields.get("realm"):
+            return None
+        query = {"service": fields.get("service", ""), "scope": fields.get("scope") or f"repository:{repo}:pull"}
+        headers = {"Authorization": f"Basic {creds}"} if creds else {}
+        status, _, body = self.request("GET", f"{fields['realm']}?{urlencode({k: v for k, v in query.items() if v})}", headers)
+        if status != 200:
+            raise _RegistryError(f"token request to {fields['realm']} -> HTTP {status}")
+        doc = _safe_json_loads(body.decode("utf-8", "replace"), {})
+        token = (doc.get("token") or doc.get("access_token")) if isinstance(doc, dict) else None
+        return f"Bearer {token}" if token else None
+
+    def _manifest(self, method: str, host: str, repo: str, tag: str) -> Tuple[int, Dict[str, str], bytes]:
+        url = f"{_registry_base_url(host)}/v2/{repo}/manifests/{tag}"
+        headers = {"Accept": REGISTRY_MANIFEST_ACCEPT}
+        with self._lock:
+            auth = self._auth.get((host, repo))
+        if auth:
+            headers["Authorization"] = auth
+        status, resp_headers, body = self.request(method, url, headers)
+        if status == 401:
+            auth = self._authorize(host, repo, resp_headers.get("www-authenticate", ""))
+            if auth:
+                with self._lock:
+                    self._auth[(host, repo)] = auth
+                headers["Authorization"] = auth
+                status, resp_headers, body = self.request(method, url, headers)
+        return status, resp_headers, body
+
+    def manifest_digest(self, host: str, repo: str, tag: str) -> str:
+        """Digest the registry currently serves for repo:tag, read from a HEAD request.
+
+        The digest is of the index for multi-arch tags, the same value `docker pull` records in RepoDigests.
+        Registries that omit Docker-Content-Digest get a GET whose body is hashed instead.
+        """
+        import hashlib
+
+        status, headers, _ = self._manifest("HEAD", host, repo, tag)
+        digest = headers.get("docker-content-digest", "")
+        if status == 200 and not digest:
+            status, headers, body = self._manifest("GET", host, repo, tag)
+            digest = headers.get("docker-content-digest") or f"sha256:{hashlib.sha256(body).hexdigest()}"
+        if status == 404:
+            raise _RegistryError("manifest not found")
+        if status != 200:
+            raise _RegistryError(f"HTTP {status}")
+        return digest
+
+    def close(self) -> None:
+        with self._lock:
+            for conns in self._idle.values():
+                for conn in conns:
+                    conn.close()
+            self._idle.clear()
+
+
+def _read_digest_cache(ttl: float) -> Dict[str, List[Any]]:
+    """Cached `ref key -> [digest, fetched_at]` entries younger than ttl seconds."""
+    if ttl <= 0:
+        return {}
+    try:
+        with open(REGISTRY_CACHE_PATH, "rb") as f:
+            cached = json.loads(f.read().decode("utf-8"))
+    except (OSError, ValueError):
+        return {}
+    now = time.time()
+    fresh = {}
+    for key, item in (cached.items() if isinstance(cached, dict) else []):
+        if isinstance(item, list) and len(item) == 2 and isinstance(item[1], (int, float)) and 0 <= now - item[1] < ttl:
+            fresh[key] = item
+    return fresh
+
+
+def _write_digest_cache(entries: Dict[str, List[Any]]) -> None:
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        _write_atomic(REGISTRY_CACHE_PATH, _dump_json(entries))
+    except OSError:
+        pass
+
+
+def _registry_digests(keys: Dict[str, Tuple[str, str, str]], jobs: int, cache_ttl: float) -> Dict[str, Any]:
+    """Current registry digest per ref key: cached answers first, the rest as concurrent HEAD requests."""
+    from .fleet import _thread_pool, _with_parent_output
+
+    cache = _read_digest_cache(cache_ttl)
+    digests = {key: cache[key][0] for key in keys if key in cache}
+    misses = [key for key in keys if key not in digests]
+    errors: Dict[str, str] = {}
+    client = _RegistryClient()
+
+    def lookup(key: str) -> str:
+        with _span("registry", ref=key) as span:
+            digest = client.manifest_digest(*keys[key])
+            span["rc"] = 0
+            return digest
+
+    try:
+        with _thread_pool(max(1, min(jobs, len(misses) or 1))) as pool:
+            futures = {key: pool.submit(_with_parent_output(lookup), key) for key in misses}
+        for key, fut in futures.items():
+            try:
+                digests[key] = fut.result()
+            except _RegistryError as e:
+                errors[key] = str(e)
+    finally:
+        client.close()
+
+    if cache_ttl > 0 and any(key in digests for key in misses):
+        now = time.time()
+        cache.update({key: [digests[key], now] for key in misses if key in digests})
+        _write_digest_cache(cache)
+    return {"digests": digests, "errors": errors, "cached": len(keys) - len(misses), "connections": client.connections}
+
+
+def _outdated_components(components: Dict[str, Dict[str, Any]], lookup: Dict[str, Any]) -> List[Tuple[str, str, str]]:
+    """(component, state, detail) per component; state is changed, current, unknown or error (registry lookup failed)."""
+    rows = []
+    for name in sorted(components):
+        comp = components[name]
+        ref, local = str(comp.get("image_ref", "")), str(comp.get("digest", ""))
+        parsed = _parse_image_ref(ref)
+        if parsed is None:
+            rows.append((name, "unknown", f"{ref or comp.get('image_id', '')}: pinned by digest or image id"))
+            continue
+        key = _registry_ref_key(parsed)
+        if key in lookup["errors"]:
+            rows.append((name, "error", f"{ref}: {lookup['errors'][key]}"))
+        elif not local:
+            rows.append((name, "unknown", f"{ref}: no registry digest locally (built or loaded image)"))
+        elif lookup["digests"].get(key) == local:
+            rows.append((name, "current", ref))
+        else:
+            rows.append((name, "changed", f"{ref} {_short(local, 19)} -> {_short(lookup['digests'].get(key, ''), 19)}"))
+    return rows
+
+
+def _run_outdated(targets: List[Tuple[str, Dict]], jobs: int, cache_ttl: float, quiet: bool) -> int:
+    from .fleet import _thread_pool, _with_parent_output
+
+    def snapshot(target: Tuple[str, Dict]) -> Dict[str, Any]:
+        with _span("snapshot", service=target[0]):
+            return _docker_compose_version_snapshot(target[1])
+
+    with _thread_pool(max(1, min(jobs, len(targets)))) as pool:
+        snaps = dict(zip([key for key, _ in targets], pool.map(_with_parent_output(snapshot), targets)))
+
+    keys: Dict[str, Tuple[str, str, str]] = {}
+    for snap in snaps.values():
+        for comp in (snap.get("components", {}) or {}).values():
+            parsed = _parse_image_ref(str(comp.get("image_ref", "")))
+            if parsed is not None and comp.get("digest"):
+                keys.setdefault(_registry_ref_key(parsed), parsed)
+    lookup = _registry_digests(keys, jobs, cache_ttl)
+
+    rc = 0
+    outdated, unknown = [], []
+    for key, snap in snaps.items():
+        if not snap.get("ok"):
+            print(f"[ERROR] {key}: {snap.get('error', 'snapshot failed')}", file=sys.stderr)
+            rc = 1
+            continue
+        rows = _outdated_components(snap.get("components", {}) or {}, lookup)
+        changed = [r for r in rows if r[1] == "changed"]
+        failed = [r for r in rows if r[1] == "error"]
+        if changed:
+            outdated.append(key)
+        elif failed:
+            unknown.append(key)
+        if failed:
+            rc = 1
+        if quiet:
+            continue
+        if changed:
+            print(f"[OUTDATED] {key}: {len(changed)} of {len(rows)} components would change")
+        elif failed:
+            print(f"[UNKNOWN] {key}: registry lookup failed for {len(failed)} of {len(rows)} components")
+        else:
+            print(f"[UP_TO_DATE] {key}: {len(rows)} components")
+        for name, state, detail in rows:
+            if state != "current":
+                print(f"  - {name}: {state}: {detail}")
+
+    if quiet:
+        for key in outdated:
+            print(key)
+        return rc
+    print(f"[OUTDATED_SUMMARY] {len(outdated)} of {len(snaps)} services would change" + (f": {', '.join(outdated)}" if outdated else ""))
+    if unknown:
+        print(f"  unknown: {', '.join(unknown)}")
+    print(f"  registry: {len(keys)} refs, {lookup['cached']} cached, {lookup['connections']} connections")
+    return rc
@@ -0,0 +1,198 @@
+"""Health probes (http, tcp and command) of services."""
+from __future__ import annotations
+
+import time
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any, Dict, List, Optional, Tuple
+
+PROBE_SCHEMES = ["http", "https", "tcp", "unix"]
+DEFAULT_PROBE_TIMEOUT = 5.0
+# Upper bound on probes in flight at once, to stay well below the open-file limit.
+PROBE_CONCURRENCY = 256
+
+
+def _parse_probe_spec(spec: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """Parse `[NAME=]TARGET [status=N] [timeout=S] [retries=N] [path=/x] [insecure=1]`.
+
+    TARGET is http(s)://host[:port]/path, tcp://host:port or unix:///path/to.sock; `NAME=` with
+    no target removes that probe. Returns (name, probe or None); raises ValueError when malformed.
+    """
+    tokens = spec.split()
+    if not tokens:
+        raise ValueError("empty probe")
+    head, options = tokens[0], tokens[1:]
+    name, sep, target = head.partition("=")
+    if not sep or "://" in name:
+        name, target = head, head
+    name = name.strip()
+    if not target:
+        return name, None
+
+    from urllib.parse import urlsplit
+
+    parts = urlsplit(target)
+    if parts.scheme not in PROBE_SCHEMES:
+        raise ValueError(f"unsupported probe scheme '{parts.scheme}' (use {', '.join(PROBE_SCHEMES)})")
+    if parts.scheme == "unix":
+        if not parts.path:
+            raise ValueError("unix probe needs a socket path, e.g. unix:///run/app.sock")
+    elif not parts.hostname:
+        raise ValueError("probe target has no host")
+    elif parts.scheme == "tcp" and parts.port is None:
+        raise ValueError("tcp probe needs a port, e.g. tcp://127.0.0.1:5432")
+
+    probe: Dict[str, Any] = {"name": name, "target": target}
+    for option in options:
+        key, _, value = option.partition("=")
+        if key in {"status", "retries"}:
+            probe[key] = int(value)
+        elif key == "timeout":
+            probe[key] = float(value)
+        elif key == "path":
+            probe[key] = value
+        elif key == "insecure":
+            probe[key] = value.lower() in {"1", "true", "yes"}
+        else:
+            raise ValueError(f"unknown probe option '{key}'")
+    if probe.get("retries", 0) < 0 or probe.get("timeout", 1.0) <= 0:
+        raise ValueError("retries must be >= 0 and timeout > 0")
+    return name, probe
+
+
+def _service_probes(entry: Dict) -> List[Dict[str, Any]]:
+    probes = entry.get("probes", [])
+    return [p for p in probes if isinstance(p, dict) and p.get("target")] if isinstance(probes, list) else []
+
+
+async def _probe_once(probe: Dict[str, Any]) -> Tuple[bool, str]:
+    """One connection attempt; returns (ok, detail). The caller bounds it with asyncio.wait_for."""
+    import asyncio
+    from urllib.parse import urlsplit
+
+    parts = urlsplit(probe["target"])
+    if parts.scheme == "unix":
+        reader, writer = await asyncio.open_unix_connection(parts.path)
+        http_path = probe.get("path")
+        host = "localhost"
+    else:
+        ssl_ctx = None
+        if parts.scheme == "https":
+            import ssl
+
+            ssl_ctx = ssl.create_default_context()
+            if probe.get("insecure"):
+                ssl_ctx.check_hostname = False
+                ssl_ctx.verify_mode = ssl.CERT_NONE
+        default_port = {"http": 80, "https": 443}.get(parts.scheme)
+        reader, writer = await asyncio.open_connection(parts.hostname, parts.port or default_port, ssl=ssl_ctx)
+        http_path = None if parts.scheme == "tcp" else (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        host = parts.netloc.rpartition("@")[2]
+    try:
+        if http_path is None:
+            return True, "connected"
+        request = f"GET {http_path} HTTP/1.1\r\nHost: {host}\r\nUser-Agent: servicectl\r\nConnection: close\r\n\r\n"
+        writer.write(request.encode("latin-1"))
+        await writer.drain()
+        status_line = (await reader.readline()).decode("latin-1").strip()
+        fields = status_line.split(None, 2)
+        if len(fields) < 2 or not fields[0].startswith("HTTP/") or not fields[1].isdigit():
+            return False, f"bad response {status_line[:60]!r}"
+        expected = int(probe.get("status", 200))
+        return int(fields[1]) == expected, f"HTTP {fields[1]}" + ("" if int(fields[1]) == expected else f" (expected {expected})")
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+
+
+async def _probe_sample(probe: Dict[str, Any], timeout: float, limit: Any) -> Tuple[bool, float, str]:
+    """One sample with retries; latency is that of the final attempt."""
+    import asyncio
+
+    attempts = 1 + int(probe.get("retries", 0) or 0)
+    for attempt in range(attempts):
+        async with limit:
+            t0 = time.perf_counter()
+            try:
+                ok, detail = await asyncio.wait_for(_probe_once(probe), timeout)
+            except asyncio.TimeoutError:
+                ok, detail = False, f"timeout after {timeout:g}s"
+            except (OSError, ValueError) as e:
+                ok, detail = False, str(e) or e.__class__.__name__
+            latency = time.perf_counter() - t0
+        if ok or attempt == attempts - 1:
+            return ok, latency, detail
+    return False, 0.0, "no attempt"
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+async def _probe_all(jobs: List[Tuple[str, Dict[str, Any], float]], samples: int) -> List[List[Tuple[bool, float, str]]]:
+    import asyncio
+
+    limit = asyncio.Semaphore(PROBE_CONCURRENCY)
+
+    async def run(probe: Dict[str, Any], timeout: float) -> List[Tuple[bool, float, str]]:
+        return [await _probe_sample(probe, timeout, limit) for _ in range(samples)]
+
+    return list(await asyncio.gather(*(run(probe, timeout) for _, probe, timeout in jobs)))
+
+
+def _probe_jobs(targets: List[Tuple[str, Dict]]) -> List[Tuple[str, Dict[str, Any], float]]:
+    jobs: List[Tuple[str, Dict[str, Any], float]] = []
+    for key, entry in targets:
+        override = (entry.get("timeouts") or {}).get("health")
+        for probe in _service_probes(entry):
+            jobs.append((key, probe, float(override or probe.get("timeout") or DEFAULT_PROBE_TIMEOUT)))
+    return jobs
+
+
+def _run_probe_health(targets: List[Tuple[str, Dict]], samples: int, dry_run: bool) -> int:
+    """Check every declared probe of the targets concurrently on one event loop."""
+    import asyncio
+
+    samples = max(1, samples)
+    jobs = _probe_jobs(targets)
+
+    if dry_run:
+        for key, probe, timeout in jobs:
+            print(f"[DRY-RUN] probe {key}/{probe['name']}: {probe['target']} (timeout {timeout:g}s, retries {probe.get('retries', 0)})", flush=True)
+        return 0
+
+    started = time.monotonic()
+    results = asyncio.run(_probe_all(jobs, samples))
+    elapsed = time.monotonic() - started
+
+    failed = 0
+    current = None
+    for (key, probe, _), sample_results in zip(jobs, results):
+        if key != current:
+            print(f"[HEALTH] {key}", flush=True)
+            current = key
+        ok_count = sum(1 for ok, _, _ in sample_results if ok)
+        latencies = sorted(latency * 1000 for _, latency, _ in sample_results)
+        last_error = next((detail for ok, _, detail in reversed(sample_results) if not ok), "")
+        status = "ok" if ok_count == len(sample_results) else "failed"
+        if status != "ok":
+            failed += 1
+        if samples == 1:
+            line = f"- {probe['name']}: {status} {sample_results[0][2]} {latencies[0]:.1f}ms"
+        else:
+            line = f"- {probe['name']}: {status} {ok_count}/{samples}, p50 {_percentile(latencies, 50):.1f}ms, p95 {_percentile(latencies, 95):.1f}ms"
+            if last_error:
+                line += f" (last error: {last_error})"
+        print(line, flush=True)
+
+    services = len({key for key, _, _ in jobs})
+    print(f"[HEALTH_SUMMARY] {len(jobs)} probes across {services} services in {elapsed:.2f}s: {len(jobs) - failed} ok, {failed} failed", flush=True)
+    return 1 if failed else 0
@@ -0,0 +1,480 @@
+"""The services registry (services.json or its sharded form) and service-name resolution."""
+from __future__ import annotations
+
+import json
+import marshal
+import os
+import sys
+from contextlib import contextmanager
+
+from .common import BASE_DIR, CACHE_DIR, _dump_json, _safe_json_loads, _write_atomic
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any, Dict, List, Optional, Tuple
+
+CONFIG_PATH = os.path.join(BASE_DIR, "data", "services.json")
+# Sharded registry (after `migrate`): one file per service plus an index whose generation
+# changes on every write. When the index exists it takes precedence over CONFIG_PATH.
+REGISTRY_DIR = os.path.join(BASE_DIR, "data", "services.d")
+REGISTRY_INDEX_NAME = "index.json"
+REGISTRY_LOCK_NAME = ".lock"
+REGISTRY_SHARD_SUFFIX = ".service.json"
+REGISTRY_FORMAT_VERSION = 1
+# Attempts of an optimistic read-modify-write (and of a consistent lock-free shard read).
+REGISTRY_RETRIES = 10
+INDEX_CACHE_PATH = os.path.join(CACHE_DIR, "resolve-index.marshal")
+INDEX_CACHE_VERSION = 1
+REGISTRY_SNAPSHOT_PATH = os.path.join(CACHE_DIR, "registry.marshal")
+REGISTRY_SNAPSHOT_VERSION = 2
+
+# Identity and on-disk stamp of the services dict most recently read by _load_config,
+# so the resolution index can be reused from INDEX_CACHE_PATH for that exact registry.
+_LOADED_REGISTRY: Dict[str, Any] = {"services": None, "stamp": None}
+_INDEX_MEMO: Dict[str, Any] = {"services": None, "stamp": None, "index": None}
+# Only the serve daemon keeps the parsed registry between calls; it never mutates it.
+_REGISTRY_MEMO: Dict[str, Any] = {"enabled": False, "key": None, "data": None}
+
+
+def _registry_stamp(raw: bytes, st: os.stat_result) -> Tuple[int, int, str]:
+    import hashlib
+
+    return (st.st_mtime_ns, st.st_size, hashlib.sha256(raw).hexdigest())
+
+
+def _read_registry_snapshot() -> Optional[Dict[str, Any]]:
+    try:
+        with open(REGISTRY_SNAPSHOT_PATH, "rb") as f:
+            snap = marshal.loads(f.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if not isinstance(snap, dict) or snap.get("version") != REGISTRY_SNAPSHOT_VERSION:
+        return None
+    return snap
+
+
+def _write_registry_snapshot(stamp: Tuple[int, int, str], data: Dict, source: str) -> None:
+    """Atomically replace the marshal copy of the registry that read-only commands load instead of JSON."""
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp_path = f"{REGISTRY_SNAPSHOT_PATH}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            marshal.dump({"version": REGISTRY_SNAPSHOT_VERSION, "source": source, "stamp": stamp, "data": data}, f)
+        os.replace(tmp_path, REGISTRY_SNAPSHOT_PATH)
+    except (OSError, ValueError):
+        pass
+
+
+def _publish_registry_snapshot(lock_path: str, raw: bytes, read: Any, data: Dict, source: str) -> None:
+    """Write the snapshot of data parsed from raw if, under the writers' lock, read() still returns raw.
+
+    Writers replace or drop the snapshot while holding that lock, so a snapshot written here
+    cannot outlive the registry it was read from, even where mtimes are too coarse to tell two
+    writes apart. The lock is only tried: while a writer holds it, no snapshot is written.
+    """
+    try:
+        with _registry_lock(lock_path, wait=False) as locked:
+            if locked:
+                current, stamp = read()
+                if current == raw:
+                    _write_registry_snapshot(stamp, data, source)
+    except OSError:
+        pass
+
+
+def _registry_index_path() -> str:
+    return os.path.join(REGISTRY_DIR, REGISTRY_INDEX_NAME)
+
+
+def _sharded_registry() -> bool:
+    return os.path.exists(_registry_index_path())
+
+
+def _registry_stat() -> Optional[Tuple[int, int, int]]:
+    """(mtime_ns, size, inode) of the active registry, or None when there is none yet.
+
+    For the sharded layout the directory mtime counts too, so replacing a shard is noticed
+    even if the index were left alone.
+    """
+    try:
+        if not _sharded_registry():
+            st = os.stat(CONFIG_PATH)
+            return (st.st_mtime_ns, st.st_size, st.st_ino)
+        st = os.stat(_registry_index_path())
+        return (max(st.st_mtime_ns, os.stat(REGISTRY_DIR).st_mtime_ns), st.st_size, st.st_ino)
+    except FileNotFoundError:
+        return None
+
+
+def _read_registry(st: Tuple[int, int, int]) -> Tuple[Dict, Tuple[int, int, str]]:
+    source = _registry_index_path() if _sharded_registry() else CONFIG_PATH
+    snap = _read_registry_snapshot()
+    if snap is not None and snap.get("source") != source:
+        snap = None
+    if snap is not None and tuple(snap["stamp"][:2]) == st[:2]:
+        return snap["data"], tuple(snap["stamp"])
+    if source != CONFIG_PATH:
+        return _read_shards()
+
+    raw, stamp = _read_config_file()
+    if snap is not None and snap["stamp"][2] == stamp[2]:
+        data = snap["data"]
+    else:
+        data = json.loads(raw.decode("utf-8"))
+    _publish_registry_snapshot(CONFIG_PATH + REGISTRY_LOCK_NAME, raw, _read_config_file, data, CONFIG_PATH)
+    return data, stamp
+
+
+def _read_config_file() -> Tuple[bytes, Tuple[int, int, str]]:
+    with open(CONFIG_PATH, "rb") as f:
+        raw = f.read()
+        st = os.fstat(f.fileno())
+    return raw, _registry_stamp(raw, st)
+
+
+def _shard_path(key: str) -> str:
+    from urllib.parse import quote
+
+    return os.path.join(REGISTRY_DIR, quote(key, safe="") + REGISTRY_SHARD_SUFFIX)
+
+
+def _read_index() -> Tuple[bytes, Tuple[int, int, str]]:
+    with open(_registry_index_path(), "rb") as f:
+        raw = f.read()
+        st = os.fstat(f.fileno())
+    mtime = max(st.st_mtime_ns, os.stat(REGISTRY_DIR).st_mtime_ns)
+    return raw, (mtime, st.st_size, _registry_stamp(raw, st)[2])
+
+
+def _read_shard(path: str) -> Optional[Dict]:
+    try:
+        with open(path, "rb") as f:
+            return json.loads(f.read().decode("utf-8"))
+    except FileNotFoundError:
+        return None
+
+
+def _read_shards() -> Tuple[Dict, Tuple[int, int, str]]:
+    """Read every shard without locking: retry until the index generation is the same before and after.
+
+    Unlike services.json, an unchanged index hash proves nothing about the shards, so a
+    snapshot is only reused on an exact (mtime, size) match in _read_registry. That is safe
+    because the snapshot is written under the shard lock, only while the generation still
+    matches, and every shard write drops it under the same lock.
+    """
+    from urllib.parse import unquote
+
+    for _ in range(REGISTRY_RETRIES):
+        raw, stamp = _read_index()
+        services: Dict[str, Dict] = {}
+        for name in sorted(os.listdir(REGISTRY_DIR)):
+            if name.endswith(REGISTRY_SHARD_SUFFIX):
+                entry = _read_shard(os.path.join(REGISTRY_DIR, name))
+                if isinstance(entry, dict):
+                    services[unquote(name[: -len(REGISTRY_SHARD_SUFFIX)])] = entry
+        data = {"services": dict(sorted(services.items()))}
+        if _read_index()[0] == raw:
+            break
+    _publish_registry_snapshot(os.path.join(REGISTRY_DIR, REGISTRY_LOCK_NAME), raw, _read_index, data, _registry_index_path())
+    return data, stamp
+
+
+def _load_config() -> Dict:
+    memo_key = _registry_stat()
+    if memo_key is None:
+        return {"services": {}}
+    if _REGISTRY_MEMO["enabled"] and _REGISTRY_MEMO["key"] == memo_key:
+        return _REGISTRY_MEMO["data"]
+    data, stamp = _read_registry(memo_key)
+    if not isinstance(data, dict):
+        data = {}
+    if "services" not in data or not isinstance(data["services"], dict):
+        data["services"] = {}
+    _LOADED_REGISTRY["services"] = data["services"]
+    _LOADED_REGISTRY["stamp"] = stamp
+    if _REGISTRY_MEMO["enabled"]:
+        _REGISTRY_MEMO["key"] = memo_key
+        _REGISTRY_MEMO["data"] = data
+    return data
+
+
+@contextmanager
+def _registry_lock(path: str, wait: bool = True) -> Any:
+    """Exclusive advisory lock serializing registry writers; yields whether it was taken.
+
+    Readers only try it (wait=False) to write the registry snapshot; they never wait for it.
+    """
+    import fcntl
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a") as f:
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | (0 if wait else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _save_config(data: Dict) -> None:
+    os.makedirs(os.path.dirname(CONFIG_PATH), exist_ok=True)
+    raw = _dump_json(data)
+    _write_atomic(CONFIG_PATH, raw)
+    stamp = _registry_stamp(raw, os.stat(CONFIG_PATH))
+    _write_registry_snapshot(stamp, data, CONFIG_PATH)
+    if _LOADED_REGISTRY["services"] is data.get("services"):
+        # The loaded registry was edited in place; its new stamp keys the resolve index.
+        _LOADED_REGISTRY["stamp"] = stamp
+
+
+def _store_service(key: str, entry: Optional[Dict], expected: Optional[Dict]) -> bool:
+    """Write (or, with entry None, delete) one service if it still equals `expected` as read earlier.
+
+    Returns False when another writer changed it in the meantime; the caller re-reads and retries.
+    Sharded registries rewrite only that service's file and the small index; the single-file
+    registry is rewritten whole, under the same kind of lock.
+    """
+    if not _sharded_registry():
+        with _registry_lock(CONFIG_PATH + REGISTRY_LOCK_NAME):
+            if _sharded_registry():
+                return False
+            data = _load_config()
+            services = data["services"]
+            if services.get(key) != expected:
+                return False
+            if entry is None:
+                services.pop(key, None)
+            else:
+                services[key] = entry
+            _save_config(data)
+        return True
+
+    path = _shard_path(key)
+    with _registry_lock(os.path.join(REGISTRY_DIR, REGISTRY_LOCK_NAME)):
+        if _read_shard(path) != expected:
+            return False
+        raw, _ = _read_index()
+        index = _safe_json_loads(raw.decode("utf-8"), {})
+        generation = int(index.get("generation", 0)) if isinstance(index, dict) else 0
+        if entry is None:
+            os.unlink(path)
+        else:
+            _write_atomic(path, _dump_json(entry))
+        _write_atomic(_registry_index_path(), _dump_json({"format": REGISTRY_FORMAT_VERSION, "generation": generation + 1}))
+        # The new index stat already makes the snapshot stale; dropping it also covers coarse mtimes.
+        _drop_registry_snapshot()
+    return True
+
+
+def _drop_registry_snapshot() -> None:
+    try:
+        os.unlink(REGISTRY_SNAPSHOT_PATH)
+    except FileNotFoundError:
+        pass
+
+
+def _load_service(key: str) -> Optional[Dict]:
+    """One service as stored, without aliases; a sharded registry reads only that service's file."""
+    if _sharded_registry():
+        entry = _read_shard(_shard_path(key))
+        return entry if isinstance(entry, dict) else None
+    return _load_config()["services"].get(key)
+
+
+def _migrate_registry(dry_run: bool) -> int:
+    if _sharded_registry():
+        print(f"[MIGRATE] registry is already sharded: {REGISTRY_DIR}", flush=True)
+        return 0
+    if not os.path.exists(CONFIG_PATH):
+        print(f"[ERROR] no registry to migrate: {CONFIG_PATH}", file=sys.stderr)
+        return 1
+
+    with _registry_lock(CONFIG_PATH + REGISTRY_LOCK_NAME):
+        services = _load_config()["services"]
+        print(f"[MIGRATE] {len(services)} services: {CONFIG_PATH} -> {REGISTRY_DIR}", flush=True)
+        if dry_run:
+            return 0
+        if os.path.exists(REGISTRY_DIR) and os.listdir(REGISTRY_DIR):
+            print(f"[ERROR] {REGISTRY_DIR} exists and is not empty", file=sys.stderr)
+            return 1
+        # Build the whole directory next to the target, then rename it into place.
+        staging = f"{REGISTRY_DIR}.{os.getpid()}.tmp"
+        os.makedirs(staging)
+        for key, entry in services.items():
+            with open(os.path.join(staging, os.path.basename(_shard_path(key))), "wb") as f:
+                f.write(_dump_json(entry))
+        with open(os.path.join(staging, REGISTRY_INDEX_NAME), "wb") as f:
+            f.write(_dump_json({"format": REGISTRY_FORMAT_VERSION, "generation": 1}))
+        if os.path.exists(REGISTRY_DIR):
+            os.rmdir(REGISTRY_DIR)
+        os.rename(staging, REGISTRY_DIR)
+        backup = CONFIG_PATH + ".migrated"
+        os.replace(CONFIG_PATH, backup)
+    print(f"[OK] registry migrated; the single-file copy was kept as {backup}", flush=True)
+    return 0
+
+
+def _normalize_service_token(text: str) -> str:
+    s = (text or "").strip().lower()
+    for token in ["服务", "服务器", "项目", "更新", "重启", "一下", "下", "的"]:
+        s = s.replace(token, "")
+    s = "".join(ch for ch in s if ch.isalnum())
+    return s
+
+
+class _ServiceIndex:
+    """Precomputed lookup tables for _resolve_service.
+
+    Resolution order matches the original linear scan: exact key, exact alias,
+    exact normalized token, then a unique substring match over normalized tokens.
+    Substring candidates come from an n-gram index (n <= 3) and are verified
+    against the stored tokens, so only services sharing every trigram are checked.
+    """
+
+    NGRAM = 3
+
+    def __init__(self, services: Dict) -> None:
+        self.keys: List[str] = list(services.keys())
+        self.aliases: Dict[str, int] = {}
+        self.normalized: Dict[str, int] = {}
+        self.tokens: List[Tuple[str, ...]] = []
+        self.grams: Dict[str, List[int]] = {}
+
+        for ordinal, key in enumerate(self.keys):
+            entry = services[key]
+            tokens = {key.lower()}
+            display = str(entry.get("display_name", "")).strip().lower()
+            if display:
+                tokens.add(display)
+            for a in entry.get("aliases", []):
+                t = str(a).strip().lower()
+                if t:
+                    tokens.add(t)
+                    self.aliases.setdefault(t, ordinal)
+
+            norm_tokens = tuple(sorted({_normalize_service_token(t) for t in tokens} - {""}))
+            self.tokens.append(norm_tokens)
+
+            grams = set()
+            for nt in norm_tokens:
+                self.normalized.setdefault(nt, ordinal)
+                for n in range(1, self.NGRAM + 1):
+                    for i in range(len(nt) - n + 1):
+                        grams.add(nt[i:i + n])
+            for g in grams:
+                self.grams.setdefault(g, []).append(ordinal)
+
+    def to_state(self) -> Dict[str, Any]:
+        return {"keys": self.keys, "aliases": self.aliases, "normalized": self.normalized, "tokens": self.tokens, "grams": self.grams}
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> "_ServiceIndex":
+        index = cls.__new__(cls)
+        index.keys = state["keys"]
+        index.aliases = state["aliases"]
+        index.normalized = state["normalized"]
+        index.tokens = state["tokens"]
+        index.grams = state["grams"]
+        return index
+
+    def _substring_matches(self, needle: str) -> List[int]:
+        if len(needle) <= self.NGRAM:
+            return self.grams.get(needle, [])
+
+        postings = []
+        for i in range(len(needle) - self.NGRAM + 1):
+            posting = self.grams.get(needle[i:i + self.NGRAM])
+            if not posting:
+                return []
+            postings.append(posting)
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                return []
+        return [o for o in sorted(candidates) if any(needle in nt for nt in self.tokens[o])]
+
+    def resolve(self, services: Dict, name_or_alias: str) -> Tuple[str, Dict]:
+        needle_raw = (name_or_alias or "").strip().lower()
+        needle_norm = _normalize_service_token(needle_raw)
+        if not needle_raw:
+            raise KeyError("service name is empty")
+
+        if needle_raw in services:
+            return needle_raw, services[needle_raw]
+
+        ordinal = self.aliases.get(needle_raw)
+        if ordinal is None and needle_norm:
+            ordinal = self.normalized.get(needle_norm)
+        if ordinal is not None:
+            key = self.keys[ordinal]
+            return key, services[key]
+
+        candidates = self._substring_matches(needle_norm) if needle_norm else []
+        if len(candidates) == 1:
+            key = self.keys[candidates[0]]
+            return key, services[key]
+
+        if len(candidates) > 1:
+            names = ", ".join(self.keys[o] for o in candidates)
+            raise KeyError(f"service is ambiguous: {name_or_alias} -> {names}")
+
+        raise KeyError(f"service not found: {name_or_alias}")
+
+
+def _read_index_cache(stamp: Tuple[int, int, str]) -> Optional[_ServiceIndex]:
+    try:
+        with open(INDEX_CACHE_PATH, "rb") as f:
+            cached = marshal.loads(f.read())
+    except Exception:
+        return None
+    if not isinstance(cached, dict) or cached.get("version") != INDEX_CACHE_VERSION:
+        return None
+    # A touched-but-identical registry (same hash, new mtime) still reuses the index.
+    if tuple(cached.get("stamp", ()))[2:] != stamp[2:]:
+        return None
+    try:
+        return _ServiceIndex.from_state(cached["index"])
+    except (KeyError, TypeError):
+        return None
+
+
+def _write_index_cache(stamp: Tuple[int, int, str], index: _ServiceIndex) -> None:
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp_path = f"{INDEX_CACHE_PATH}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            marshal.dump({"version": INDEX_CACHE_VERSION, "stamp": stamp, "index": index.to_state()}, f)
+        os.replace(tmp_path, INDEX_CACHE_PATH)
+    except OSError:
+        pass
+
+
+def _service_index(services: Dict) -> _ServiceIndex:
+    """Index of `services`, memoized per registry stamp; dicts not loaded from disk are indexed afresh."""
+    stamp = _LOADED_REGISTRY["stamp"] if _LOADED_REGISTRY["services"] is services else None
+    if stamp is not None and _INDEX_MEMO["services"] is services and _INDEX_MEMO["stamp"] == stamp:
+        return _INDEX_MEMO["index"]
+
+    index = None
+    if stamp is not None:
+        index = _read_index_cache(stamp)
+        if index is not None and index.keys != list(services.keys()):
+            index = None
+    if index is None:
+        index = _ServiceIndex(services)
+        if stamp is not None:
+            _write_index_cache(stamp, index)
+
+    _INDEX_MEMO["services"] = services
+    _INDEX_MEMO["stamp"] = stamp
+    _INDEX_MEMO["index"] = index
+    return index
+
+
+def _resolve_service(services: Dict, name_or_alias: str) -> Tuple[str, Dict]:
+    return _service_index(services).resolve(services, name_or_alias)
@@ -0,0 +1,120 @@
+"""Rolling services back to the images of an earlier recorded deployment."""
+from __future__ import annotations
+
+import os
+import sys
+import time
+
+from .actions import _capture_version, _print_version_report
+from .common import HISTORY_PATH, _format_argv, _shell_quote, _short, _span
+from .history import _history_store, _record_history
+from .runner import _build_runner, _run_command, _run_shell
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any, Dict, List, Optional
+
+# Deployments searched for the version to roll back to.
+ROLLBACK_HISTORY_DEPTH = 50
+
+
+def _rollback_plan(current: Dict[str, Any], target: Dict[str, Any]) -> List[Dict[str, str]]:
+    """Components whose running image differs from the one in `target` (both version snapshots)."""
+    current_comps = ((current.get("runtime_snapshot") or {}).get("components") or {}) if current else {}
+    target_comps = ((target.get("runtime_snapshot") or {}).get("components") or {}) if target else {}
+    plan = []
+    for name, comp in sorted(target_comps.items()):
+        running = current_comps.get(name)
+        if running is None or not comp.get("image_id") or running.get("image_id") == comp.get("image_id"):
+            continue
+        plan.append({"component": name, "image_ref": str(running.get("image_ref") or comp.get("image_ref") or ""),
+                     "from": str(running.get("image_id", "")), "to": str(comp["image_id"])})
+    return plan
+
+
+def _run_rollback(entry: Dict, plan: List[Dict[str, str]], dry_run: bool = False) -> int:
+    """Point each component's image tag back at its previous local image and recreate only those containers.
+
+    Nothing is pulled (`--pull never`), and nothing changes unless every previous image is still
+    present locally and referenced by a tag (digest-pinned refs cannot be re-tagged).
+    """
+    pinned = [p["component"] for p in plan if "@" in p["image_ref"] or not p["image_ref"]]
+    if pinned:
+        print(f"[ERROR] cannot re-tag digest-pinned or untagged images: {', '.join(pinned)}; edit the compose file instead", file=sys.stderr, flush=True)
+        return 2
+
+    wanted = sorted({p["to"] for p in plan})
+    cp = _run_shell(entry, "docker image inspect --format '{{.Id}}' " + _format_argv(wanted))
+    present = {line.strip() for line in (cp.stdout or "").splitlines() if line.strip()}
+    missing = [p for p in plan if p["to"] not in present]
+    if missing:
+        detail = ", ".join(f"{p['component']} ({_short(p['to'].split(':')[-1])})" for p in missing)
+        print(f"[ERROR] previous images are no longer available locally: {detail}", file=sys.stderr, flush=True)
+        return 2
+
+    tags = {p["image_ref"]: p["to"] for p in plan}
+    commands = [f"docker tag {_shell_quote(image_id)} {_shell_quote(ref)}" for ref, image_id in sorted(tags.items())]
+    components = " ".join(_shell_quote(p["component"]) for p in plan)
+    commands.append(f"docker compose up -d --no-deps --pull never {components}")
+    for p in plan:
+        print(f"[ROLLBACK] {p['component']}: {_short(p['from'].split(':')[-1])} -> {_short(p['to'].split(':')[-1])} ({p['image_ref']})", flush=True)
+    if dry_run:
+        for cmd in commands:
+            print("[DRY-RUN]", _format_argv(_build_runner(entry, cmd)), flush=True)
+        return 0
+    return _run_command(entry, " && ".join(commands), "rollback", phase="retag")
+
+
+def _auto_rollback(key: str, entry: Dict, before: Dict[str, Any], after: Dict[str, Any], report: bool) -> Dict[str, Any]:
+    print("[AUTO_ROLLBACK] update or post-check failed; restoring the previous images", flush=True)
+    started_at = time.time()
+    t0 = time.monotonic()
+    with _span("rollback") as span:
+        plan = _rollback_plan(after, before)
+        rc = span["rc"] = _run_rollback(entry, plan) if plan else 0
+        restored = _capture_version(entry) if plan else after
+        result = {"rc": rc, "before": after, "after": restored, "note": "automatic rollback"}
+        _record_history(key, entry, "rollback", started_at, result)
+    rollback = {"rc": rc, "duration": time.monotonic() - t0, "components": [p["component"] for p in plan]}
+    if report:
+        _print_version_report(key, after, restored, "rollback", rc, note=result["note"], duration=rollback["duration"])
+    return rollback
+
+
+def _rollback_service(key: str, entry: Dict, to: Optional[int], dry_run: bool) -> int:
+    store = _history_store() if os.path.exists(HISTORY_PATH) else None
+    deployments = store.deployments(key, ROLLBACK_HISTORY_DEPTH) if store is not None else []
+    started_at = time.time()
+    t0 = time.monotonic()
+    current = _capture_version(entry, record=not dry_run)
+    if not (current.get("runtime_snapshot") or {}).get("ok"):
+        print(f"[ERROR] {(current.get('runtime_snapshot') or {}).get('error', 'version snapshot failed')}", file=sys.stderr)
+        return 1
+
+    if to is not None:
+        chosen = next((d for d in deployments if d["id"] == to), None)
+        if chosen is None:
+            print(f"[ERROR] deployment #{to} not found in the last {ROLLBACK_HISTORY_DEPTH} records of {key}", file=sys.stderr)
+            return 1
+    else:
+        # The newest update/restart that started from images other than the ones running now.
+        chosen = next((d for d in deployments if d["action"] != "rollback" and _rollback_plan(current, d["before"])), None)
+        if chosen is None:
+            print(f"[ROLLBACK] no recorded version of {key} differs from the running images; nothing to roll back", flush=True)
+            return 0
+
+    plan = _rollback_plan(current, chosen["before"])
+    when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(chosen["started_at"]))
+    print(f"[ROLLBACK] restoring the images in use before #{chosen['id']} ({chosen['action']} at {when})", flush=True)
+    if not plan:
+        print("[ROLLBACK] running images already match; nothing to roll back", flush=True)
+        return 0
+
+    rc = _run_rollback(entry, plan, dry_run=dry_run)
+    if dry_run:
+        return rc
+    restored = _capture_version(entry)
+    result = {"rc": rc, "before": current, "after": restored, "note": f"target: images in use before #{chosen['id']}"}
+    _record_history(key, entry, "rollback", started_at, result)
+    _print_version_report(key, current, restored, "rollback", rc, note=result["note"], duration=time.monotonic() - t0)
+    return rc
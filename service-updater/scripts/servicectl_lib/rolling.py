@@ -0,0 +1,189 @@
+"""Rolling restarts and updates that keep a minimum of replicas available."""
+from __future__ import annotations
+
+import sys
+import time
+
+from .actions import _precheck
+from .common import COMPOSE_PULL_CMD, DEFAULT_TIMEOUTS, _format_argv, _shell_quote, _short, _span
+from .compose import (
+    _compose_config, _compose_container_ids_cli, _compose_records, _is_default_compose_update, _local_image_ids,
+)
+from .runner import _run_command, _timeout_for
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any, Dict, List, Optional, Tuple
+
+    from .compose import _ContainerRecord
+
+ROLLING_POLL_SECONDS = 1.0
+
+
+def _min_available_count(spec: Optional[str], replicas: int) -> int:
+    if not spec:
+        return 0
+    if spec.endswith("%"):
+        return -(-replicas * int(spec[:-1]) // 100)
+    return int(spec)
+
+
+def _await_ready(key: str, entry: Dict, ids: List[str], deadline: float) -> Optional[str]:
+    """Wait until the containers run (and pass their Docker healthcheck), then the service's probes.
+
+    Returns None when ready, else the reason. An unhealthy or exited container fails at once.
+    """
+    import asyncio
+    from .probes import _probe_all, _probe_jobs
+    from .watch import _inspect_states
+
+    while True:
+        error, states = _inspect_states(key, entry, ids)
+        if error is not None:
+            return error
+        missing = [i for i in ids if i not in states]
+        if missing:
+            return f"container {_short(missing[0])} disappeared"
+        broken = [s for s in states.values() if s.health == "unhealthy" or s.status in {"exited", "dead"}]
+        if broken:
+            return f"{broken[0].name} is {broken[0].label()}"
+        if all(s.settled() for s in states.values()):
+            break
+        if time.monotonic() >= deadline:
+            waiting = [s for s in states.values() if not s.settled()]
+            return f"not ready before the deadline: {waiting[0].name} is {waiting[0].label()}"
+        time.sleep(ROLLING_POLL_SECONDS)
+
+    jobs = _probe_jobs([(key, entry)])
+    while jobs:
+        results = asyncio.run(_probe_all(jobs, 1))
+        failing = [(probe, samples[0][2]) for (_, probe, _), samples in zip(jobs, results) if not samples[0][0]]
+        if not failing:
+            break
+        if time.monotonic() >= deadline:
+            probe, detail = failing[0]
+            return f"probe {probe['name']} failing before the deadline: {detail}"
+        time.sleep(ROLLING_POLL_SECONDS)
+    return None
+
+
+def _scale_blockers(svc: Dict[str, Any]) -> List[str]:
+    """Why a compose service cannot run extra replicas side by side (fixed name or host port)."""
+    reasons = []
+    if svc.get("container_name"):
+        reasons.append(f"container_name {svc['container_name']}")
+    for port in svc.get("ports", []) or []:
+        published = str(port.get("published", "") if isinstance(port, dict) else port).strip()
+        if published and published != "0":
+            reasons.append(f"host port {published}")
+    return reasons
+
+
+def _run_rolling(key: str, entry: Dict, action: str, batch_size: int, min_available: Optional[str]) -> int:
+    """Cycle the service's running containers in batches, gating each batch on readiness.
+
+    restart: `docker restart` each batch in place; capacity dips by the batch size, which is
+    capped so at least --min-available containers of every compose service keep running.
+    update: pull, then per batch scale the compose service up by the batch size (new image,
+    --no-recreate keeps the old containers), wait for the new containers, then remove the
+    same number of old ones, so capacity never drops. A batch that fails to become ready
+    aborts the rollout; in an update its new containers are removed again.
+    """
+    batch_size = max(1, batch_size)
+    if action == "update":
+        if not _is_default_compose_update(entry):
+            print("[ERROR] --rolling update needs the default compose update command", file=sys.stderr, flush=True)
+            return 2
+        rc = _precheck(entry, "update")
+        if rc != 0:
+            return rc
+        rc = _run_command(entry, COMPOSE_PULL_CMD, "update", phase="pull")
+        if rc != 0:
+            return rc
+
+    error, containers, _ = _compose_records(entry)
+    if error is None and not containers:
+        error = "no running containers"
+    config: Dict[str, Any] = {}
+    if error is None and action == "update":
+        error, config = _compose_config(entry)
+    if error is not None:
+        print(f"[ERROR] {error}", file=sys.stderr, flush=True)
+        return 2
+
+    groups: Dict[str, List[_ContainerRecord]] = {}
+    for c in sorted(containers, key=lambda c: c.container):
+        groups.setdefault(c.component, []).append(c)
+
+    plan: List[Tuple[str, List[_ContainerRecord], int, int]] = []
+    for component, members in sorted(groups.items()):
+        replicas = len(members)
+        floor = _min_available_count(min_available, replicas)
+        if action == "update":
+            svc = (config.get("services") or {}).get(component) or {}
+            blockers = _scale_blockers(svc)
+            if blockers:
+                print(f"[ERROR] {component} cannot run side-by-side replicas ({', '.join(blockers)}); use a regular update", file=sys.stderr, flush=True)
+                return 2
+            current = _local_image_ids(entry, [members[0].image_ref]).get(members[0].image_ref)
+            members = [m for m in members if not current or m.image_id != current]
+            if not members:
+                print(f"[ROLLING] {component}: {replicas} containers already on the pulled image", flush=True)
+                continue
+            size = batch_size
+        else:
+            size = min(batch_size, replicas - floor)
+        if floor > replicas or size < 1:
+            print(f"[ERROR] {component}: --min-available {min_available} leaves no room to cycle {replicas} containers", file=sys.stderr, flush=True)
+            return 2
+        plan.append((component, members, min(size, len(members)), floor))
+
+    started = time.monotonic()
+    cycled = 0
+    for component, members, size, floor in plan:
+        replicas = len(groups[component])
+        known = {c.container_id for c in groups[component]}
+        batches = [members[i:i + size] for i in range(0, len(members), size)]
+        lowest = replicas if action == "update" else replicas - size
+        print(f"[ROLLING] {component}: {len(members)} of {replicas} containers in {len(batches)} batches of {size} (min available {lowest}, floor {floor})", flush=True)
+        for number, batch in enumerate(batches, 1):
+            t0 = time.monotonic()
+            deadline = t0 + (_timeout_for(entry, "ready") or DEFAULT_TIMEOUTS["ready"])
+            old_ids = [c.container_id for c in batch]
+            if action == "restart":
+                rc = _run_command(entry, "docker restart " + _format_argv(old_ids), action, phase="restart")
+                ready_ids = old_ids
+            else:
+                scale = f"{component}={replicas + len(batch)}"
+                rc = _run_command(entry, f"docker compose up -d --no-deps --no-recreate --scale {_shell_quote(scale)} {_shell_quote(component)}", action, phase="scale")
+                _, ids = _compose_container_ids_cli(entry, component) if rc == 0 else (None, [])
+                ready_ids = [i for i in ids if i not in known]
+                known.update(ready_ids)
+            reason = None
+            if rc != 0:
+                reason = f"exit {rc}"
+            elif not ready_ids:
+                reason = "no new containers were created"
+            else:
+                with _span("ready", containers=len(ready_ids)) as span:
+                    reason = _await_ready(key, entry, ready_ids, deadline)
+                    span["rc"] = 0 if reason is None else 1
+
+            label = f"[ROLLING] {component}: batch {number}/{len(batches)} ({', '.join(c.container for c in batch)})"
+            if reason is not None:
+                print(f"{label} not ready: {reason}", flush=True)
+                if action == "update" and ready_ids:
+                    print(f"[ROLLING] removing the {len(ready_ids)} new containers of the failed batch; old containers keep serving", flush=True)
+                    _run_command(entry, "docker rm -f " + _format_argv(ready_ids), action, phase="remove")
+                print(f"[ROLLING_RESULT] aborted after {cycled} containers in {time.monotonic() - started:.2f}s", flush=True)
+                return 1
+            if action == "update":
+                rc = _run_command(entry, "docker rm -f " + _format_argv(old_ids), action, phase="remove")
+                if rc != 0:
+                    print(f"[ROLLING_RESULT] aborted: removing old containers failed (exit {rc})", flush=True)
+                    return rc
+            cycled += len(batch)
+            print(f"{label} ready in {time.monotonic() - t0:.2f}s", flush=True)
+
+    print(f"[ROLLING_RESULT] {action}: {cycled} containers cycled in {time.monotonic() - started:.2f}s", flush=True)
+    return 0
@@ -0,0 +1,530 @@
+"""Running service commands: shells, environments, bounded pipes, timeouts and persistent sessions."""
+from __future__ import annotations
+
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from .common import (
+    DEFAULT_SHELL, DEFAULT_TIMEOUTS, NATIVE_RUNTIMES, _VERBOSE, _count_spawn, _format_argv, _shell_quote, _span,
+)
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    import queue
+    import subprocess
+    from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+NATIVE_RESTART_CMDS = {"systemd": "systemctl restart --", "pm2": "pm2 restart"}
+DEFAULT_MINIMAL_PATH = "/opt/homebrew/bin:/opt/homebrew/sbin:/usr/local/bin:/usr/bin:/bin:/usr/sbin:/sbin"
+KILL_GRACE_SECONDS = 5.0
+ACTION_TAIL_LINES = 200
+# Longest piece of a command's output line held at once, and lines queued between its reader and consumer.
+PIPE_LINE_BYTES = 65536
+PIPE_QUEUE_LINES = 1024
+TIMEOUT_EXIT_CODE = 124
+# Merged environment per distinct services.json "env" block; os.environ is read once per block.
+_ENV_MEMO: Dict[str, Dict[str, str]] = {}
+# Persistent shells of services with "shell_session" enabled, alive while a _shell_sessions() scope is open.
+_SESSIONS: Dict[str, Any] = {"depth": 0, "shells": {}}
+_SESSIONS_LOCK = threading.Lock()
+
+
+def _shell_bin(entry: Dict) -> str:
+    return str(entry.get("shell") or DEFAULT_SHELL)
+
+
+def _shell_init(entry: Dict) -> str:
+    return (str(entry.get("shell_init") or ":").strip() or ":")
+
+
+def _service_env(entry: Dict) -> Dict[str, str]:
+    """Environment commands of this service run with; memoized, so callers must not modify it."""
+    user_env = entry.get("env", {})
+    memo_key = json.dumps(user_env, sort_keys=True, default=str)
+    cached = _ENV_MEMO.get(memo_key)
+    if cached is not None:
+        return cached
+
+    merged = dict(os.environ)
+    if isinstance(user_env, dict):
+        for k, v in user_env.items():
+            key = str(k).strip()
+            if key:
+                merged[key] = str(v)
+
+    current_path = str(merged.get("PATH", "")).strip()
+    if not current_path:
+        merged["PATH"] = DEFAULT_MINIMAL_PATH
+    else:
+        path_parts = [p for p in current_path.split(":") if p]
+        for p in DEFAULT_MINIMAL_PATH.split(":"):
+            if p and p not in path_parts:
+                path_parts.append(p)
+        merged["PATH"] = ":".join(path_parts)
+
+    _ENV_MEMO[memo_key] = merged
+    return merged
+
+
+def _service_workdir(entry: Dict) -> str:
+    workdir = os.path.expanduser(str(entry.get("path", "")).strip())
+    if not workdir:
+        raise ValueError("service path is empty")
+    return workdir
+
+
+def _build_runner(entry: Dict, cmd: str) -> List[str]:
+    workdir = _service_workdir(entry)
+    shell_init = _shell_init(entry)
+    if shell_init and shell_init != ":":
+        full_cmd = f"{shell_init}; cd {_shell_quote(workdir)} && {cmd}"
+    else:
+        full_cmd = f"cd {_shell_quote(workdir)} && {cmd}"
+    return [_shell_bin(entry), "-c", full_cmd]
+
+
+class _ExecResult:
+    """Outcome of _exec; stdout/stderr hold the captured (possibly tail-trimmed) output."""
+
+    def __init__(self, returncode: int, stdout: str, stderr: str, elapsed: float, timed_out: bool) -> None:
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.elapsed = elapsed
+        self.timed_out = timed_out
+
+
+class _CutLine(str):
+    """A piece of a line longer than PIPE_LINE_BYTES; the line continues in the next piece."""
+
+
+def _pipe_pieces(pipe: Any, limit: Optional[int]) -> Iterator[str]:
+    """Decoded lines of a pipe. With a limit, longer lines arrive as _CutLine pieces and carriage returns end a line."""
+    import codecs
+
+    decoder = codecs.getincrementaldecoder("utf-8")("replace")
+    for chunk in iter(lambda: pipe.readline(-1 if limit is None else limit), b""):
+        text = decoder.decode(chunk).rstrip("\r\n")
+        pieces = text.split("\r") if limit is not None and "\r" in text else [text]
+        for piece in pieces[:-1]:
+            if piece:
+                yield piece
+        if limit is not None and len(chunk) == limit and not chunk.endswith(b"\n"):
+            yield _CutLine(pieces[-1])
+        elif pieces[-1] or "\r" not in text:
+            yield pieces[-1]
+
+
+def _pump_lines(
+    pipe: Any, name: str, lines: "queue.Queue[Tuple[str, Optional[str]]]", limit: Optional[int] = PIPE_LINE_BYTES
+) -> None:
+    """Feed a pipe's lines into a bounded queue; a full queue blocks the reader, and the pipe the writer.
+
+    Lines longer than `limit` bytes arrive in pieces and carriage returns (progress bars) end
+    a line, so a consumer keeping a tail holds bounded memory. limit=None keeps lines whole,
+    for callers that capture everything anyway (single-line JSON from `pm2 jlist` must reach them unsplit).
+    """
+    try:
+        for piece in _pipe_pieces(pipe, limit):
+            lines.put((name, piece))
+    finally:
+        pipe.close()
+        lines.put((name, None))
+
+
+def _start_pumps(
+    proc: subprocess.Popen, lines: "queue.Queue[Tuple[str, Optional[str]]]", limit: Optional[int] = PIPE_LINE_BYTES
+) -> List[threading.Thread]:
+    readers = [
+        threading.Thread(target=_pump_lines, args=(pipe, name, lines, limit), daemon=True)
+        for name, pipe in [("stdout", proc.stdout), ("stderr", proc.stderr)]
+    ]
+    for reader in readers:
+        reader.start()
+    return readers
+
+
+def _drain_lines(lines: "queue.Queue[Tuple[str, Optional[str]]]", readers: List[threading.Thread]) -> None:
+    """Discard what the readers of a killed command still queue, so they reach EOF instead of blocking on a full queue."""
+    import queue
+
+    deadline = time.monotonic() + KILL_GRACE_SECONDS
+    while any(r.is_alive() for r in readers) and time.monotonic() < deadline:
+        try:
+            lines.get(timeout=0.05)
+        except queue.Empty:
+            continue
+
+
+def _kill_process_group(proc: subprocess.Popen) -> None:
+    import signal
+    import subprocess
+
+    for sig, grace in [(signal.SIGTERM, KILL_GRACE_SECONDS), (signal.SIGKILL, None)]:
+        try:
+            os.killpg(proc.pid, sig)
+        except (ProcessLookupError, PermissionError):
+            return
+        try:
+            proc.wait(timeout=grace)
+            return
+        except subprocess.TimeoutExpired:
+            continue
+
+
+def _exec(
+    runner: List[str],
+    env: Dict[str, str],
+    timeout: Optional[float] = None,
+    stream: bool = False,
+    capture: bool = True,
+    tail_lines: Optional[int] = None,
+) -> _ExecResult:
+    """Run a command in its own process group, reading output line by line.
+
+    Lines are consumed on the calling thread, so streamed output goes through whatever
+    sys.stdout/sys.stderr that thread sees (fleet prefixes included); a slow consumer stalls
+    the command through the bounded line queue rather than buffering. Captured output is
+    kept in a ring buffer of `tail_lines` lines (of at most PIPE_LINE_BYTES) per stream
+    when given, unbounded otherwise.
+    On timeout or interruption the whole process group is terminated, then killed.
+    """
+    import queue
+    import subprocess
+
+    started = time.monotonic()
+    proc = subprocess.Popen(
+        runner, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env, start_new_session=True
+    )
+    _count_spawn()
+    lines: "queue.Queue[Tuple[str, Optional[str]]]" = queue.Queue(maxsize=PIPE_QUEUE_LINES)
+    readers = _start_pumps(proc, lines, None if capture and tail_lines is None else PIPE_LINE_BYTES)
+
+    deadline = started + timeout if timeout else None
+    try:
+        buffers, timed_out = _collect_lines(lines, deadline, stream, capture, tail_lines)
+        if not timed_out:
+            try:
+                proc.wait(timeout=None if deadline is None else max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                timed_out = True
+        if timed_out:
+            _kill_process_group(proc)
+            _drain_lines(lines, readers)
+    except BaseException:
+        _kill_process_group(proc)
+        _drain_lines(lines, readers)
+        raise
+
+    return _exec_result(TIMEOUT_EXIT_CODE if timed_out else proc.returncode, buffers, started, timed_out, runner[-1])
+
+
+def _collect_lines(
+    lines: "queue.Queue[Tuple[str, Optional[str]]]",
+    deadline: Optional[float],
+    stream: bool,
+    capture: bool,
+    tail_lines: Optional[int],
+) -> Tuple[Dict[str, Any], bool]:
+    """Consume (stream, line) pairs until both streams sent None; returns the buffers and whether the deadline passed.
+
+    Without tail_lines the capture keeps whole lines: _CutLine pieces are joined again.
+    """
+    import queue
+    from collections import deque
+
+    buffers: Dict[str, Any] = {"stdout": deque(maxlen=tail_lines), "stderr": deque(maxlen=tail_lines)}
+    cut: Dict[str, List[str]] = {"stdout": [], "stderr": []}
+    open_pipes = 2
+    while open_pipes:
+        wait = None if deadline is None else max(0.0, deadline - time.monotonic())
+        try:
+            name, line = lines.get(timeout=wait)
+        except queue.Empty:
+            return buffers, True
+        if line is None:
+            if cut[name]:
+                buffers[name].append("".join(cut[name]))
+                cut[name] = []
+            open_pipes -= 1
+            continue
+        if capture and tail_lines is None and (cut[name] or isinstance(line, _CutLine)):
+            cut[name].append(line)
+            if not isinstance(line, _CutLine):
+                buffers[name].append("".join(cut[name]))
+                cut[name] = []
+        elif capture:
+            buffers[name].append(line)
+        if stream:
+            out = sys.stderr if name == "stderr" else sys.stdout
+            print(f"{time.strftime('%H:%M:%S')} {line}", file=out, flush=True)
+    return buffers, False
+
+
+def _exec_result(rc: int, buffers: Dict[str, Any], started: float, timed_out: bool, cmd: str) -> _ExecResult:
+    elapsed = time.monotonic() - started
+    if _VERBOSE["enabled"]:
+        print(f"[EXEC] exit {rc} in {elapsed:.3f}s: {cmd}", file=sys.stderr, flush=True)
+    return _ExecResult(
+        rc,
+        "\n".join(buffers["stdout"]) + ("\n" if buffers["stdout"] else ""),
+        "\n".join(buffers["stderr"]) + ("\n" if buffers["stderr"] else ""),
+        elapsed,
+        timed_out,
+    )
+
+
+class _ShellSession:
+    """One long-lived shell per service: shell_init runs once, then commands are written to its stdin.
+
+    Each command runs in a subshell (`( cd <path> && eval <cmd> ) </dev/null`), so exit, cd
+    or set -e inside it cannot affect the session, and is followed by a random marker on
+    both streams carrying its exit status. shell_init is framed the same way; the first
+    command drains its output first, dropping stdout and labelling stderr, so neither is
+    attributed to that command. A timed-out command takes the session down with it;
+    _session_for starts a new one for the next command.
+    """
+
+    def __init__(self, entry: Dict) -> None:
+        import queue
+        import subprocess
+
+        self.lock = threading.Lock()
+        self._marker = f"__servicectl_{os.urandom(8).hex()}__"
+        self._lines: "queue.Queue[Tuple[str, Optional[str]]]" = queue.Queue(maxsize=PIPE_QUEUE_LINES)
+        self._rc: Optional[int] = None
+        self._init_pending = True
+        self._proc = subprocess.Popen(
+            [_shell_bin(entry)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=_service_env(entry),
+            start_new_session=True,
+        )
+        _count_spawn()
+        self._readers = [
+            threading.Thread(target=self._pump, args=(pipe, name), daemon=True)
+            for name, pipe in [("stdout", self._proc.stdout), ("stderr", self._proc.stderr)]
+        ]
+        for reader in self._readers:
+            reader.start()
+        self._send(f"{_shell_init(entry)}\n{self._frame()}set +e\n")
+
+    def alive(self) -> bool:
+        return self._proc.poll() is None
+
+    def _send(self, text: str) -> bool:
+        try:
+            self._proc.stdin.write(text.encode("utf-8"))
+            self._proc.stdin.flush()
+            return True
+        except (BrokenPipeError, ValueError):
+            return False
+
+    def _frame(self) -> str:
+        """Shell text ending the current step: the marker and "$?" on stdout, the marker on stderr."""
+        return f"printf '%s %d\\n' {self._marker} \"$?\"; printf '%s\\n' {self._marker} >&2\n"
+
+    def _drain_init(self, started: float, deadline: Optional[float]) -> Optional[_ExecResult]:
+        """Consume shell_init's output; returns a result only when the session did not survive it."""
+        self._init_pending = False
+        buffers, timed_out = _collect_lines(self._lines, deadline, False, True, PIPE_QUEUE_LINES)
+        for line in buffers["stderr"]:
+            print(f"[SESSION] shell_init: {line}", file=sys.stderr, flush=True)
+        if timed_out:
+            self.close()
+            return _exec_result(TIMEOUT_EXIT_CODE, buffers, started, True, "shell_init")
+        if self._rc is None:
+            return _exec_result(self._proc.wait() or 1, buffers, started, False, "shell_init")
+        return None
+
+    def _pump(self, pipe: Any, name: str) -> None:
+        """Queue a session pipe's lines as _pump_lines does; each marker ends the current step with (name, None)."""
+        keep = len(self._marker) - 1
+        carry = ""
+        try:
+            for piece in _pipe_pieces(pipe, PIPE_LINE_BYTES):
+                line, carry = carry + piece, ""
+                at = line.find(self._marker)
+                if at < 0 and isinstance(piece, _CutLine):
+                    # A marker may straddle the cut: hold back what could be its start.
+                    line, carry = line[:-keep], line[-keep:]
+                    if line:
+                        self._lines.put((name, _CutLine(line)))
+                    continue
+                if at < 0:
+                    self._lines.put((name, line))
+                    continue
+                if at:
+                    self._lines.put((name, line[:at]))
+                if name == "stdout":
+                    status = line[at + len(self._marker):].strip()
+                    self._rc = int(status) if status.isdigit() else 1
+                self._lines.put((name, None))
+        finally:
+            if carry:
+                self._lines.put((name, carry))
+            pipe.close()
+            self._lines.put((name, None))
+
+    def run(
+        self, workdir: str, cmd: str, timeout: Optional[float], stream: bool, capture: bool, tail_lines: Optional[int]
+    ) -> _ExecResult:
+        started = time.monotonic()
+        deadline = started + timeout if timeout else None
+        if self._init_pending:
+            failed = self._drain_init(started, deadline)
+            if failed is not None:
+                return failed
+        self._rc = None
+        self._send(f"( cd {_shell_quote(workdir)} && eval {_shell_quote(cmd)} ) </dev/null; {self._frame()}")
+        try:
+            buffers, timed_out = _collect_lines(self._lines, deadline, stream, capture, tail_lines)
+        except BaseException:
+            self.close()
+            raise
+        if timed_out:
+            self.close()
+            rc = TIMEOUT_EXIT_CODE
+        elif self._rc is not None:
+            rc = self._rc
+        else:
+            # The shell itself exited (e.g. `exit` in shell_init); report its status.
+            rc = self._proc.wait() or 1
+        return _exec_result(rc, buffers, started, timed_out, cmd)
+
+    def close(self) -> None:
+        if self.alive():
+            self._send("exit\n")
+            try:
+                self._proc.stdin.close()
+            except OSError:
+                pass
+            _kill_process_group(self._proc)
+        _drain_lines(self._lines, self._readers)
+
+
+@contextmanager
+def _shell_sessions() -> Any:
+    """Scope of one operation: shell sessions started inside it are closed when the outermost scope exits."""
+    with _SESSIONS_LOCK:
+        _SESSIONS["depth"] += 1
+    try:
+        yield
+    finally:
+        with _SESSIONS_LOCK:
+            _SESSIONS["depth"] -= 1
+            shells = [] if _SESSIONS["depth"] else list(_SESSIONS["shells"].values())
+            if not _SESSIONS["depth"]:
+                _SESSIONS["shells"] = {}
+        for shell in shells:
+            shell.close()
+
+
+def _session_for(entry: Dict) -> Optional[_ShellSession]:
+    """The service's session, locked for the caller, or None (disabled, outside a scope, or busy on another thread)."""
+    if not entry.get("shell_session") or not _SESSIONS["depth"]:
+        return None
+    key = json.dumps([_shell_bin(entry), _shell_init(entry), entry.get("env", {})], sort_keys=True, default=str)
+    with _SESSIONS_LOCK:
+        if not _SESSIONS["depth"]:
+            return None
+        shell = _SESSIONS["shells"].get(key)
+        if shell is None or not shell.alive():
+            if shell is not None:
+                shell.close()
+            shell = _SESSIONS["shells"][key] = _ShellSession(entry)
+    return shell if shell.lock.acquire(blocking=False) else None
+
+
+def _exec_service(
+    entry: Dict,
+    cmd: str,
+    timeout: Optional[float] = None,
+    stream: bool = False,
+    capture: bool = True,
+    tail_lines: Optional[int] = None,
+) -> _ExecResult:
+    """Run cmd for the service: through its shell session when one is available, else in a fresh shell."""
+    shell = _session_for(entry)
+    if shell is None:
+        return _exec(_build_runner(entry, cmd), _service_env(entry), timeout=timeout, stream=stream, capture=capture, tail_lines=tail_lines)
+    try:
+        return shell.run(_service_workdir(entry), cmd, timeout, stream, capture, tail_lines)
+    finally:
+        shell.lock.release()
+
+
+def _timeout_for(entry: Dict, name: str) -> Optional[float]:
+    configured = entry.get("timeouts", {})
+    value = configured.get(name) if isinstance(configured, dict) else None
+    if value is None:
+        value = DEFAULT_TIMEOUTS.get(name)
+    try:
+        seconds = float(value) if value is not None else 0.0
+    except (TypeError, ValueError):
+        return None
+    return seconds if seconds > 0 else None
+
+
+def _run_shell(entry: Dict, cmd: str, timeout_key: str = "probe", tail_lines: Optional[int] = None) -> _ExecResult:
+    """Run cmd in the service's shell and capture its output (the last tail_lines lines of each stream, if set)."""
+    result = _exec_service(entry, cmd, timeout=_timeout_for(entry, timeout_key), tail_lines=tail_lines)
+    if result.timed_out:
+        print(f"[TIMEOUT] killed after {result.elapsed:.1f}s: {cmd}", file=sys.stderr, flush=True)
+    return result
+
+
+def _action_command(entry: Dict, action: str) -> str:
+    """The configured command for action; systemd/pm2 services restart their units when none is set."""
+    from .native import _service_units
+
+    cmd = str((entry.get("actions", {}) or {}).get(action, "")).strip()
+    runtime = str(entry.get("runtime", "custom")).strip().lower()
+    units = _service_units(entry)
+    if not cmd and action == "restart" and runtime in NATIVE_RUNTIMES and units:
+        cmd = f"{NATIVE_RESTART_CMDS[runtime]} {_format_argv(units)}"
+    return cmd
+
+
+def _run_action(entry: Dict, action: str, dry_run: bool = False) -> int:
+    from .actions import _precheck
+
+    cmd = _action_command(entry, action)
+    if not cmd:
+        print(f"[ERROR] action '{action}' is not configured", file=sys.stderr)
+        return 2
+
+    try:
+        _service_workdir(entry)
+    except ValueError as e:
+        print(f"[ERROR] {e}", file=sys.stderr)
+        return 2
+
+    if dry_run:
+        print("[DRY-RUN]", _format_argv(_build_runner(entry, cmd)), flush=True)
+        return 0
+
+    precheck_rc = _precheck(entry, action)
+    if precheck_rc != 0:
+        return precheck_rc
+
+    return _run_command(entry, cmd, action)
+
+
+def _run_command(entry: Dict, cmd: str, action: str = "", phase: str = "run") -> int:
+    runner = _build_runner(entry, cmd)
+    print("[RUN]", _format_argv(runner), flush=True)
+    timeout = _timeout_for(entry, action) if action else None
+    with _span(phase, cmd=cmd) as span:
+        result = _exec_service(entry, cmd, timeout=timeout, stream=True, tail_lines=ACTION_TAIL_LINES)
+        span["rc"] = result.returncode
+    if result.timed_out:
+        print(f"[TIMEOUT] {action or 'command'} exceeded {timeout:g}s; process group killed", file=sys.stderr, flush=True)
+    print(f"[DONE] exit {result.returncode} in {result.elapsed:.2f}s", flush=True)
+    return result.returncode
@@ -0,0 +1,129 @@
+"""Reporting phase spans: --timings, --trace and --metrics-dir."""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+
+from .common import _SPANS
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any, Dict, List
+
+
+def _span_order(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Spans grouped by service (in order of first appearance), each group in start order."""
+    first: Dict[str, float] = {}
+    for r in sorted(records, key=lambda r: r["start"]):
+        first.setdefault(r["service"], r["start"])
+    return sorted(records, key=lambda r: (first[r["service"]], r["service"], r["start"], r["depth"]))
+
+
+def _print_timings(records: List[Dict[str, Any]]) -> None:
+    rows = [
+        (r["service"] or "-", "  " * r["depth"] + r["name"], f"{r['duration']:.3f}", "-" if r["rc"] is None else str(r["rc"]), str(r["spawns"]))
+        for r in _span_order(records)
+    ]
+    header = ("SERVICE", "PHASE", "SECONDS", "RC", "PROCS")
+    widths = [max(len(row[i]) for row in [header] + rows) for i in range(len(header))]
+    print("[TIMINGS]", flush=True)
+    for row in [header] + rows:
+        print(
+            f"{row[0]:<{widths[0]}}  {row[1]:<{widths[1]}}  {row[2]:>{widths[2]}}  {row[3]:>{widths[3]}}  {row[4]:>{widths[4]}}",
+            flush=True,
+        )
+
+
+def _write_trace(path: str, command: str, records: List[Dict[str, Any]]) -> None:
+    """Write the spans as Chrome trace-event JSON (chrome://tracing, Perfetto)."""
+    pid = os.getpid()
+    events: List[Dict[str, Any]] = [{"name": "process_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": f"servicectl {command}"}}]
+    hidden = {"name", "path", "depth", "tid", "start", "duration"}
+    for r in _span_order(records):
+        events.append({
+            "name": r["name"],
+            "cat": r["service"] or "servicectl",
+            "ph": "X",
+            "ts": round(r["start"] * 1e6),
+            "dur": round(r["duration"] * 1e6),
+            "pid": pid,
+            "tid": r["tid"],
+            "args": {k: v for k, v in r.items() if k not in hidden},
+        })
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    os.replace(tmp, path)
+
+
+def _prom_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _write_prometheus(directory: str, command: str, records: List[Dict[str, Any]]) -> List[str]:
+    """Write one node-exporter textfile per service with the timings of its last `command` run.
+
+    Phases are identified by their span path (e.g. update/post_check/run); repeated phases,
+    such as rolling batches, are summed. Returns the files written.
+    """
+    by_service: Dict[str, List[Dict[str, Any]]] = {}
+    for r in records:
+        if r["service"]:
+            by_service.setdefault(r["service"], []).append(r)
+
+    os.makedirs(directory, exist_ok=True)
+    written = []
+    for service, spans in sorted(by_service.items()):
+        labels = f'service="{_prom_label(service)}",action="{_prom_label(command)}"'
+        start = min(r["start"] for r in spans)
+        end = max(r["start"] + r["duration"] for r in spans)
+        tops = sorted((r for r in spans if r["depth"] == 0 and r["rc"] is not None), key=lambda r: r["start"] + r["duration"])
+        phases: Dict[str, List[float]] = {}
+        for r in spans:
+            totals = phases.setdefault(r["path"], [0.0, 0])
+            totals[0] += r["duration"]
+            totals[1] += r["spawns"]
+
+        lines = [
+            "# HELP servicectl_last_run_timestamp_seconds Unix time the last run finished.",
+            "# TYPE servicectl_last_run_timestamp_seconds gauge",
+            f"servicectl_last_run_timestamp_seconds{{{labels}}} {_SPANS['wall_origin'] + end:.3f}",
+            "# HELP servicectl_last_run_duration_seconds Wall time of the last run.",
+            "# TYPE servicectl_last_run_duration_seconds gauge",
+            f"servicectl_last_run_duration_seconds{{{labels}}} {end - start:.6f}",
+        ]
+        if tops:
+            lines += [
+                "# HELP servicectl_last_run_exit_code Exit code of the last run.",
+                "# TYPE servicectl_last_run_exit_code gauge",
+                f"servicectl_last_run_exit_code{{{labels}}} {tops[-1]['rc']}",
+            ]
+        lines += ["# HELP servicectl_phase_duration_seconds Seconds spent in each phase of the last run.", "# TYPE servicectl_phase_duration_seconds gauge"]
+        lines += [f'servicectl_phase_duration_seconds{{{labels},phase="{_prom_label(p)}"}} {t[0]:.6f}' for p, t in sorted(phases.items())]
+        lines += ["# HELP servicectl_phase_subprocesses Processes started in each phase of the last run.", "# TYPE servicectl_phase_subprocesses gauge"]
+        lines += [f'servicectl_phase_subprocesses{{{labels},phase="{_prom_label(p)}"}} {t[1]}' for p, t in sorted(phases.items())]
+
+        safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in f"{service}_{command}")
+        path = os.path.join(directory, f"servicectl_{safe}.prom")
+        # node_exporter ignores files without the .prom suffix, so a half-written tmp file is never scraped.
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp, path)
+        written.append(path)
+    return written
+
+
+def _report_spans(args: argparse.Namespace) -> None:
+    records = list(_SPANS["records"])
+    if args.timings and records:
+        _print_timings(records)
+    try:
+        if args.trace:
+            _write_trace(args.trace, args.cmd, records)
+        if args.metrics_dir:
+            _write_prometheus(args.metrics_dir, args.cmd, records)
+    except OSError as e:
+        print(f"[ERROR] writing timings failed: {e}", file=sys.stderr, flush=True)
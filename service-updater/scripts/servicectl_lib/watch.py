@@ -0,0 +1,227 @@
+"""Following docker events until the containers of the selected services settle."""
+from __future__ import annotations
+
+import sys
+import time
+
+from .common import _count_spawn, _safe_json_loads, _shell_quote
+from .compose import (
+    COMPOSE_PROJECT_LABEL, _compose_container_ids_cli, _compose_labels_match, _container_record,
+    _explicit_project_name, _inspect_cli,
+)
+from .runner import (
+    PIPE_QUEUE_LINES, TIMEOUT_EXIT_CODE, _build_runner, _drain_lines, _kill_process_group, _service_env, _start_pumps,
+)
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    import queue
+    from typing import Any, Dict, List, Optional, Tuple
+
+WATCH_EVENTS = ["create", "start", "die", "oom", "pause", "unpause", "destroy", "health_status"]
+
+
+class _ContainerState:
+    """One watched container, seeded from `docker inspect` and then updated from docker events."""
+
+    def __init__(self, service: str, component: str, name: str) -> None:
+        self.service = service
+        self.component = component
+        self.name = name
+        self.status = "created"
+        self.health = ""  # empty when the container has no healthcheck
+        self.restarts = 0
+        self.exit_code = ""
+        self.oom = False
+
+    @classmethod
+    def from_inspect(cls, service: str, c: Dict[str, Any]) -> _ContainerState:
+        record = _container_record(c)
+        state = cls(service, record.component, record.container)
+        info = c.get("State", {}) or {}
+        state.status = str(info.get("Status", "") or "created")
+        state.health = str((info.get("Health") or {}).get("Status", ""))
+        state.restarts = int(c.get("RestartCount", 0) or 0)
+        state.exit_code = str(info.get("ExitCode", "")) if state.status in {"exited", "dead"} else ""
+        state.oom = bool(info.get("OOMKilled"))
+        return state
+
+    def label(self) -> str:
+        text = self.status + (f"/{self.health}" if self.health else "")
+        if self.exit_code:
+            text += f" exit={self.exit_code}"
+        if self.oom:
+            text += " oom"
+        if self.restarts:
+            text += f" restarts={self.restarts}"
+        return text
+
+    def settled(self) -> bool:
+        return self.status == "running" and self.health in {"", "healthy"}
+
+    def apply(self, action: str, attrs: Dict[str, str]) -> None:
+        if action == "start":
+            if self.status in {"exited", "dead"}:
+                self.restarts += 1
+            self.status = "running"
+            self.exit_code = ""
+            self.oom = False
+            if self.health:
+                self.health = "starting"
+        elif action == "die":
+            self.status = "exited"
+            self.exit_code = str(attrs.get("exitCode", ""))
+        elif action == "oom":
+            self.oom = True
+        elif action == "pause":
+            self.status = "paused"
+        elif action == "unpause":
+            self.status = "running"
+        elif action.startswith("health_status:"):
+            self.health = action.split(":", 1)[1].strip()
+
+
+def _inspect_states(
+    key: str, entry: Dict, ids: List[str], projects: Optional[Dict[str, str]] = None
+) -> Tuple[Optional[str], Dict[str, _ContainerState]]:
+    """Watch states of containers; their project labels are recorded in `projects` (label -> service)."""
+    error, inspected = _inspect_cli(entry, "docker inspect", ids)
+    if error is not None:
+        return error, {}
+    states: Dict[str, _ContainerState] = {}
+    for c in inspected:
+        if not c.get("Id"):
+            continue
+        states[str(c["Id"])] = _ContainerState.from_inspect(key, c)
+        project = ((c.get("Config", {}) or {}).get("Labels", {}) or {}).get(COMPOSE_PROJECT_LABEL)
+        if projects is not None and project:
+            projects[str(project)] = key
+    return None, states
+
+
+def _watch_events_command(projects: List[str]) -> str:
+    filters = ["type=container"] + [f"event={e}" for e in WATCH_EVENTS]
+    # Repeated label filters are ANDed by the daemon, so several projects are matched client-side.
+    filters.append(f"label={COMPOSE_PROJECT_LABEL}" + (f"={projects[0]}" if len(projects) == 1 else ""))
+    return "docker events --format '{{json .}}' " + " ".join(f"--filter {_shell_quote(f)}" for f in filters)
+
+
+def _watch_services(targets: List[Tuple[str, Dict]], timeout: float) -> int:
+    """Follow one `docker events` stream until every container of the targets is running and healthy.
+
+    The stream is opened before the initial inspect so nothing falls between the two; events
+    stamped before the inspect started are already reflected in it and are skipped. Events are
+    matched to services by the project labels of the inspected containers, then by
+    _compose_labels_match, never by a project name guessed from the directory.
+    """
+    import queue
+    import subprocess
+
+    started = time.monotonic()
+    deadline = started + timeout
+    entries = dict(targets)
+    # The daemon can filter on one configured project name; otherwise all compose events come through.
+    explicit = _explicit_project_name(targets[0][1]) if len(targets) == 1 else ""
+    stream_filter = [explicit] if explicit else []
+    projects: Dict[str, str] = {}
+    stream_entry = targets[0][1]
+    proc = subprocess.Popen(
+        _build_runner(stream_entry, _watch_events_command(stream_filter)),
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        env=_service_env(stream_entry),
+        start_new_session=True,
+    )
+    _count_spawn()
+    lines: "queue.Queue[Tuple[str, Optional[str]]]" = queue.Queue(maxsize=PIPE_QUEUE_LINES)
+    readers = _start_pumps(proc, lines)
+
+    def elapsed() -> str:
+        return f"+{time.monotonic() - started:.2f}s"
+
+    try:
+        snapshot_ns = time.time_ns()
+        states: Dict[str, _ContainerState] = {}
+        for key, entry in targets:
+            error, ids = _compose_container_ids_cli(entry)
+            if error is None and ids:
+                error, found = _inspect_states(key, entry, ids, projects)
+                states.update(found)
+            if error is not None:
+                print(f"[ERROR] {key}: {error}", file=sys.stderr, flush=True)
+                return 1
+        for state in states.values():
+            print(f"[WATCH] {state.service}/{state.component} {state.name}: {state.label()}", flush=True)
+
+        empty = sorted(set(entries) - {s.service for s in states.values()})
+        stderr_tail: List[str] = []
+        while empty or not all(s.settled() for s in states.values()):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                name, line = lines.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if line is None:
+                if name == "stdout":
+                    detail = stderr_tail[-1] if stderr_tail else f"exit {proc.poll()}"
+                    print(f"[ERROR] docker events stream ended: {detail}", file=sys.stderr, flush=True)
+                    return 1
+                continue
+            if name == "stderr":
+                stderr_tail = (stderr_tail + [line])[-5:]
+                continue
+
+            event = _safe_json_loads(line, None)
+            if not isinstance(event, dict) or int(event.get("timeNano", 0) or 0) < snapshot_ns:
+                continue
+            actor = event.get("Actor", {}) or {}
+            attrs = actor.get("Attributes", {}) or {}
+            project = str(attrs.get(COMPOSE_PROJECT_LABEL, ""))
+            key = projects.get(project)
+            if key is None:
+                key = next((k for k, entry in targets if _compose_labels_match(entry, attrs)), None)
+                if key is not None:
+                    projects[project] = key
+            cid = str(actor.get("ID", "") or event.get("id", ""))
+            action = str(event.get("Action", "") or event.get("status", ""))
+            if key is None or not cid or str(attrs.get("com.docker.compose.oneoff", "")).lower() == "true":
+                continue
+
+            state = states.get(cid)
+            if action == "destroy":
+                if state is not None:
+                    del states[cid]
+                    print(f"[WATCH] {elapsed()} {state.service}/{state.component} {state.name}: removed", flush=True)
+                continue
+            if state is None:
+                # New container (e.g. recreated by up -d): inspect once to learn whether it has a healthcheck.
+                _, found = _inspect_states(key, entries[key], [cid])
+                state = found.get(cid)
+                if state is None:
+                    continue
+                states[cid] = state
+                print(f"[WATCH] {elapsed()} {state.service}/{state.component} {state.name}: (new) -> {state.label()}", flush=True)
+                empty = [k for k in empty if k != key]
+                continue
+
+            before = state.label()
+            state.apply(action, attrs)
+            if state.label() != before:
+                print(f"[WATCH] {elapsed()} {state.service}/{state.component} {state.name}: {before} -> {state.label()}", flush=True)
+    finally:
+        _kill_process_group(proc)
+        _drain_lines(lines, readers)
+
+    pending = [s for s in states.values() if not s.settled()]
+    if not pending and not empty:
+        print(f"[WATCH_RESULT] settled in {time.monotonic() - started:.2f}s ({len(states)} containers)", flush=True)
+        return 0
+    print(f"[WATCH_RESULT] not settled after {timeout:.0f}s:", flush=True)
+    for key in empty:
+        print(f"- {key}: no running containers", flush=True)
+    for s in pending:
+        print(f"- {s.service}/{s.component} {s.name}: {s.label()}", flush=True)
+    return TIMEOUT_EXIT_CODE
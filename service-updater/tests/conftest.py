@@ -0,0 +1,155 @@
+"""Shared fixtures: a scratch servicectl tree with the fake docker CLI from benchmarks/bench_suite.py."""
+import importlib.util
+import itertools
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+SCRIPT = ROOT / "scripts" / "servicectl.py"
+PACKAGE = ROOT / "scripts" / "servicectl_lib"
+
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from bench_suite import FAKE_DOCKER  # noqa: E402
+
+# Names for in-process imports of tree copies; id() values are reused once a tree is gone.
+_LOADS = itertools.count()
+
+COMPOSE_ACTIONS = {
+    "update": "docker compose pull && docker compose up -d --remove-orphans",
+    "restart": "docker compose restart",
+    "status": "docker compose ps",
+    "health": "docker compose ps",
+}
+
+
+class Tree:
+    """A copy of servicectl.py and its package with their own data/ directory and a bin/ directory first on PATH."""
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.script = root / "scripts" / "servicectl.py"
+        self.bin = root / "bin"
+        self.spawn_log = root / "spawns.log"
+        self.projects = root / "projects.txt"
+        (root / "scripts").mkdir(parents=True)
+        (root / "data").mkdir()
+        self.bin.mkdir()
+        shutil.copy(SCRIPT, self.script)
+        shutil.copytree(PACKAGE, root / "scripts" / PACKAGE.name, ignore=shutil.ignore_patterns("__pycache__"))
+        self.write_bin("docker", FAKE_DOCKER)
+        self.projects.write_text("", encoding="utf-8")
+        self.env = dict(
+            os.environ,
+            PATH=f"{self.bin}{os.pathsep}{os.environ.get('PATH', '')}",
+            SERVICECTL_NO_DAEMON="1",
+            PYTHONDONTWRITEBYTECODE="1",
+            BENCH_SPAWN_LOG=str(self.spawn_log),
+            BENCH_PROJECTS=str(self.projects),
+            BENCH_CONTAINERS="2",
+        )
+        self._module = None
+
+    def write_bin(self, name: str, body: str) -> Path:
+        path = self.bin / name
+        path.write_text(body, encoding="utf-8")
+        path.chmod(0o755)
+        return path
+
+    def service_dir(self, name: str) -> Path:
+        path = self.root / "svcs" / name
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def register(self, services: Dict[str, Dict]) -> None:
+        """Write data/services.json directly; compose services with a path are listed by the fake `docker ps`."""
+        for key, entry in services.items():
+            entry.setdefault("runtime", "docker_compose")
+            entry.setdefault("shell_init", ":")
+            if entry["runtime"] == "docker_compose":
+                entry.setdefault("actions", dict(COMPOSE_ACTIONS))
+        (self.root / "data" / "services.json").write_text(json.dumps({"services": services}, indent=2), encoding="utf-8")
+        paths = [e["path"] for e in services.values() if e.get("path") and e["runtime"] == "docker_compose"]
+        self.projects.write_text("\n".join(paths), encoding="utf-8")
+
+    def run(self, *args: str, env: Optional[Dict[str, str]] = None, timeout: float = 60) -> subprocess.CompletedProcess:
+        return subprocess.run(
+            [sys.executable, str(self.script), *args],
+            capture_output=True,
+            text=True,
+            env={**self.env, **(env or {})},
+            cwd=str(self.root),
+            timeout=timeout,
+        )
+
+    def popen(self, *args: str, env: Optional[Dict[str, str]] = None, **kwargs) -> subprocess.Popen:
+        return subprocess.Popen(
+            [sys.executable, str(self.script), *args],
+            env={**self.env, **(env or {})},
+            cwd=str(self.root),
+            **kwargs,
+        )
+
+    def load(self):
+        """The tree's copy of the package imported in-process, so its data paths point into the scratch tree.
+
+        Imported under a name of its own, with every submodule loaded as an attribute (sc.registry, sc.runner, ...).
+        """
+        if self._module is None:
+            name = f"servicectl_tree{next(_LOADS)}"
+            package = self.root / "scripts" / PACKAGE.name
+            spec = importlib.util.spec_from_file_location(name, package / "__init__.py",
+                                                          submodule_search_locations=[str(package)])
+            module = importlib.util.module_from_spec(spec)
+            sys.modules[name] = module
+            spec.loader.exec_module(module)
+            for path in sorted(package.glob("*.py")):
+                if path.stem != "__init__":
+                    importlib.import_module(f"{name}.{path.stem}")
+            self._module = module
+        return self._module
+
+    def spawns(self) -> List[str]:
+        return self.spawn_log.read_text(encoding="utf-8").splitlines() if self.spawn_log.exists() else []
+
+
+@pytest.fixture
+def tree(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Tree:
+    t = Tree(tmp_path)
+    for key in ["PATH", "SERVICECTL_NO_DAEMON", "BENCH_SPAWN_LOG", "BENCH_PROJECTS", "BENCH_CONTAINERS"]:
+        monkeypatch.setenv(key, t.env[key])
+    return t
+
+
+@pytest.fixture
+def daemon(tree: Tree):
+    """A `serve` daemon for the tree; tree.run() forwards daemon commands to it. Yields the daemon's log path."""
+    sock_dir = tempfile.mkdtemp(prefix="sctl")
+    socket_path = os.path.join(sock_dir, "d.sock")
+    log = tree.root / "daemon.log"
+    env = {k: v for k, v in tree.env.items() if k != "SERVICECTL_NO_DAEMON"}
+    env["SERVICECTL_SOCKET"] = socket_path
+    with open(log, "wb") as out:
+        proc = subprocess.Popen([sys.executable, str(tree.script), "serve"], env=env, cwd=str(tree.root), stdout=out, stderr=out)
+    deadline = time.monotonic() + 10
+    while not os.path.exists(socket_path) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert os.path.exists(socket_path), log.read_text()
+    saved = tree.env
+    tree.env = env
+    try:
+        yield log
+    finally:
+        tree.env = saved
+        proc.terminate()
+        proc.wait(timeout=10)
+        shutil.rmtree(sock_dir, ignore_errors=True)
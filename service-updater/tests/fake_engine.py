@@ -0,0 +1,117 @@
+"""In-process Docker Engine API stand-in on a unix socket, for the `--docker-backend engine` client."""
+import json
+import os
+import socket
+import socketserver
+import threading
+from http.server import BaseHTTPRequestHandler
+from typing import Any, Dict, List
+from urllib.parse import parse_qs, unquote, urlsplit
+
+
+class FakeEngine:
+    """Answers /_ping, /containers/json, /containers/<id>/json and /images/<id>/json for one compose project.
+
+    `mode` is "ok", "error" (every request gets HTTP 500) or "garbage" (200 with a body that is not JSON).
+    Requests are recorded as "METHOD path".
+    """
+
+    def __init__(self, path: str, project: str, workdir: str, containers: int = 2, mode: str = "ok") -> None:
+        self.path = path
+        self.mode = mode
+        self.requests: List[str] = []
+        image = "sha256:" + "e" * 64
+        self.containers = {
+            f"{project}-engine-{i}".ljust(64, "0"): {
+                "Id": f"{project}-engine-{i}".ljust(64, "0"),
+                "Name": f"/{project}-app{i}-1",
+                "Image": image,
+                "State": {"Status": "running"},
+                "Config": {"Image": "engine/app:1", "Labels": {
+                    "com.docker.compose.service": f"app{i}",
+                    "com.docker.compose.project": project,
+                    "com.docker.compose.project.working_dir": workdir,
+                }},
+            }
+            for i in range(containers)
+        }
+        self.images = {image: {"Id": image, "RepoDigests": ["engine/app@sha256:" + "f" * 64],
+                               "Config": {"Labels": {"org.opencontainers.image.version": "9.9.9"}}}}
+        engine = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args) -> None:
+                pass
+
+            def address_string(self) -> str:
+                return "unix"
+
+            def do_GET(self) -> None:
+                engine._handle(self)
+
+        class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+            daemon_threads = True
+
+        self.server = Server(path, Handler)
+
+    def __enter__(self) -> "FakeEngine":
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        os.unlink(self.path)
+
+    def _route(self, path: str, query: Dict[str, List[str]]) -> Any:
+        if path == "/_ping":
+            return "OK"
+        if path == "/containers/json":
+            wanted = json.loads(query.get("filters", ["{}"])[0]).get("label", [])
+            return [
+                {"Id": c["Id"], "State": "running", "Status": "Up 1 hour", "Labels": c["Config"]["Labels"]}
+                for c in self.containers.values()
+                if all(_label_matches(c["Config"]["Labels"], label) for label in wanted)
+            ]
+        parts = path.strip("/").split("/")
+        if len(parts) == 3 and parts[0] == "containers" and parts[2] == "json":
+            return self.containers.get(unquote(parts[1]))
+        if len(parts) == 3 and parts[0] == "images" and parts[2] == "json":
+            return self.images.get(unquote(parts[1]))
+        return None
+
+    def _handle(self, h: BaseHTTPRequestHandler) -> None:
+        url = urlsplit(h.path)
+        self.requests.append(f"{h.command} {url.path}")
+        if self.mode == "error":
+            return self._send(h, 500, json.dumps({"message": "engine stand-in failure"}).encode())
+        if self.mode == "garbage":
+            return self._send(h, 200, b"<html>not the engine API</html>")
+        result = self._route(url.path, parse_qs(url.query))
+        if result is None:
+            return self._send(h, 404, json.dumps({"message": "no such object"}).encode())
+        body = result.encode() if isinstance(result, str) else json.dumps(result).encode()
+        self._send(h, 200, body)
+
+    @staticmethod
+    def _send(h: BaseHTTPRequestHandler, status: int, body: bytes) -> None:
+        h.send_response(status)
+        h.send_header("Content-Type", "application/json")
+        h.send_header("Content-Length", str(len(body)))
+        h.end_headers()
+        h.wfile.write(body)
+
+
+def _label_matches(labels: Dict[str, str], label: str) -> bool:
+    key, sep, value = label.partition("=")
+    return key in labels and (not sep or labels[key] == value)
+
+
+def refused_socket(path: str) -> str:
+    """A unix socket path that exists but has no listener, so connecting is refused."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    sock.close()
+    return path
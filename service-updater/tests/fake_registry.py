@@ -0,0 +1,80 @@
+"""In-process OCI registry stand-in: manifest HEAD/GET with optional bearer-token auth over keep-alive HTTP/1.1."""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+
+TOKEN = "stand-in-token"
+
+
+class FakeRegistry:
+    """Serves `/v2/<repo>/manifests/<tag>` from `manifests` ("repo:tag" -> digest) on 127.0.0.1.
+
+    With `auth=True` manifest requests without the token get a 401 whose WWW-Authenticate points at
+    `/token`. Every request is recorded as (method, path, connection number).
+    """
+
+    def __init__(self, manifests: Dict[str, str], auth: bool = False) -> None:
+        self.manifests = manifests
+        self.auth = auth
+        self.requests: List[Tuple[str, str, int]] = []
+        self._lock = threading.Lock()
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args) -> None:
+                pass
+
+            def setup(self) -> None:
+                super().setup()
+                with registry._lock:
+                    registry.connections += 1
+                    self.number = registry.connections
+
+            def do_HEAD(self) -> None:
+                registry._handle(self)
+
+            def do_GET(self) -> None:
+                registry._handle(self)
+
+        self.connections = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.host = f"127.0.0.1:{self.server.server_address[1]}"
+
+    def __enter__(self) -> "FakeRegistry":
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def paths(self, prefix: str = "") -> List[str]:
+        return [f"{method} {path}" for method, path, _ in self.requests if path.startswith(prefix)]
+
+    def _handle(self, h: BaseHTTPRequestHandler) -> None:
+        with self._lock:
+            self.requests.append((h.command, h.path, h.number))
+        if h.path.startswith("/token"):
+            return self._send(h, 200, {"Content-Type": "application/json"}, json.dumps({"token": TOKEN}).encode())
+        if self.auth and h.headers.get("Authorization") != f"Bearer {TOKEN}":
+            challenge = f'Bearer realm="http://{self.host}/token",service="stand-in"'
+            return self._send(h, 401, {"WWW-Authenticate": challenge})
+        repo, _, tag = h.path[len("/v2/"):].partition("/manifests/")
+        digest = self.manifests.get(f"{repo}:{tag}")
+        if digest is None:
+            return self._send(h, 404, {})
+        self._send(h, 200, {"Content-Type": "application/vnd.oci.image.index.v1+json", "Docker-Content-Digest": digest}, b"{}")
+
+    @staticmethod
+    def _send(h: BaseHTTPRequestHandler, status: int, headers: Dict[str, str], body: bytes = b"") -> None:
+        h.send_response(status)
+        for key, value in headers.items():
+            h.send_header(key, value)
+        h.send_header("Content-Length", str(len(body)))
+        h.end_headers()
+        if h.command != "HEAD":
+            h.wfile.write(body)
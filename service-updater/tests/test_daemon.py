@@ -0,0 +1,52 @@
+"""The resident daemon: forwarding commands and streaming their output back to the client."""
+import subprocess
+import sys
+
+from fake_engine import refused_socket
+
+
+def test_commands_forward_to_daemon(tree, daemon):
+    tree.register({key: {"path": str(tree.service_dir(key))} for key in ["a", "b"]})
+    local = tree.run("status", "--all", env={"SERVICECTL_NO_DAEMON": "1"})
+    forwarded = tree.run("status", "--all")
+    assert forwarded.returncode == local.returncode == 0
+    assert forwarded.stdout == local.stdout
+
+
+def test_client_exits_quietly_when_its_reader_goes_away(tree, daemon):
+    tree.register({f"svc{i:04d}": {"path": f"/srv/svc{i:04d}"} for i in range(3000)})
+    cp = subprocess.run(
+        f"{sys.executable} {tree.script} list | head -n 1",
+        shell=True, capture_output=True, text=True, env=tree.env, timeout=60,
+    )
+    assert cp.stdout.count("\n") == 1
+    assert "Traceback" not in cp.stderr and "BrokenPipe" not in cp.stderr, cp.stderr
+    assert tree.run("show", "svc0001").returncode == 0, "the daemon should survive the dropped client"
+
+
+def test_outdated_worker_output_reaches_the_client(tree, daemon):
+    sock = refused_socket(str(tree.root / "e.sock"))
+    tree.register({"a": {"path": str(tree.service_dir("a")), "docker_backend": "engine",
+                         "env": {"DOCKER_HOST": f"unix://{sock}"}}})
+    cp = tree.run("outdated", "a")
+    assert "[ENGINE]" in cp.stderr and "falling back to docker CLI" in cp.stderr
+    assert "[ENGINE]" not in daemon.read_text()
+
+
+def test_mutating_commands_run_in_the_callers_process(tree, daemon):
+    tree.register({"a": {"path": str(tree.service_dir("a")), "runtime": "custom",
+                         "actions": {"restart": 'echo "$MARK $PPID" > restarted'}}})
+    cp = tree.run("restart", "a", env={"MARK": "client"})
+    assert cp.returncode == 0, cp.stderr
+    mark, _ = (tree.service_dir("a") / "restarted").read_text().split()
+    assert mark == "client"
+    assert "restart" not in daemon.read_text()
+
+
+def test_commands_that_start_processes_use_the_callers_environment(tree, daemon):
+    tree.register({"a": {"path": str(tree.service_dir("a"))}})
+    same = tree.run("status", "a")
+    changed = tree.run("status", "a", env={"BENCH_CONTAINERS": "3"})
+    assert same.returncode == changed.returncode == 0
+    assert same.stdout.count(" Up\n") == 2 and changed.stdout.count(" Up\n") == 3
+    assert tree.run("show", "a", env={"BENCH_CONTAINERS": "3"}).returncode == 0
@@ -0,0 +1,81 @@
+"""The Docker Engine API backend and its fallback to the docker CLI."""
+import shutil
+import tempfile
+
+import pytest
+
+from fake_engine import FakeEngine, refused_socket
+
+
+@pytest.fixture
+def socket_dir():
+    # Unix socket paths are limited to ~100 bytes, too short for pytest's tmp_path.
+    path = tempfile.mkdtemp(prefix="sctl")
+    yield path
+    shutil.rmtree(path, ignore_errors=True)
+
+
+@pytest.fixture
+def service(tree):
+    sc = tree.load()
+    workdir = tree.service_dir("proj")
+
+    def entry(socket_path: str) -> dict:
+        return {"path": str(workdir), "runtime": "docker_compose", "docker_backend": "engine",
+                "env": {"DOCKER_HOST": f"unix://{socket_path}"}}
+
+    return sc, workdir, entry
+
+
+def cli_calls(tree) -> list:
+    return [line for line in tree.spawns() if line.startswith("docker ")]
+
+
+def test_engine_backend_serves_snapshots_without_the_cli(tree, service, socket_dir):
+    sc, workdir, entry = service
+    with FakeEngine(f"{socket_dir}/docker.sock", "proj", str(workdir)) as engine:
+        error, containers, images = sc.compose._compose_records(entry(engine.path))
+        precheck = sc.compose._docker_precheck(entry(engine.path))
+    assert error is None and precheck == 0
+    assert sorted(c.component for c in containers) == ["app0", "app1"]
+    assert {c.image_ref for c in containers} == {"engine/app:1"}
+    assert [img.version for img in images.values()] == ["9.9.9"]
+    assert "GET /_ping" in engine.requests
+    assert cli_calls(tree) == []
+
+
+def test_engine_finds_a_project_named_apart_from_its_directory(tree, service, socket_dir):
+    sc, workdir, entry = service
+    with FakeEngine(f"{socket_dir}/docker.sock", "shop", str(workdir)) as engine:
+        _, renamed, _ = sc.compose._compose_records(entry(engine.path))
+        _, configured, _ = sc.compose._compose_records({**entry(engine.path), "compose_project": "shop"})
+        _, other, _ = sc.compose._compose_records({**entry(engine.path), "compose_project": "proj"})
+    assert sorted(c.component for c in renamed) == ["app0", "app1"]
+    assert sorted(c.component for c in configured) == ["app0", "app1"]
+    assert other == []
+    assert cli_calls(tree) == []
+
+
+def test_engine_connection_refused_falls_back_to_cli(tree, service, socket_dir, capsys):
+    sc, _, entry = service
+    path = refused_socket(f"{socket_dir}/docker.sock")
+    error, containers, _ = sc.compose._compose_records(entry(path))
+    assert error is None
+    assert {c.image_ref for c in containers} == {"repo/svc0:latest", "repo/svc1:latest"}
+    assert "falling back to docker CLI" in capsys.readouterr().err
+    assert any(line.startswith("docker compose") for line in cli_calls(tree))
+    assert sc.compose._docker_precheck(entry(path)) == 0
+
+
+@pytest.mark.parametrize("mode", ["error", "garbage"])
+def test_engine_bad_response_falls_back_to_cli(tree, service, socket_dir, capsys, mode):
+    sc, workdir, entry = service
+    with FakeEngine(f"{socket_dir}/docker.sock", "proj", str(workdir), mode=mode) as engine:
+        error, containers, _ = sc.compose._compose_records(entry(engine.path))
+        local = sc.compose._local_image_ids(entry(engine.path), ["repo/svc0:latest"])
+        precheck = sc.compose._docker_precheck(entry(engine.path))
+    assert error is None and precheck == 0
+    assert {c.image_ref for c in containers} == {"repo/svc0:latest", "repo/svc1:latest"}
+    assert engine.requests, "the engine was not tried first"
+    assert "falling back to docker CLI" in capsys.readouterr().err
+    assert local == {"repo/svc0:latest": "sha256:" + "0" * 64}
@@ -0,0 +1,73 @@
+"""Running commands: bounded output capture, streaming and timeouts."""
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+
+
+def sh(script: str) -> list:
+    return ["/bin/sh", "-c", script]
+
+
+def py(code: str) -> list:
+    return [sys.executable, "-c", code]
+
+
+def test_tail_capture_splits_long_lines(tree):
+    sc = tree.load()
+    result = sc.runner._exec(py("import sys; sys.stdout.write('x' * (1 << 20))"), dict(os.environ), capture=True, tail_lines=4)
+    pieces = result.stdout.splitlines()
+    assert result.returncode == 0
+    assert len(pieces) == 4
+    assert all(len(p) == sc.runner.PIPE_LINE_BYTES for p in pieces)
+
+
+def test_carriage_returns_end_lines_when_streaming(tree, capsys):
+    sc = tree.load()
+    result = sc.runner._exec(sh(r"printf 'pull 10%%\rpull 50%%\rpull 100%%\ndone\n'"), dict(os.environ), stream=True, capture=True, tail_lines=2)
+    assert result.stdout.splitlines() == ["pull 100%", "done"]
+    streamed = [line.split(" ", 1)[1] for line in capsys.readouterr().out.splitlines()]
+    assert streamed == ["pull 10%", "pull 50%", "pull 100%", "done"]
+
+
+def test_full_capture_keeps_long_json_line_whole(tree):
+    sc = tree.load()
+    # Like `pm2 jlist`: one JSON document far longer than PIPE_LINE_BYTES on a single line.
+    code = "import json, sys; json.dump([{'name': f'app{i}', 'env': {'K': 'v' * 512}} for i in range(800)], sys.stdout)"
+    result = sc.runner._exec(py(code), dict(os.environ), capture=True)
+    assert len(result.stdout) > 4 * sc.runner.PIPE_LINE_BYTES
+    assert [app["name"] for app in json.loads(result.stdout)] == [f"app{i}" for i in range(800)]
+
+
+def test_full_queue_stalls_the_command(tree):
+    sc = tree.load()
+    proc = subprocess.Popen(
+        py("for i in range(10**6): print(i)"), stdout=subprocess.PIPE, stderr=subprocess.PIPE, start_new_session=True
+    )
+    lines = queue.Queue(maxsize=8)
+    readers = sc.runner._start_pumps(proc, lines)
+    time.sleep(0.5)
+    try:
+        assert lines.full()
+        assert proc.poll() is None, "the writer should be blocked on the pipe"
+    finally:
+        sc.runner._kill_process_group(proc)
+        sc.runner._drain_lines(lines, readers)
+    assert not any(r.is_alive() for r in readers)
+
+
+def test_timeout_kills_chatty_command_and_releases_readers(tree):
+    sc = tree.load()
+    before = threading.active_count()
+    started = time.monotonic()
+    result = sc.runner._exec(sh("yes"), dict(os.environ), timeout=0.5, capture=True, tail_lines=10)
+    assert result.timed_out and result.returncode == sc.runner.TIMEOUT_EXIT_CODE
+    assert time.monotonic() - started < sc.runner.KILL_GRACE_SECONDS
+    assert len(result.stdout.splitlines()) == 10
+    deadline = time.monotonic() + 2
+    while threading.active_count() > before and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert threading.active_count() == before
@@ -0,0 +1,79 @@
+"""Fleet update/restart: exit code aggregation and depends_on scheduling."""
+
+
+def custom(tree, key: str, cmd: str, depends_on=None) -> dict:
+    entry = {"path": str(tree.service_dir(key)), "runtime": "custom", "actions": {"restart": cmd, "update": cmd}}
+    if depends_on:
+        entry["depends_on"] = depends_on
+    return entry
+
+
+def reported(stdout: str) -> dict:
+    """target -> (result, note) from the [VERSION_REPORT] block."""
+    rows, key = {}, None
+    for line in stdout.splitlines():
+        if line.startswith("- target: "):
+            key = line[len("- target: "):]
+            rows[key] = ["", ""]
+        elif key and line.startswith("  - result: "):
+            rows[key][0] = line[len("  - result: "):]
+        elif key and line.startswith("  - note: "):
+            rows[key][1] = line[len("  - note: "):]
+    return {k: tuple(v) for k, v in rows.items()}
+
+
+def ran(tree, cp) -> list:
+    return sorted(line.split()[0].strip("[]") for line in cp.stdout.splitlines() if "[RUN]" in line)
+
+
+def test_fleet_exit_code_is_the_first_failure_in_target_order(tree):
+    tree.register({"a": custom(tree, "a", "true"), "b": custom(tree, "b", "exit 5"),
+                   "c": custom(tree, "c", "exit 3"), "d": custom(tree, "d", "true")})
+    ok = tree.run("restart", "a", "d")
+    assert ok.returncode == 0, ok.stdout + ok.stderr
+    cp = tree.run("restart", "c", "a", "b", "--jobs", "3")
+    assert cp.returncode == 3
+    assert reported(cp.stdout) == {"c": ("failed (exit 3)", ""), "a": ("success", ""), "b": ("failed (exit 5)", "")}
+    assert "- targets: 3 (success 1, failed 2)" in cp.stdout
+    assert tree.run("restart", "--all").returncode == 5
+
+
+def test_failed_upstream_cancels_its_dependents_transitively(tree):
+    tree.register({
+        "a": custom(tree, "a", "true"),
+        "b": custom(tree, "b", "exit 5"),
+        "d": custom(tree, "d", "touch ran", ["b"]),
+        "e": custom(tree, "e", "touch ran", ["d"]),
+        "f": custom(tree, "f", "true", ["a"]),
+    })
+    cp = tree.run("update", "--all")
+    assert cp.returncode == 5
+    assert "[DAG] wave 1: a, b" in cp.stdout and "[DAG] wave 3: e (after d)" in cp.stdout
+    rows = reported(cp.stdout)
+    assert rows["d"] == ("failed (exit 1)", "cancelled: upstream b failed")
+    assert rows["e"] == ("failed (exit 1)", "cancelled: upstream b failed")
+    assert rows["f"] == ("success", "")
+    assert ran(tree, cp) == ["a", "b", "f"]
+    assert not (tree.service_dir("d") / "ran").exists() and not (tree.service_dir("e") / "ran").exists()
+
+
+def test_dependency_cycle_is_rejected_before_anything_runs(tree):
+    tree.register({
+        "a": custom(tree, "a", "touch ran", ["c"]),
+        "b": custom(tree, "b", "touch ran"),
+        "c": custom(tree, "c", "touch ran", ["a"]),
+    })
+    cp = tree.run("restart", "--all")
+    assert cp.returncode == 2
+    assert "[ERROR] dependency cycle: a -> c -> a" in cp.stderr
+    assert not any((tree.service_dir(k) / "ran").exists() for k in "abc")
+    # Outside the selection depends_on is ignored, so the cycle does not block a single service.
+    assert tree.run("restart", "a").returncode == 0
+
+
+def test_depends_on_resolves_aliases_and_rejects_self(tree):
+    tree.register({"db": dict(custom(tree, "db", "true"), aliases=["postgres"]), "api": custom(tree, "api", "true")})
+    assert tree.run("set", "api", "--depends-on", "postgres").returncode == 0
+    assert tree.load().registry._load_config()["services"]["api"]["depends_on"] == ["db"]
+    cp = tree.run("set", "api", "--depends-on", "api")
+    assert cp.returncode == 2 and "cannot depend on itself" in cp.stderr
@@ -0,0 +1,120 @@
+"""Image garbage collection over the registered compose services."""
+import json
+
+# Containers and images from $GC_STATE; `image rm` refuses images a container uses, as docker does.
+GC_DOCKER = r'''#!/usr/bin/env python3
+import json, os, re, sys
+args = sys.argv[1:]
+path = os.environ["GC_STATE"]
+with open(path) as f:
+    state = json.load(f)
+
+def lookup(obj, expr):
+    m = re.match(r'\(index (\S+) "([^"]+)"\)', expr)
+    value = obj
+    for part in (m.group(1) if m else expr).strip(".").split("."):
+        value = (value or {}).get(part)
+    return (value or {}).get(m.group(2), "") if m else value
+
+def emit(objs, template):
+    for obj in objs:
+        print(re.sub(r"\{\{json (.+?)\}\}", lambda m: json.dumps(lookup(obj, m.group(1))), template))
+
+template = args[args.index("--format") + 1] if "--format" in args else ""
+targets = args[args.index("--format") + 2:] if template else []
+if args[:1] == ["ps"]:
+    for c in state["containers"]:
+        print("\t".join([c["id"], "running", "Up 1 hour", c["project"], c["workdir"]]))
+elif args[:1] == ["inspect"]:
+    emit([{"Id": c["id"], "Name": f"/{c['project']}-app-1", "Image": c["image"],
+           "Config": {"Image": c["ref"], "Labels": {"com.docker.compose.service": "app"}}}
+          for c in state["containers"] if c["id"] in targets], template)
+elif args[:2] == ["image", "inspect"]:
+    emit([{"Id": i, "Size": 1000, "RepoDigests": [], "Config": {"Labels": {}}} for i in targets if i in state["images"]], template)
+elif args[:2] == ["image", "ls"]:
+    for image_id, tags in state["images"].items():
+        for tag in tags or ["<none>:<none>"]:
+            print("\t".join([image_id, *tag.rsplit(":", 1)]))
+elif args[:2] == ["image", "rm"]:
+    rc = 0
+    for ref in args[2:]:
+        image_id = next(i for i, tags in state["images"].items() if ref == i or ref in tags)
+        if any(c["image"] == image_id for c in state["containers"]):
+            print(f"Error response from daemon: conflict: unable to delete {ref} - image is being used", file=sys.stderr)
+            rc = 1
+            continue
+        tags = state["images"][image_id]
+        if ref in tags:
+            tags.remove(ref)
+            print(f"Untagged: {ref}")
+        if not tags:
+            del state["images"][image_id]
+            print(f"Deleted: {image_id}")
+    with open(path, "w") as f:
+        json.dump(state, f)
+    sys.exit(rc)
+'''
+IMG = {name: "sha256:" + name * 64 for name in ["0", "1", "2", "3", "4", "b", "c", "e"]}
+
+
+def test_gc_tolerates_service_without_path(tree):
+    tree.register({"a": {"path": str(tree.service_dir("a"))}, "nopath": {"path": ""}})
+    for args in [("gc", "--dry-run"), ("gc",)]:
+        cp = tree.run(*args)
+        assert "Traceback" not in cp.stderr, cp.stderr
+        assert cp.returncode == 0, cp.stderr
+        assert "[GC] 2 services" in cp.stdout
+
+
+def gc_host(tree):
+    """Service a runs repo/app:4 after four recorded updates from image b (still run by service b) to 4."""
+    a, b = tree.service_dir("a"), tree.service_dir("b")
+    tree.register({"a": {"path": str(a)}, "b": {"path": str(b)}})
+    containers = [
+        {"id": "ca".ljust(64, "0"), "project": "a", "workdir": str(a), "image": IMG["4"], "ref": "repo/app:4"},
+        {"id": "cb".ljust(64, "0"), "project": "b", "workdir": str(b), "image": IMG["b"], "ref": "repo/app:b"},
+        # A compose project that is not registered at all.
+        {"id": "cc".ljust(64, "0"), "project": "c", "workdir": "/elsewhere/c", "image": IMG["c"], "ref": "repo/app:c"},
+    ]
+    images = {IMG[n]: [f"repo/app:{n}"] for n in "01234bc"}
+    images[IMG["e"]] = ["other/lib:1"]
+    images["sha256:" + "f" * 64] = []
+    (tree.root / "gc.json").write_text(json.dumps({"containers": containers, "images": images}), encoding="utf-8")
+    tree.write_bin("docker", GC_DOCKER)
+
+    sc = tree.load()
+    store = sc.history._history_store()
+
+    def snap(n):
+        comp = {"container": "a-app-1", "container_id": f"a{n}".ljust(64, "0"), "image_ref": f"repo/app:{n}", "image_id": IMG[n]}
+        return {"runtime": "docker_compose", "runtime_snapshot": {"ok": True, "components": {"app": comp}}}
+
+    for before, after in zip("b123", "1234"):
+        store.record_deployment("a", "update", "docker_compose", 1.0, 2.0, 0, "", snap(before), snap(after))
+    return {"GC_STATE": str(tree.root / "gc.json")}
+
+
+def remaining(tree):
+    return {tags[0] if tags else image_id for image_id, tags in json.loads((tree.root / "gc.json").read_text())["images"].items()}
+
+
+def test_gc_keeps_running_and_recent_previous_images(tree):
+    env = gc_host(tree)
+    dry = tree.run("gc", "--keep", "2", "--dry-run", env=env)
+    assert dry.returncode == 0, dry.stdout + dry.stderr
+    assert "3 images in use, 2 previous kept (up to 2 per component), 2 to remove" in dry.stdout
+    assert len(remaining(tree)) == 9
+
+    cp = tree.run("gc", "--keep", "2", env=env)
+    assert cp.returncode == 0, cp.stdout + cp.stderr
+    assert "[GC] removed 2 of 2 images" in cp.stdout
+    assert remaining(tree) == {"repo/app:2", "repo/app:3", "repo/app:4", "repo/app:b", "repo/app:c", "other/lib:1", "sha256:" + "f" * 64}
+
+
+def test_gc_never_removes_an_image_another_service_runs(tree):
+    env = gc_host(tree)
+    cp = tree.run("gc", "--keep", "0", env=env)
+    assert cp.returncode == 0, cp.stdout + cp.stderr
+    assert "[GC] removed 4 of 4 images" in cp.stdout
+    assert "kept:" not in cp.stdout
+    assert remaining(tree) == {"repo/app:4", "repo/app:b", "repo/app:c", "other/lib:1", "sha256:" + "f" * 64}
@@ -0,0 +1,85 @@
+"""Projected `docker inspect --format` rows: only the snapshot fields, decoded line by line."""
+import json
+
+# Objects from $INSPECT_OBJECTS (id -> inspect object); ids it does not know fail as with docker.
+# Every call's argv is appended to $INSPECT_ARGV.
+INSPECT_DOCKER = r'''#!/usr/bin/env python3
+import json, os, re, sys
+args = sys.argv[1:]
+with open(os.environ["INSPECT_ARGV"], "a") as f:
+    f.write(json.dumps(args) + "\n")
+objects = json.loads(os.environ["INSPECT_OBJECTS"])
+
+def lookup(obj, expr):
+    m = re.match(r'\(index (\S+) "([^"]+)"\)', expr)
+    value = obj
+    for part in (m.group(1) if m else expr).strip(".").split("."):
+        value = (value or {}).get(part)
+    return (value or {}).get(m.group(2)) if m else value
+
+template = args[args.index("--format") + 1]
+missing = False
+for oid in args[args.index("--format") + 2:]:
+    if oid not in objects:
+        print(f"Error: No such object: {oid}", file=sys.stderr)
+        missing = True
+        continue
+    print(re.sub(r"\{\{json (.+?)\}\}", lambda m: json.dumps(lookup(objects[oid], m.group(1))), template))
+sys.exit(1 if missing else 0)
+'''
+
+
+def container(n, **labels):
+    return {"Id": f"c{n}", "Name": f"/proj-app-{n}", "Image": f"sha256:{n}", "Config": {"Image": "repo/app:1", "Labels": labels or None,
+            "Env": ["SECRET=x"]}, "Mounts": [{"Source": "/data"}]}
+
+
+def inspect_tree(tree, monkeypatch, objects):
+    tree.write_bin("docker", INSPECT_DOCKER)
+    monkeypatch.setenv("INSPECT_OBJECTS", json.dumps(objects))
+    monkeypatch.setenv("INSPECT_ARGV", str(tree.root / "argv.log"))
+    return tree.load()
+
+
+def calls(tree):
+    return [json.loads(line) for line in (tree.root / "argv.log").read_text().splitlines()]
+
+
+def test_container_rows_hold_only_the_snapshot_fields(tree, monkeypatch):
+    objects = {"c1": container(1, **{"com.docker.compose.service": "web\tfront"}), "c2": container(2)}
+    sc = inspect_tree(tree, monkeypatch, objects)
+    error, rows = sc.compose._inspect_projected({"path": "/"}, "docker inspect", sc.compose.CONTAINER_INSPECT_FORMAT, ["c1", "c2"])
+    assert error is None
+    assert rows == [["c1", "/proj-app-1", "repo/app:1", "sha256:1", "web\tfront"], ["c2", "/proj-app-2", "repo/app:1", "sha256:2", None]]
+    records = [sc.compose._ContainerRecord.from_fields(*row) for row in rows]
+    assert [r.row() for r in records] == [("c1", "proj-app-1", "web\tfront", "repo/app:1", "sha256:1"),
+                                          ("c2", "proj-app-2", "proj-app-2", "repo/app:1", "sha256:2")]
+    (argv,) = calls(tree)
+    assert argv[:3] == ["inspect", "--format", sc.compose.CONTAINER_INSPECT_FORMAT]
+
+
+def test_image_rows_keep_every_repo_digest_and_fall_back_to_the_schema_label(tree, monkeypatch):
+    objects = {
+        "sha256:1": {"Id": "sha256:1", "RepoDigests": ["repo/app@sha256:a", "mirror/app@sha256:b"],
+                     "Config": {"Labels": {"org.label-schema.version": "3.2", "org.opencontainers.image.revision": "f00d"}}},
+        "sha256:2": {"Id": "sha256:2", "RepoDigests": None, "Config": {"Labels": None}},
+    }
+    sc = inspect_tree(tree, monkeypatch, objects)
+    error, rows = sc.compose._inspect_projected({"path": "/"}, "docker image inspect", sc.compose.IMAGE_INSPECT_FORMAT, list(objects))
+    assert error is None
+    images = [sc.compose._ImageRecord.from_fields(*row) for row in rows]
+    assert images[0].row() == ("sha256:1", "3.2", "repo/app@sha256:a mirror/app@sha256:b", "f00d")
+    assert images[0].digest_for("mirror/app:3") == "sha256:b"
+    assert images[1].row() == ("sha256:2", "", "", "")
+
+
+def test_vanished_objects_drop_their_row_and_batches_split(tree, monkeypatch):
+    sc = inspect_tree(tree, monkeypatch, {f"c{n}": container(n) for n in range(1, 4)})
+    monkeypatch.setattr(sc.compose, "INSPECT_BATCH", 2)
+    error, rows = sc.compose._inspect_projected({"path": "/"}, "docker inspect", sc.compose.CONTAINER_INSPECT_FORMAT, ["c1", "gone", "c2", "c3"])
+    assert error is None
+    assert [row[0] for row in rows] == ["c1", "c2", "c3"]
+    assert [argv[3:] for argv in calls(tree)] == [["c1", "gone"], ["c2", "c3"]]
+
+    error, rows = sc.compose._inspect_projected({"path": "/"}, "docker inspect", sc.compose.CONTAINER_INSPECT_FORMAT, ["gone"])
+    assert error == "Error: No such object: gone" and rows == []
@@ -0,0 +1,74 @@
+"""logs: one `docker logs` per container, merged by timestamp."""
+import pytest
+
+# Serves `docker logs ... <id>` from logs/<id> next to bin/; everything else goes to the benchmark fake.
+LOGS_DOCKER = """#!/bin/sh
+if [ "$1" = logs ]; then
+    echo "docker logs" >> "$BENCH_SPAWN_LOG"
+    for id; do :; done
+    exec cat "$(dirname "$0")/../logs/$id"
+fi
+exec "$(dirname "$0")/docker-real" "$@"
+"""
+
+
+def ts(second: int, frac: int = 0) -> str:
+    return f"2026-01-01T00:{second // 60:02d}:{second % 60:02d}.{frac:09d}Z"
+
+
+@pytest.fixture
+def logs_tree(tree):
+    tree.register({key: {"path": str(tree.service_dir(key))} for key in ["api", "web"]})
+    (tree.bin / "docker").rename(tree.bin / "docker-real")
+    tree.write_bin("docker", LOGS_DOCKER)
+    (tree.root / "logs").mkdir()
+
+    def write(project: str, index: int, lines: list) -> None:
+        container_id = f"{project}-{index}".ljust(64, "0")
+        (tree.root / "logs" / container_id).write_text("".join(f"{line}\n" for line in lines), encoding="utf-8")
+
+    return write
+
+
+def merged(stdout: str) -> list:
+    """(container, timestamp, message) per output line `[service] container | ts message`."""
+    rows = []
+    for line in stdout.splitlines():
+        head, _, rest = line.partition(" | ")
+        stamp, _, message = rest.partition(" ")
+        rows.append((head.split()[1], stamp, message))
+    return rows
+
+
+def test_logs_merge_containers_in_timestamp_order(tree, logs_tree):
+    # Four streams interleaved a line at a time, each far longer than the per-stream buffer.
+    count = 1000
+    for s, (project, index) in enumerate([("api", 0), ("api", 1), ("web", 0), ("web", 1)]):
+        logs_tree(project, index, [f"{ts(i // 10, (i % 10) * 100 + s)} {project}{index} line {i}" for i in range(count)])
+    cp = tree.run("logs", "--all")
+    assert cp.returncode == 0, cp.stderr
+    rows = merged(cp.stdout)
+    assert len(rows) == 4 * count
+    assert [stamp for _, stamp, _ in rows] == sorted(stamp for _, stamp, _ in rows)
+    assert rows[:4] == [
+        ("api-svc0-1", ts(0, 0), "api0 line 0"),
+        ("api-svc1-1", ts(0, 1), "api1 line 0"),
+        ("web-svc0-1", ts(0, 2), "web0 line 0"),
+        ("web-svc1-1", ts(0, 3), "web1 line 0"),
+    ]
+    assert sum(1 for line in tree.spawns() if line == "docker logs") == 4
+
+
+def test_logs_keep_untimestamped_lines_in_place_and_grep(tree, logs_tree):
+    logs_tree("api", 0, [f"{ts(1)} boot", "Error response from daemon: log driver gone", f"{ts(4)} ready"])
+    logs_tree("api", 1, [f"{ts(2)} boot", f"{ts(3)} ready"])
+    logs_tree("web", 0, [f"{ts(0)} boot"])
+    logs_tree("web", 1, [])
+    cp = tree.run("logs", "--all")
+    assert cp.returncode == 0, cp.stderr
+    assert [message for _, _, message in merged(cp.stdout)] == [
+        "boot", "boot", "Error response from daemon: log driver gone", "boot", "ready", "ready"
+    ]
+    assert [c for c, _, _ in merged(cp.stdout)][:3] == ["web-svc0-1", "api-svc0-1", "api-svc0-1"]
+    ready = tree.run("logs", "api", "--grep", "^rea")
+    assert [(c, m) for c, _, m in merged(ready.stdout)] == [("api-svc1-1", "ready"), ("api-svc0-1", "ready")]
@@ -0,0 +1,91 @@
+"""systemd and pm2 services: `systemctl show` / `pm2 jlist` parsing and one state query per runtime and environment."""
+import json
+
+UNITS = {
+    "web.service": {"LoadState": "loaded", "ActiveState": "active", "SubState": "running", "MainPID": "42",
+                    "ExecMainStartTimestamp": "Mon 2026-10-12 09:00:00 UTC", "InvocationID": "abc", "NeedDaemonReload": "yes"},
+    "db.service": {"LoadState": "loaded", "ActiveState": "failed", "SubState": "failed", "MainPID": "0", "InvocationID": "def"},
+}
+
+# Property blocks for $NATIVE_UNITS in argument order; units it does not know are not-found, as with systemctl.
+SYSTEMCTL = r'''#!/usr/bin/env python3
+import json, os, sys
+with open(os.environ["BENCH_SPAWN_LOG"], "a") as f:
+    f.write("systemctl " + sys.argv[1] + "\n")
+units = json.loads(os.environ["NATIVE_UNITS"])
+names = sys.argv[sys.argv.index("--") + 1:]
+print("\n\n".join("\n".join(f"{k}={v}" for k, v in dict({"Id": n, "LoadState": "not-found"}, **units.get(n, {})).items())
+                  for n in names))
+'''
+
+PROCS = [
+    {"name": "api", "pm_id": 0, "pid": 100, "pm2_env": {"status": "online", "pm_exec_path": "/srv/api/index.js", "version": "2.1.0",
+                                                        "versioning": {"revision": "f00d"}, "pm_uptime": 1760000000000, "restart_time": 3}},
+    {"name": "api", "pm_id": 1, "pid": 101, "pm2_env": {"status": "online", "pm_exec_path": "/srv/api/index.js", "version": "2.1.0"}},
+    {"name": "worker", "pm_id": 2, "pid": 0, "pm2_env": {"status": "stopped", "pm_exec_path": "/srv/worker.js", "version": "N/A"}},
+]
+
+# `pm2 jlist` with the daemon notices pm2 prints around the JSON document.
+PM2 = r'''#!/bin/sh
+echo "pm2 $1 ${PM2_HOME:-default}" >> "$BENCH_SPAWN_LOG"
+echo ">>>> In-memory PM2 is out-of-date, do:"
+printf '%s\n' "$NATIVE_PROCS"
+echo ">>>> pm2 update"
+'''
+
+
+def native_tree(tree):
+    tree.write_bin("systemctl", SYSTEMCTL)
+    tree.write_bin("pm2", PM2)
+    return {"NATIVE_UNITS": json.dumps(UNITS), "NATIVE_PROCS": json.dumps(PROCS)}
+
+
+def test_systemd_show_blocks_become_components(tree, monkeypatch):
+    for key, value in native_tree(tree).items():
+        monkeypatch.setenv(key, value)
+    sc = tree.load()
+    error, comps = sc.native._systemd_components({"path": "/"}, ["web.service", "db.service", "gone.service"])
+    assert error is None
+    assert list(comps) == ["web.service", "db.service", "gone.service"]
+    assert comps["web.service"]["state"] == "active (running)" and comps["web.service"]["running"]
+    assert comps["web.service"]["container_id"] == "web.service@abc"
+    assert sc.native._native_state_text(comps["web.service"]) == (
+        "active (running), pid 42, since Mon 2026-10-12 09:00:00 UTC, unit file changed, daemon-reload pending"
+    )
+    assert comps["db.service"]["state"] == "failed (failed)" and not comps["db.service"]["running"]
+    assert comps["gone.service"]["state"] == "not-found" and comps["gone.service"]["container_id"] == ""
+
+
+def test_pm2_jlist_keys_cluster_instances_and_missing_processes(tree, monkeypatch):
+    for key, value in native_tree(tree).items():
+        monkeypatch.setenv(key, value)
+    sc = tree.load()
+    error, comps = sc.native._pm2_components({"path": "/"}, ["api", "worker", "mailer"])
+    assert error is None
+    assert list(comps) == ["api#0", "api#1", "worker", "mailer"]
+    assert comps["api#0"]["version"] == "2.1.0" and comps["api#0"]["revision"] == "f00d"
+    assert comps["api#0"]["restarts"] == "3" and comps["api#0"]["running"]
+    assert comps["worker"]["version"] == "" and comps["worker"]["state"] == "stopped"
+    assert comps["mailer"]["state"] == "not-found" and not comps["mailer"]["running"]
+
+    error, _ = sc.native._pm2_components({"path": "/", "env": {"NATIVE_PROCS": "[{"}}, ["api"])
+    assert error.startswith("pm2 jlist returned invalid JSON")
+
+
+def test_status_runs_one_query_per_runtime_and_environment(tree):
+    env = native_tree(tree)
+    tree.register({
+        "site": {"path": "", "runtime": "systemd", "units": ["web.service"]},
+        "store": {"path": "", "runtime": "systemd", "units": ["db.service"]},
+        "api": {"path": "", "runtime": "pm2", "units": ["api"]},
+        "jobs": {"path": "", "runtime": "pm2", "units": ["worker"]},
+        "ops": {"path": "", "runtime": "pm2", "units": ["api"], "env": {"PM2_HOME": "/srv/ops/.pm2"}},
+    })
+    cp = tree.run("status", "--all", env=env)
+    assert cp.returncode == 3, cp.stdout + cp.stderr
+    assert sorted(tree.spawns()) == ["pm2 jlist /srv/ops/.pm2", "pm2 jlist default", "systemctl show"]
+    assert "[STATUS] site web.service: active (running), pid 42" in cp.stdout
+    assert "[STATUS] store db.service: failed (failed)" in cp.stdout
+    assert "[STATUS] api api#1: online, pid 101" in cp.stdout
+    assert "[STATUS] jobs worker: stopped" in cp.stdout
+    assert "[STATUS] ops api#0: online" in cp.stdout
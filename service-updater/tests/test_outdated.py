@@ -0,0 +1,127 @@
+"""Registry digests of compose components and the `outdated` command."""
+import pytest
+
+from fake_registry import FakeRegistry
+
+
+def test_component_digest_follows_image_ref_repository(tree):
+    sc = tree.load()
+    image = sc.compose._ImageRecord.from_fields(
+        "sha256:" + "1" * 64, ["mirror.local/x/app@sha256:aaa", "ghcr.io/x/app@sha256:bbb"], "", "", ""
+    )
+    assert image.digest_for("ghcr.io/x/app:2") == "sha256:bbb"
+    assert image.digest_for("mirror.local/x/app:2") == "sha256:aaa"
+    assert image.digest_for("docker.io/other:1") == ""
+    assert sc.compose._ref_digest("postgres:16", "docker.io/library/postgres@sha256:ccc") == "sha256:ccc"
+
+
+def test_history_store_keeps_every_repo_digest(tree):
+    sc = tree.load()
+    image_id = "sha256:" + "2" * 64
+    store = sc.history._history_store()
+    # A row as written before every RepoDigests entry was kept: one bare digest of whichever repo came first.
+    store._write(lambda cur: cur.execute("INSERT INTO images VALUES (?, '', 'sha256:aaa', '', 0)", (image_id,)))
+    assert store.images([image_id]) == {}
+
+    fresh = sc.compose._ImageRecord.from_fields(image_id, ["mirror.local/x/app@sha256:aaa", "ghcr.io/x/app@sha256:bbb"], "1.0", "", "")
+    store.refresh_images([fresh])
+    stored = store.images([image_id])[image_id]
+    assert stored.digest_for("ghcr.io/x/app:2") == "sha256:bbb"
+
+    container = sc.compose._ContainerRecord("c" * 64, "app-1", "app", "ghcr.io/x/app:2", image_id)
+    snap = {"runtime": "docker_compose",
+            "runtime_snapshot": {"ok": True, "components": sc.compose._compose_components([container], {image_id: stored})}}
+    store.record_deployment("app", "update", "docker_compose", 1.0, 2.0, 0, "", snap, snap)
+    (deployment,) = store.deployments("app", 1)
+    assert deployment["after"]["runtime_snapshot"]["components"]["app"]["digest"] == "sha256:bbb"
+
+
+CURRENT = "sha256:" + "d" * 64
+NEWER = "sha256:" + "e" * 64
+
+
+def component(ref: str, digest: str) -> dict:
+    return {"container": "c", "container_id": "", "image_ref": ref, "image_id": "sha256:" + "1" * 64,
+            "version": "", "digest": digest, "revision": ""}
+
+
+@pytest.fixture
+def outdated(tree, monkeypatch):
+    """Run _run_outdated over {service: {component: (image_ref, local digest)}}; returns its exit code."""
+    sc = tree.load()
+    monkeypatch.setenv("HOME", str(tree.root))
+
+    def run(services: dict, cache_ttl: float = 0) -> int:
+        snaps = {key: {"mode": "docker_compose", "ok": True, "components": {name: component(*c) for name, c in comps.items()}}
+                 for key, comps in services.items()}
+        monkeypatch.setattr(sc.outdated, "_docker_compose_version_snapshot", lambda entry: snaps[entry["path"]])
+        return sc.outdated._run_outdated([(key, {"path": key}) for key in services], 4, cache_ttl, False)
+
+    return run
+
+
+def test_outdated_reports_digest_match_and_mismatch(outdated, capsys):
+    with FakeRegistry({"app/web:1": CURRENT, "app/api:1": NEWER}) as reg:
+        rc = outdated({
+            "web": {"web": (f"{reg.host}/app/web:1", CURRENT)},
+            "api": {"api": (f"{reg.host}/app/api:1", CURRENT), "web": (f"{reg.host}/app/web:1", CURRENT)},
+        })
+    out = capsys.readouterr().out
+    assert rc == 0
+    assert "[UP_TO_DATE] web: 1 components" in out
+    assert "[OUTDATED] api: 1 of 2 components would change" in out
+    assert "[OUTDATED_SUMMARY] 1 of 2 services would change: api" in out
+    # One HEAD per unique tag, not per component.
+    assert sorted(reg.paths("/v2/")) == ["HEAD /v2/app/api/manifests/1", "HEAD /v2/app/web/manifests/1"]
+
+
+def test_outdated_answers_bearer_challenge_once_per_repository(outdated, capsys):
+    with FakeRegistry({"app/web:1": CURRENT, "app/web:2": CURRENT}, auth=True) as reg:
+        rc = outdated({"web": {"a": (f"{reg.host}/app/web:1", CURRENT), "b": (f"{reg.host}/app/web:2", CURRENT)}})
+    assert rc == 0
+    assert "[UP_TO_DATE] web: 2 components" in capsys.readouterr().out
+    tokens = reg.paths("/token")
+    assert 1 <= len(tokens) <= 2 and all("scope=repository%3Aapp%2Fweb%3Apull" in t for t in tokens)
+    assert len(reg.paths("/v2/")) <= 4
+
+
+def test_outdated_reuses_connections_per_host(tree, monkeypatch):
+    sc = tree.load()
+    monkeypatch.setenv("HOME", str(tree.root))
+    with FakeRegistry({f"app/svc{i}:1": CURRENT for i in range(20)}) as reg:
+        keys = {f"{reg.host}/app/svc{i}:1": (reg.host, f"app/svc{i}", "1") for i in range(20)}
+        lookup = sc.outdated._registry_digests(keys, 8, 0)
+    assert lookup["errors"] == {}
+    assert set(lookup["digests"].values()) == {CURRENT}
+    assert lookup["connections"] <= sc.outdated.REGISTRY_HOST_CONNECTIONS
+    assert reg.connections <= sc.outdated.REGISTRY_HOST_CONNECTIONS
+    assert len(reg.requests) == 20
+
+
+def test_outdated_skips_refs_pinned_by_digest(outdated, capsys):
+    with FakeRegistry({}) as reg:
+        rc = outdated({"db": {"db": (f"{reg.host}/app/db@{CURRENT}", CURRENT)}})
+    out = capsys.readouterr().out
+    assert rc == 0
+    assert "db: unknown:" in out and "pinned by digest" in out
+    assert reg.requests == []
+
+
+def test_outdated_reports_lookup_errors(outdated, capsys):
+    with FakeRegistry({}) as reg:
+        rc = outdated({"web": {"web": (f"{reg.host}/app/missing:1", CURRENT)}})
+    assert rc == 1
+    assert "[UNKNOWN] web: registry lookup failed" in capsys.readouterr().out
+
+
+def test_outdated_serves_repeat_lookups_from_cache(outdated, capsys):
+    with FakeRegistry({"app/web:1": CURRENT, "app/api:1": CURRENT}) as reg:
+        outdated({"web": {"web": (f"{reg.host}/app/web:1", CURRENT)}, "api": {"api": (f"{reg.host}/app/api:1", CURRENT)}}, cache_ttl=300)
+        outdated({"web": {"web": (f"{reg.host}/app/web:1", CURRENT)}}, cache_ttl=300)
+        assert len(reg.paths("/v2/")) == 2
+        assert "registry: 1 refs, 1 cached" in capsys.readouterr().out
+        # A narrower run after a wider one still saves what it fetched.
+        reg.manifests["app/new:1"] = CURRENT
+        outdated({"new": {"new": (f"{reg.host}/app/new:1", CURRENT)}}, cache_ttl=300)
+        outdated({"new": {"new": (f"{reg.host}/app/new:1", CURRENT)}}, cache_ttl=300)
+        assert len(reg.paths("/v2/")) == 3
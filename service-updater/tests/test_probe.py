@@ -0,0 +1,55 @@
+"""Health probes: one event loop, per-probe timeouts, and connections closed before the loop ends."""
+import gc
+import socket
+import threading
+import warnings
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class Status(BaseHTTPRequestHandler):
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        self.send_response(204 if self.path == "/ready" else 503)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+def test_probes_report_status_timeout_and_refusal(tree, capsys):
+    sc = tree.load()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Status)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    silent = socket.socket()
+    silent.bind(("127.0.0.1", 0))
+    silent.listen()
+    closed = socket.socket()
+    closed.bind(("127.0.0.1", 0))
+    port, silent_port, closed_port = server.server_address[1], silent.getsockname()[1], closed.getsockname()[1]
+    closed.close()
+    specs = [
+        f"ready=http://127.0.0.1:{port}/ready status=204",
+        f"down=http://127.0.0.1:{port}/down",
+        f"hang=http://127.0.0.1:{silent_port}/ timeout=0.3",
+        f"gone=tcp://127.0.0.1:{closed_port}",
+        f"port=tcp://127.0.0.1:{port}",
+    ]
+    entry = {"probes": [sc.probes._parse_probe_spec(spec)[1] for spec in specs]}
+    try:
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always", ResourceWarning)
+            rc = sc.probes._run_probe_health([("web", entry)], 1, False)
+            gc.collect()
+    finally:
+        server.shutdown()
+        server.server_close()
+        silent.close()
+    out = capsys.readouterr().out
+    assert rc == 1
+    assert "- ready: ok HTTP 204" in out
+    assert "- down: failed HTTP 503 (expected 200)" in out
+    assert "- hang: failed timeout after 0.3s" in out
+    assert "- gone: failed" in out
+    assert "- port: ok connected" in out
+    assert "2 ok, 3 failed" in out
+    assert not [w for w in caught if issubclass(w.category, ResourceWarning)]
@@ -0,0 +1,103 @@
+"""Registry writes: per-service compare-and-swap under concurrent `set`, and sharded single-service writes."""
+import os
+
+import pytest
+
+
+def concurrent_sets(tree, count: int) -> None:
+    procs = [tree.popen("set", "web", "--tag", f"t{i}", "--env", f"K{i}=v{i}") for i in range(count)]
+    assert [p.wait(timeout=60) for p in procs] == [0] * count
+
+
+@pytest.mark.parametrize("sharded", [False, True])
+def test_concurrent_set_keeps_every_write(tree, sharded):
+    tree.register({"web": {"path": str(tree.service_dir("web"))}, "db": {"path": str(tree.service_dir("db"))}})
+    if sharded:
+        assert tree.run("migrate").returncode == 0
+    concurrent_sets(tree, 8)
+    sc = tree.load()
+    services = sc.registry._load_config()["services"]
+    assert services["web"]["tags"] == sorted(f"t{i}" for i in range(8))
+    assert services["web"]["env"] == {f"K{i}": f"v{i}" for i in range(8)}
+    assert set(services) == {"web", "db"}
+
+
+def test_sharded_set_and_remove_read_only_their_shard(tree):
+    tree.register({f"svc{i}": {"path": str(tree.service_dir(f"svc{i}"))} for i in range(5)})
+    assert tree.run("migrate").returncode == 0
+    sc = tree.load()
+    assert sc.registry._load_config()["services"]["svc1"].get("tags") is None
+
+    def whole_registry():
+        raise AssertionError("read every shard for a single-service write")
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(sc.registry, "_read_shards", whole_registry)
+        mp.setattr(sc.registry, "_read_registry_snapshot", whole_registry)
+        assert sc.cli.cmd_set(sc.cli.build_parser().parse_args(["set", "svc1", "--tag", "edge"])) == 0
+        assert sc.cli.cmd_remove(sc.cli.build_parser().parse_args(["remove", "svc2"])) == 0
+
+    services = sc.registry._load_config()["services"]
+    assert services["svc1"]["tags"] == ["edge"]
+    assert "svc2" not in services and len(services) == 4
+
+
+def test_sharded_write_invalidates_snapshot(tree):
+    tree.register({"web": {"path": str(tree.service_dir("web"))}})
+    assert tree.run("migrate").returncode == 0
+    assert tree.run("list").returncode == 0
+    sc = tree.load()
+    assert sc.registry._read_registry_snapshot() is not None
+    assert tree.run("set", "web", "--alias", "frontend").returncode == 0
+    assert sc.registry._read_registry_snapshot() is None
+    show = tree.run("show", "frontend")
+    assert show.returncode == 0 and '"frontend"' in show.stdout
+
+
+def test_snapshot_never_outlives_a_concurrent_shard_write(tree):
+    tree.register({"web": {"path": str(tree.service_dir("web"))}})
+    assert tree.run("migrate").returncode == 0
+    sc = tree.load()
+    registry_lock = sc.registry._registry_lock
+
+    def write_in_between(path, wait=True):
+        # Another process writes after this reader's shard reads, within the same mtime tick.
+        watched = [sc.registry._registry_index_path(), sc.registry.REGISTRY_DIR]
+        before = [os.stat(p) for p in watched]
+        assert tree.run("set", "web", "--alias", "frontend").returncode == 0
+        for p, st in zip(watched, before):
+            os.utime(p, ns=(st.st_atime_ns, st.st_mtime_ns))
+        return registry_lock(path, wait)
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(sc.registry, "_registry_lock", write_in_between)
+        stale, _ = sc.registry._read_shards()
+    assert stale["services"]["web"].get("aliases") is None
+    assert sc.registry._read_registry_snapshot() is None
+    assert sc.registry._load_config()["services"]["web"]["aliases"] == ["frontend"]
+
+    sc.registry._drop_registry_snapshot()
+    with sc.registry._registry_lock(os.path.join(sc.registry.REGISTRY_DIR, sc.registry.REGISTRY_LOCK_NAME)):
+        sc.registry._read_shards()
+        assert sc.registry._read_registry_snapshot() is None, "snapshot written while a writer held the lock"
+    sc.registry._read_shards()
+    assert sc.registry._read_registry_snapshot() is not None
+
+
+def test_resolve_sees_alias_edits_that_keep_the_service_count(tree):
+    tree.register({"web": {"path": "/srv/web", "aliases": ["front"]}, "db": {"path": "/srv/db"}})
+    sc = tree.load()
+    data = sc.registry._load_config()
+    services = data["services"]
+    assert sc.registry._resolve_service(services, "front")[0] == "web"
+
+    services["web"]["aliases"] = ["edge"]
+    sc.registry._save_config(data)
+    assert sc.registry._resolve_service(services, "edge")[0] == "web"
+    with pytest.raises(KeyError):
+        sc.registry._resolve_service(services, "front")
+
+    local = {"api": {"aliases": ["gateway"]}}
+    assert sc.registry._resolve_service(local, "gateway")[0] == "api"
+    local["api"]["aliases"] = ["ingress"]
+    assert sc.registry._resolve_service(local, "ingress")[0] == "api"
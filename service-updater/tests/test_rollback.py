@@ -0,0 +1,143 @@
+"""rollback: choosing the recorded pre-deployment images and re-tagging them without a pull."""
+import json
+
+# Local tags and running containers from $ROLLBACK_STATE: `compose pull` moves the tags to
+# state["pulls"], `tag` moves one back, and `compose up` recreates containers whose tag moved.
+# Every call's argv is appended to $ROLLBACK_ARGV.
+ROLLBACK_DOCKER = r'''#!/usr/bin/env python3
+import json, os, re, sys
+args = sys.argv[1:]
+with open(os.environ["ROLLBACK_ARGV"], "a") as f:
+    f.write(json.dumps(args) + "\n")
+path = os.environ["ROLLBACK_STATE"]
+with open(path) as f:
+    state = json.load(f)
+tags, containers = state["tags"], state["containers"]
+
+def lookup(obj, expr):
+    m = re.match(r'\(index (\S+) "([^"]+)"\)', expr)
+    value = obj
+    for part in (m.group(1) if m else expr).strip(".").split("."):
+        value = (value or {}).get(part)
+    return (value or {}).get(m.group(2), "") if m else value
+
+def emit(objs, template):
+    for obj in objs:
+        print(re.sub(r"\{\{json (.+?)\}\}", lambda m: json.dumps(lookup(obj, m.group(1))), template))
+
+template = args[args.index("--format") + 1] if "--format" in args else ""
+targets = [a for a in args[1 + (args[0] == "image"):] if a not in ("--format", template)]
+if args[:3] == ["compose", "ps", "-q"]:
+    for c in containers.values():
+        print(c["id"])
+elif args[:1] == ["inspect"]:
+    emit([{"Id": c["id"], "Name": f"/a-{name}-1", "Image": c["image"],
+           "Config": {"Image": c["ref"], "Labels": {"com.docker.compose.service": name}}}
+          for name, c in containers.items() if c["id"] in targets], template)
+elif args[:2] == ["image", "inspect"]:
+    found = [tags.get(t, t) for t in targets if tags.get(t, t) in state["images"]]
+    if template == "{{.Id}}":
+        print("\n".join(found))
+    else:
+        emit([{"Id": i, "RepoDigests": [], "Config": {"Labels": {}}} for i in found], template)
+    sys.exit(0 if len(found) == len(targets) else 1)
+elif args[:2] == ["compose", "pull"]:
+    tags.update(state["pulls"])
+elif args[:1] == ["tag"]:
+    tags[args[2]] = args[1]
+elif args[:2] == ["compose", "up"]:
+    named = [a for a in args[2:] if not a.startswith("-") and a != "never"]
+    for name, c in containers.items():
+        if (not named or name in named) and c["image"] != tags[c["ref"]]:
+            state["created"] += 1
+            c.update(image=tags[c["ref"]], id=f"{name}-{state['created']}".ljust(64, "0"))
+with open(path, "w") as f:
+    json.dump(state, f)
+'''
+
+IMG = {n: "sha256:" + str(n) * 64 for n in range(1, 4)}
+DB = "sha256:" + "d" * 64
+
+
+class Host:
+    def __init__(self, tree):
+        self.tree = tree
+        self.path = tree.root / "rollback.json"
+        containers = {"app": {"ref": "repo/app:1", "image": IMG[1]}, "db": {"ref": "repo/db:1", "image": DB}}
+        for name, c in containers.items():
+            c["id"] = f"{name}-0".ljust(64, "0")
+        self.save({"tags": {"repo/app:1": IMG[1], "repo/db:1": DB}, "images": [*IMG.values(), DB],
+                   "containers": containers, "pulls": {}, "created": 0})
+        tree.write_bin("docker", ROLLBACK_DOCKER)
+        tree.register({"a": {"path": str(tree.service_dir("a"))}})
+        self.env = {"ROLLBACK_STATE": str(self.path), "ROLLBACK_ARGV": str(tree.root / "argv.log")}
+
+    def load(self):
+        return json.loads(self.path.read_text())
+
+    def save(self, state):
+        self.path.write_text(json.dumps(state), encoding="utf-8")
+
+    def update_to(self, image):
+        state = self.load()
+        state["pulls"] = {"repo/app:1": image}
+        self.save(state)
+        cp = self.tree.run("update", "a", env=self.env)
+        assert cp.returncode == 0, cp.stdout + cp.stderr
+
+    def run(self, *args):
+        return self.tree.run(*args, env=self.env)
+
+    def running(self):
+        return {name: c["image"] for name, c in self.load()["containers"].items()}
+
+    def calls(self, command):
+        lines = (self.tree.root / "argv.log").read_text().splitlines()
+        return [args for args in map(json.loads, lines) if args[:len(command)] == command]
+
+
+def test_rollback_restores_the_images_before_the_latest_update(tree):
+    host = Host(tree)
+    host.update_to(IMG[2])
+    host.update_to(IMG[3])
+    assert host.running() == {"app": IMG[3], "db": DB}
+
+    cp = host.run("rollback", "a")
+    assert cp.returncode == 0, cp.stdout + cp.stderr
+    assert "[ROLLBACK] restoring the images in use before #2 (update at" in cp.stdout
+    assert host.running() == {"app": IMG[2], "db": DB}
+    assert host.load()["tags"]["repo/app:1"] == IMG[2]
+    assert host.calls(["tag"]) == [["tag", IMG[2], "repo/app:1"]]
+    assert host.calls(["compose", "up"])[-1] == ["compose", "up", "-d", "--no-deps", "--pull", "never", "app"]
+    assert host.calls(["compose", "pull"]) == [["compose", "pull"]] * 2
+
+
+def test_rollback_skips_its_own_records_and_takes_an_explicit_target(tree):
+    host = Host(tree)
+    host.update_to(IMG[2])
+    assert host.run("rollback", "a").returncode == 0
+    assert host.running()["app"] == IMG[1]
+
+    again = host.run("rollback", "a")
+    assert again.returncode == 0
+    assert "no recorded version of a differs from the running images" in again.stdout
+
+    host.update_to(IMG[3])
+    cp = host.run("rollback", "a", "--to", "1")
+    assert cp.returncode == 0, cp.stdout + cp.stderr
+    assert "restoring the images in use before #1" in cp.stdout
+    assert host.running()["app"] == IMG[1]
+
+
+def test_rollback_refuses_when_the_previous_image_is_gone(tree):
+    host = Host(tree)
+    host.update_to(IMG[2])
+    state = host.load()
+    state["images"].remove(IMG[1])
+    host.save(state)
+
+    cp = host.run("rollback", "a")
+    assert cp.returncode == 2
+    assert "previous images are no longer available locally: app (" in cp.stderr
+    assert host.calls(["tag"]) == []
+    assert host.running()["app"] == IMG[2]
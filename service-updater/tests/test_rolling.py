@@ -0,0 +1,96 @@
+"""Rolling restarts: readiness-gated batches, --min-available, and the abort on a batch that does not come back."""
+import json
+
+# Compose containers from $ROLLING_STATE; `docker restart` leaves the ids listed in "unready" exited.
+# Every restart call's ids are appended to $ROLLING_LOG.
+ROLLING_DOCKER = r'''#!/usr/bin/env python3
+import json, os, re, sys
+args = sys.argv[1:]
+path = os.environ["ROLLING_STATE"]
+with open(path) as f:
+    state = json.load(f)
+containers = state["containers"]
+
+def lookup(obj, expr):
+    m = re.match(r'\(index (\S+) "([^"]+)"\)', expr)
+    value = obj
+    for part in (m.group(1) if m else expr).strip(".").split("."):
+        value = (value or {}).get(part)
+    return (value or {}).get(m.group(2), "") if m else value
+
+def emit(objs, template):
+    if template:
+        for obj in objs:
+            print(re.sub(r"\{\{json (.+?)\}\}", lambda m: json.dumps(lookup(obj, m.group(1))), template))
+    else:
+        print(json.dumps(objs))
+
+template = args[args.index("--format") + 1] if "--format" in args else ""
+targets = [a for a in args[1 + (args[0] == "image"):] if a not in ("--format", template)]
+if args[:3] == ["compose", "ps", "-q"]:
+    for cid, c in containers.items():
+        if len(args) == 3 or c["service"] == args[3]:
+            print(cid)
+elif args[:1] == ["inspect"]:
+    emit([{"Id": cid, "Name": "/" + containers[cid]["name"], "Image": "sha256:" + "a" * 64, "RestartCount": 0,
+           "State": {"Status": containers[cid]["status"]},
+           "Config": {"Image": "repo/app:1", "Labels": {"com.docker.compose.service": containers[cid]["service"]}}}
+          for cid in targets if cid in containers], template)
+elif args[:2] == ["image", "inspect"]:
+    emit([{"Id": i, "RepoDigests": [], "Config": {"Labels": {}}} for i in targets], template)
+elif args[:1] == ["restart"]:
+    with open(os.environ["ROLLING_LOG"], "a") as f:
+        f.write(json.dumps([containers[cid]["name"] for cid in args[1:]]) + "\n")
+    for cid in args[1:]:
+        containers[cid]["status"] = "exited" if cid in state["unready"] else "running"
+    with open(path, "w") as f:
+        json.dump(state, f)
+'''
+
+
+def rolling_tree(tree, unready=(), services=(("app", 4), ("db", 1))):
+    containers = {f"{name}-{n}".ljust(64, "0"): {"name": f"a-{name}-{n}", "service": name, "status": "running"}
+                  for name, count in services for n in range(1, count + 1)}
+    state = {"containers": containers, "unready": [cid for cid, c in containers.items() if c["name"] in unready]}
+    (tree.root / "rolling.json").write_text(json.dumps(state), encoding="utf-8")
+    tree.write_bin("docker", ROLLING_DOCKER)
+    tree.register({"a": {"path": str(tree.service_dir("a"))}})
+    return {"ROLLING_STATE": str(tree.root / "rolling.json"), "ROLLING_LOG": str(tree.root / "restarts.log")}
+
+
+def restarts(tree):
+    return [json.loads(line) for line in (tree.root / "restarts.log").read_text().splitlines()]
+
+
+def test_rolling_restart_cycles_each_service_in_batches(tree):
+    env = rolling_tree(tree)
+    cp = tree.run("restart", "a", "--rolling", "--batch-size", "2", env=env)
+    assert cp.returncode == 0, cp.stdout + cp.stderr
+    assert restarts(tree) == [["a-app-1", "a-app-2"], ["a-app-3", "a-app-4"], ["a-db-1"]]
+    assert "[ROLLING] app: 4 of 4 containers in 2 batches of 2" in cp.stdout
+    assert "[ROLLING_RESULT] restart: 5 containers cycled" in cp.stdout
+
+
+def test_min_available_caps_the_batch_size(tree):
+    env = rolling_tree(tree, services=[("app", 4)])
+    cp = tree.run("restart", "a", "--rolling", "--batch-size", "2", "--min-available", "75%", env=env)
+    assert cp.returncode == 0, cp.stdout + cp.stderr
+    assert restarts(tree) == [["a-app-1"], ["a-app-2"], ["a-app-3"], ["a-app-4"]]
+    assert "(min available 3, floor 3)" in cp.stdout
+
+
+def test_rolling_restart_stops_at_a_batch_that_is_not_ready(tree):
+    env = rolling_tree(tree, unready=["a-app-3"])
+    cp = tree.run("restart", "a", "--rolling", "--batch-size", "2", env=env)
+    assert cp.returncode == 1, cp.stdout + cp.stderr
+    assert restarts(tree) == [["a-app-1", "a-app-2"], ["a-app-3", "a-app-4"]]
+    assert "[ROLLING] app: batch 2/2 (a-app-3, a-app-4) not ready: a-app-3 is exited" in cp.stdout
+    assert "[ROLLING_RESULT] aborted after 2 containers" in cp.stdout
+
+
+def test_min_available_that_leaves_no_room_cycles_nothing(tree):
+    env = rolling_tree(tree)
+    cp = tree.run("restart", "a", "--rolling", "--min-available", "75%", env=env)
+    assert cp.returncode == 2
+    assert "db: --min-available 75% leaves no room to cycle 1 containers" in cp.stderr
+    assert not (tree.root / "restarts.log").exists()
@@ -0,0 +1,72 @@
+"""`--shell-session on`: one shell per service and operation, framed exit codes, timeouts and shell_init output."""
+
+
+def session_entry(tree, shell_init: str = ":") -> dict:
+    return {"path": str(tree.service_dir("app")), "runtime": "custom", "shell_session": True, "shell_init": shell_init}
+
+
+def test_session_keeps_each_command_exit_code(tree):
+    sc = tree.load()
+    entry = session_entry(tree, "export INIT_PID=$$")
+    with sc.runner._shell_sessions():
+        results = [sc.runner._exec_service(entry, cmd) for cmd in ["true", "exit 7", "false", "cd / && set -e && false", "pwd; echo $INIT_PID"]]
+        shells = list(sc.runner._SESSIONS["shells"].values())
+    assert [r.returncode for r in results] == [0, 7, 1, 1, 0]
+    workdir, init_pid = results[-1].stdout.split()
+    assert workdir == entry["path"], "cd in an earlier command leaked into the session"
+    assert init_pid == str(shells[0]._proc.pid)
+    assert len(shells) == 1 and not shells[0].alive()
+
+
+def test_session_timeout_kills_the_session_and_the_next_command_gets_a_new_one(tree):
+    sc = tree.load()
+    entry = session_entry(tree)
+    with sc.runner._shell_sessions():
+        slow = sc.runner._exec_service(entry, "sleep 30", timeout=0.3)
+        first = next(iter(sc.runner._SESSIONS["shells"].values()))
+        after = sc.runner._exec_service(entry, "echo ok")
+        second = next(iter(sc.runner._SESSIONS["shells"].values()))
+    assert slow.timed_out and slow.returncode == sc.runner.TIMEOUT_EXIT_CODE
+    assert slow.elapsed < sc.runner.KILL_GRACE_SECONDS
+    assert not first.alive() and second is not first
+    assert (after.returncode, after.stdout) == (0, "ok\n")
+
+
+def test_shell_init_output_is_not_attributed_to_the_first_command(tree, capsys):
+    sc = tree.load()
+    entry = session_entry(tree, "echo 'Now using node v20'; echo 'nvm: deprecated flag' >&2; false")
+    with sc.runner._shell_sessions():
+        first = sc.runner._exec_service(entry, "echo one; echo warn >&2")
+        second = sc.runner._exec_service(entry, "echo two")
+    assert (first.returncode, first.stdout, first.stderr) == (0, "one\n", "warn\n")
+    assert (second.returncode, second.stdout) == (0, "two\n")
+    err = capsys.readouterr().err
+    assert err.count("[SESSION] shell_init: nvm: deprecated flag") == 1
+    assert "Now using node" not in err
+
+
+def test_shell_init_that_exits_fails_the_command(tree, capsys):
+    sc = tree.load()
+    entry = session_entry(tree, "echo 'missing env file' >&2; exit 3")
+    with sc.runner._shell_sessions():
+        result = sc.runner._exec_service(entry, "touch ran")
+    assert result.returncode == 3
+    assert "[SESSION] shell_init: missing env file" in capsys.readouterr().err
+    assert not (tree.service_dir("app") / "ran").exists()
+
+
+def test_session_output_is_bounded_like_the_exec_path(tree):
+    sc = tree.load()
+    entry = session_entry(tree)
+    long_line = f"python3 -c \"import sys; sys.stdout.write('x' * {sc.runner.PIPE_LINE_BYTES * 3 + 5})\""
+    with sc.runner._shell_sessions():
+        whole = sc.runner._exec_service(entry, long_line)
+        shell = next(iter(sc.runner._SESSIONS["shells"].values()))
+        tail = sc.runner._exec_service(entry, long_line + "; printf '\\na\\rb\\rc\\n'", tail_lines=3)
+        after = sc.runner._exec_service(entry, "echo ok")
+    assert shell._lines.maxsize == sc.runner.PIPE_QUEUE_LINES
+    assert (whole.returncode, whole.stdout) == (0, "x" * (sc.runner.PIPE_LINE_BYTES * 3 + 5) + "\n")
+    assert tail.returncode == 0
+    assert tail.stdout.splitlines() == ["a", "b", "c"]
+    assert (after.returncode, after.stdout) == (0, "ok\n")
+    assert not any(t.is_alive() for t in shell._readers)
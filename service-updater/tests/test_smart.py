@@ -0,0 +1,39 @@
+"""update --smart: pull, then skip `up -d` when every container already runs the pulled image."""
+
+# The pull brought a newer image for repo/svc1:latest.
+NEW_SVC1_IMAGE = """#!/bin/sh
+if [ "$1 $2 $3 $4" = "image inspect --format {{.Id}}" ]; then
+    "$(dirname "$0")/docker-real" "$@" | sed '2s/1$/e/'
+    exit 0
+fi
+exec "$(dirname "$0")/docker-real" "$@"
+"""
+
+
+def test_smart_update_skips_up_when_pulled_digests_match(tree):
+    tree.register({"a": {"path": str(tree.service_dir("a"))}})
+    cp = tree.run("update", "a", "--smart")
+    assert cp.returncode == 0, cp.stdout + cp.stderr
+    assert "[SMART] pulled images match the running containers; skipping up -d" in cp.stdout
+    assert "unchanged: pulled images match running containers" in cp.stdout
+    spawns = tree.spawns()
+    assert "docker compose pull" in spawns
+    assert "docker compose up" not in spawns
+
+
+def test_smart_update_runs_up_when_a_pull_changed_an_image(tree):
+    tree.register({"a": {"path": str(tree.service_dir("a"))}})
+    (tree.bin / "docker").rename(tree.bin / "docker-real")
+    tree.write_bin("docker", NEW_SVC1_IMAGE)
+    cp = tree.run("update", "a", "--smart")
+    assert cp.returncode == 0, cp.stdout + cp.stderr
+    assert "[SMART]" not in cp.stdout
+    assert tree.spawns().count("docker compose up") == 1
+
+
+def test_smart_update_keeps_custom_update_commands(tree):
+    tree.register({"a": {"path": str(tree.service_dir("a")), "actions": {"update": "docker compose pull"}}})
+    cp = tree.run("update", "a", "--smart")
+    assert cp.returncode == 0, cp.stdout + cp.stderr
+    assert "[SMART]" not in cp.stdout
+    assert "docker compose config" not in tree.spawns()
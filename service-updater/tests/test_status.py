@@ -0,0 +1,61 @@
+"""Fleet status from one host-wide container listing."""
+
+
+def test_status_all_groups_containers_by_service(tree):
+    tree.register({key: {"path": str(tree.service_dir(key))} for key in ["a", "b"]})
+    cp = tree.run("status", "--all")
+    assert cp.returncode == 0, cp.stderr
+    rows = {line.split()[0]: line.split() for line in cp.stdout.splitlines()[2:]}
+    assert rows["a"][1:3] == ["a", "2/2"]
+    assert rows["b"][1:3] == ["b", "2/2"]
+    assert sum(1 for line in tree.spawns() if line.startswith("docker ps")) == 1
+
+
+def test_service_without_path_does_not_abort_status(tree):
+    tree.register({"a": {"path": str(tree.service_dir("a"))}, "nopath": {"path": ""}})
+    for args in [("status", "--all"), ("list", "--with-status")]:
+        cp = tree.run(*args)
+        assert "Traceback" not in cp.stderr, cp.stderr
+        assert "nopath" in cp.stdout
+    cp = tree.run("status", "--all")
+    rows = {line.split()[0]: line.split() for line in cp.stdout.splitlines()[2:]}
+    assert rows["a"][2] == "2/2"
+    assert rows["nopath"][1:3] == ["-", "0/0"]
+    assert cp.returncode == 3
+
+
+def test_service_without_path_matches_explicit_project(tree):
+    a = tree.service_dir("a")
+    services = {"a": {"path": "", "compose_project": "a"}, "other": {"path": str(tree.service_dir("other"))}}
+    tree.register(services)
+    tree.projects.write_text(str(a), encoding="utf-8")
+    cp = tree.run("status", "--all")
+    rows = {line.split()[0]: line.split() for line in cp.stdout.splitlines()[2:]}
+    assert rows["a"][1:3] == ["a", "2/2"]
+    assert rows["other"][2] == "0/0"
+
+
+# The image gained a second repository's digest, e.g. after a push to a mirror.
+MIRRORED_DIGESTS = """#!/bin/sh
+"$(dirname "$0")/docker-real" "$@" | sed 's|\\["repo@|["mirror/repo@sha256:eee", "repo@|'
+"""
+
+
+def test_only_deployments_write_history(tree):
+    tree.register({"a": {"path": str(tree.service_dir("a"))}})
+    history = tree.root / "data" / "history.sqlite3"
+    for args in [("status", "--all"), ("list", "--with-status"), ("status", "a"), ("outdated", "a")]:
+        tree.run(*args)
+    assert not history.exists()
+
+    assert tree.run("restart", "a").returncode == 0
+    sc = tree.load()
+    image_id = "sha256:" + "0" * 64
+    assert "mirror/" not in sc.history._history_store().images([image_id])[image_id].digest
+
+    (tree.bin / "docker").rename(tree.bin / "docker-real")
+    tree.write_bin("docker", MIRRORED_DIGESTS)
+    assert tree.run("status", "--all").returncode == 0
+    assert "mirror/" not in sc.history._history_store().images([image_id])[image_id].digest
+    assert tree.run("restart", "a").returncode == 0
+    assert sc.history._history_store().images([image_id])[image_id].digest_for("mirror/repo:1") == "sha256:eee"
@@ -0,0 +1,37 @@
+"""update: single services, fleets and the two-phase pipeline."""
+
+FAILING_CONFIG = """#!/bin/sh
+if [ "$1 $2" = "compose config" ]; then
+    echo "no configuration file provided: not found" >&2
+    exit 1
+fi
+exec "$(dirname "$0")/docker-real" "$@"
+"""
+
+
+def register_three(tree):
+    tree.register({key: {"path": str(tree.service_dir(key))} for key in ["a", "b", "c"]})
+
+
+def test_two_phase_dry_run_plans_unique_pulls(tree):
+    register_three(tree)
+    cp = tree.run("update", "--all", "--two-phase", "--dry-run")
+    assert cp.returncode == 0, cp.stderr
+    pulls = [line for line in cp.stdout.splitlines() if "docker pull" in line]
+    # Every project lists repo/svc0 and repo/svc1; each is planned once.
+    assert len(pulls) == 2
+    assert "[FLEET] done: 3 ok, 0 failed" in cp.stdout
+
+
+def test_two_phase_dry_run_survives_unresolvable_compose_config(tree):
+    register_three(tree)
+    (tree.bin / "docker").rename(tree.bin / "docker-real")
+    tree.write_bin("docker", FAILING_CONFIG)
+    plain = tree.run("update", "--all", "--dry-run")
+    two_phase = tree.run("update", "--all", "--two-phase", "--dry-run")
+    assert plain.returncode == 0, plain.stderr
+    assert two_phase.returncode == 0, two_phase.stdout + two_phase.stderr
+    assert two_phase.stdout.count("images not resolved (no configuration file provided: not found)") == 3
+    assert two_phase.stdout.count("docker compose pull") == 3
+    assert "[FLEET] done: 3 ok, 0 failed" in two_phase.stdout
+    assert "[ERROR]" not in two_phase.stderr
@@ -0,0 +1,55 @@
+"""watch: following docker events until the containers of the selected services settle."""
+import json
+
+# Containers and a scripted event stream from $WATCH_STATE; every call's argv is appended to $WATCH_ARGV.
+WATCH_DOCKER = r'''#!/usr/bin/env python3
+import json, os, sys, time
+args = sys.argv[1:]
+with open(os.environ["WATCH_ARGV"], "a") as f:
+    f.write(json.dumps(args) + "\n")
+with open(os.environ["WATCH_STATE"]) as f:
+    state = json.load(f)
+labels = {"com.docker.compose.project": state["project"], "com.docker.compose.project.working_dir": state["workdir"],
+          "com.docker.compose.service": "app"}
+if args[:3] == ["compose", "ps", "-q"]:
+    for cid in state["initial"]:
+        print(cid)
+elif args[:1] == ["inspect"]:
+    found = [c for c in args[1:] if c in state["containers"]]
+    print(json.dumps([{"Id": cid, "Name": f"/{state['project']}-app-{n}", "Image": "sha256:" + "a" * 64, "RestartCount": 0,
+                       "State": dict({"Status": state["containers"][cid]["status"]},
+                                     **({"Health": {"Status": state["containers"][cid]["health"]}} if state["containers"][cid].get("health") else {})),
+                       "Config": {"Image": "repo/app:1", "Labels": labels}} for n, cid in enumerate(found, 1)]))
+elif args[:1] == ["events"]:
+    time.sleep(0.3)
+    for action, cid in state["events"]:
+        print(json.dumps({"Type": "container", "Action": action, "id": cid, "timeNano": time.time_ns(),
+                          "Actor": {"ID": cid, "Attributes": labels}}), flush=True)
+        time.sleep(0.05)
+    time.sleep(30)
+'''
+
+
+def test_watch_follows_a_project_named_apart_from_its_directory(tree):
+    workdir = tree.service_dir("app-dir")
+    (workdir / "compose.yaml").write_text("name: shop\nservices:\n  app:\n    image: repo/app:1\n", encoding="utf-8")
+    old, new = "c1".ljust(64, "0"), "c2".ljust(64, "0")
+    state = {
+        "project": "shop",
+        "workdir": str(workdir),
+        "initial": [old],
+        "containers": {old: {"status": "running", "health": "starting"}, new: {"status": "running"}},
+        "events": [["create", new], ["start", new], ["health_status: healthy", old]],
+    }
+    (tree.root / "watch.json").write_text(json.dumps(state), encoding="utf-8")
+    tree.write_bin("docker", WATCH_DOCKER)
+    tree.register({"shop": {"path": str(workdir), "timeouts": {"watch": 5}}})
+
+    argv_log = tree.root / "argv.log"
+    cp = tree.run("watch", "shop", env={"WATCH_STATE": str(tree.root / "watch.json"), "WATCH_ARGV": str(argv_log)})
+    assert cp.returncode == 0, cp.stdout + cp.stderr
+    assert "shop/app shop-app-1: running/starting -> running/healthy" in cp.stdout
+    assert "shop/app shop-app-1: (new) -> running" in cp.stdout
+    assert "[WATCH_RESULT] settled" in cp.stdout
+    events = next(json.loads(line) for line in argv_log.read_text().splitlines() if line.startswith('["events"'))
+    assert "label=com.docker.compose.project" in events and not any("appdir" in a for a in events)